@@ -1,11 +1,53 @@
 """
 Gemini API client with retry logic
 """
+import asyncio
+import datetime
+import importlib
+import logging
 import os
-from typing import Optional, List, Dict, Any
-import google.generativeai as genai
+import threading
+import time
+from typing import Optional, List, Dict, Any, Tuple
+from app.services.langid import LANGUAGE_NAMES, identify_source
+from app.utils.cache import MIN_CACHE_TOKENS, estimate_tokens
 from app.utils.retry import retry_with_backoff
 
+logger = logging.getLogger(__name__)
+
+_genai = None
+_genai_lock = threading.Lock()
+
+
+def load_genai():
+    """
+    Import the google.generativeai SDK on first use
+
+    The SDK pulls in grpc and protobuf and dominates import time, so it is only
+    loaded when the Gemini provider is actually needed (or during warm-up).
+
+    Returns:
+        The google.generativeai module
+    """
+    global _genai
+    if _genai is None:
+        with _genai_lock:
+            if _genai is None:
+                _genai = importlib.import_module("google.generativeai")
+    return _genai
+
+
+def _cache_rejected(error: Exception) -> bool:
+    """
+    Whether an error means the cached context itself is unusable
+
+    Only not-found (expired or deleted upstream) and permission-denied
+    (created under another key) qualify. Quota, timeout and server errors
+    say nothing about the cache and go to the retry path instead.
+    """
+    exceptions = importlib.import_module("google.api_core.exceptions")
+    return isinstance(error, (exceptions.NotFound, exceptions.PermissionDenied))
+
 
 class GeminiClient:
     """Client for interacting with Google Gemini API"""
@@ -21,7 +63,60 @@ class GeminiClient:
         if not self.api_key:
             raise ValueError("GEMINI_API_KEY not provided")
         
-        genai.configure(api_key=self.api_key)
+        self._configured = False
+        self.context_caching = os.getenv("GEMINI_CONTEXT_CACHE_ENABLED", "false").lower() in ("1", "true", "yes")
+        self.context_cache_ttl = float(os.getenv("GEMINI_CONTEXT_CACHE_TTL", "3600"))
+        self.context_cache_min_tokens = int(os.getenv("GEMINI_CONTEXT_CACHE_MIN_TOKENS", str(MIN_CACHE_TOKENS)))
+        # (model, system instruction) -> (CachedContent, monotonic expiry); None marks a failed creation
+        self._cached_contents: Dict[Tuple[str, str], Tuple[Optional[Any], float]] = {}
+    
+    @property
+    def genai(self):
+        """SDK module, imported and configured on first access"""
+        genai = load_genai()
+        if not self._configured:
+            genai.configure(api_key=self.api_key)
+            self._configured = True
+        return genai
+    
+    def load(self) -> None:
+        """Import and configure the SDK ahead of the first request"""
+        self.genai
+    
+    async def _cached_content(self, model_name: str, system_instruction: str) -> Optional[Any]:
+        """
+        Cached context for a (model, system instruction) pair, created on first use
+        
+        Returns None when context caching is disabled, unsupported by the
+        installed SDK, the instruction is below the API's minimum cacheable
+        size (estimated, see GEMINI_CONTEXT_CACHE_MIN_TOKENS; creation would
+        always be rejected), or the API refused to cache the instruction
+        (retried after the TTL).
+        """
+        if not self.context_caching or estimate_tokens(system_instruction) < self.context_cache_min_tokens:
+            return None
+        if not hasattr(self.genai, "caching"):
+            return None
+        
+        key = (model_name, system_instruction)
+        entry = self._cached_contents.get(key)
+        if entry is not None and entry[1] - time.monotonic() > 60:
+            return entry[0]
+        
+        def _create():
+            return self.genai.caching.CachedContent.create(
+                model=model_name,
+                system_instruction=system_instruction,
+                ttl=datetime.timedelta(seconds=self.context_cache_ttl)
+            )
+        
+        try:
+            cached = await asyncio.to_thread(_create)
+        except Exception as e:
+            logger.info(f"Context cache unavailable for {model_name}, sending instructions inline: {str(e)}")
+            cached = None
+        self._cached_contents[key] = (cached, time.monotonic() + self.context_cache_ttl)
+        return cached
     
     async def generate_content(
         self,
@@ -43,13 +138,29 @@ class GeminiClient:
             Generated response from Gemini
         """
         async def _generate():
-            model = genai.GenerativeModel(
+            cached = await self._cached_content(model_name, system_instruction)
+            if cached is not None:
+                model = self.genai.GenerativeModel.from_cached_content(
+                    cached_content=cached,
+                    generation_config=generation_config
+                )
+                try:
+                    return await model.generate_content_async(prompt)
+                except Exception as e:
+                    if not _cache_rejected(e):
+                        raise
+                    # Expired or deleted upstream: drop it and send the instruction inline
+                    logger.info(f"Cached context rejected, falling back to inline instruction: {str(e)}")
+                    self._cached_contents.pop((model_name, system_instruction), None)
+            
+            model = self.genai.GenerativeModel(
                 model_name=model_name,
                 system_instruction=system_instruction,
                 generation_config=generation_config
             )
             
-            response = model.generate_content(prompt)
+            # The async variant keeps the network call off the event loop
+            response = await model.generate_content_async(prompt)
             return response
         
         return await retry_with_backoff(_generate, max_retries=3, base_delay=1.0)
@@ -69,6 +180,11 @@ class GeminiClient:
         Returns:
             Translated text
         """
+        source, same_language = identify_source(text, target_language)
+        if same_language:
+            # Already in the target language: nothing to translate
+            return text
+        
         system_instruction = (
             "Aja como um tradutor linguístico profissional. "
             "Dada uma frase e uma língua de destino, forneça apenas a tradução do texto, "
@@ -76,7 +192,10 @@ class GeminiClient:
             "A língua de destino padrão é Inglês, o usuario pode selecionar Changana como opcional para escutar"
         )
         
-        prompt = f'Traduza o seguinte texto para {target_language}: "{text}"'
+        if source is not None:
+            prompt = f'Traduza o seguinte texto de {LANGUAGE_NAMES[source]} para {target_language}: "{text}"'
+        else:
+            prompt = f'Traduza o seguinte texto para {target_language}: "{text}"'
         
         response = await self.generate_content(
             prompt=prompt,
@@ -128,9 +247,9 @@ class GeminiClient:
         if response.candidates and len(response.candidates) > 0:
             for part in response.candidates[0].content.parts:
                 if hasattr(part, 'inline_data') and part.inline_data:
-                    # Return the raw audio data
+                    # Return the raw audio data (decoded in a worker thread)
                     import base64
-                    return base64.b64decode(part.inline_data.data)
+                    return await asyncio.to_thread(base64.b64decode, part.inline_data.data)
         
         raise ValueError("No audio data received from Gemini API")
 
@@ -173,7 +292,7 @@ class GeminiClient:
             }
         ]
         
-        model = genai.GenerativeModel(
+        model = self.genai.GenerativeModel(
             model_name="gemini-2.0-flash-exp",
             system_instruction=system_instruction,
             generation_config=generation_config
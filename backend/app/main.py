@@ -1,12 +1,31 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from dotenv import load_dotenv
+import asyncio
 import logging
 
 # Load environment variables before importing routers
 load_dotenv()
 
-from app.routers import translation
+from app.routers import translation, jobs, history, metrics, admin, phrase_packs
+from app.services.gemini import gemini_service
+from app.services.history import history_service
+from app.services.jobs import job_queue
+from app.services.langid import language_id
+from app.services.prefetch import speech_prefetcher
+from app.services.warmup import readiness
+from app.utils.deadline import DeadlineMiddleware, DEFAULT_DEADLINE, MAX_DEADLINE, ROUTE_DEADLINES, EXEMPT_SUFFIXES
+from app.utils.errors import ServiceError
+from app.utils.idempotency import (
+    IdempotencyMiddleware, idempotency_store, IDEMPOTENCY_ENABLED, IDEMPOTENCY_TTL, IDEMPOTENCY_LOCK_TTL,
+    IDEMPOTENCY_MAX_RESPONSE_BYTES
+)
+from app.utils.memory_budget import MemoryBudgetMiddleware, memory_budget, ROUTE_COSTS, BODY_LIMITS
+from app.utils.profiler import ProfilerMiddleware, profiler
+from app.utils.rate_limit import RateLimitMiddleware, rate_limiter, RATE_LIMIT_ENABLED, ROUTE_COSTS as RATE_LIMIT_COSTS
+from app.utils.watchdog import watchdog
 
 # Configure logging
 logging.basicConfig(
@@ -14,13 +33,70 @@ logging.basicConfig(
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
 )
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Start background warm-up on startup and release upstream connections on shutdown"""
+    await watchdog.start()
+    await history_service.start()
+    if IDEMPOTENCY_ENABLED:
+        await asyncio.to_thread(idempotency_store.open)
+    readiness.register("gemini_connection", gemini_service.warm_up)
+    readiness.register("translation_cache", history_service.prime_cache)
+    readiness.register("language_id", language_id.warm_up)
+    readiness.start()
+    await job_queue.start()
+    await speech_prefetcher.start()
+    yield
+    await speech_prefetcher.stop()
+    await job_queue.stop()
+    await readiness.stop()
+    await history_service.stop()
+    await asyncio.to_thread(idempotency_store.close)
+    await gemini_service.aclose()
+    await watchdog.stop()
+
+
 # Create FastAPI app
 app = FastAPI(
     title="LínguaMedia Translation API",
     description="API for translating text using Google Gemini AI",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
+)
+
+# Admission control for memory-heavy audio routes (inside CORS so rejections
+# still carry CORS headers)
+app.add_middleware(MemoryBudgetMiddleware, budget=memory_budget, costs=ROUTE_COSTS, body_limits=BODY_LIMITS)
+
+# Request deadlines (outside the memory budget, so time spent queueing for
+# budget counts against the deadline)
+app.add_middleware(
+    DeadlineMiddleware,
+    default=DEFAULT_DEADLINE,
+    maximum=MAX_DEADLINE,
+    routes=ROUTE_DEADLINES,
+    exempt_suffixes=EXEMPT_SUFFIXES,
+    detach_keyed=IDEMPOTENCY_ENABLED
 )
 
+# Per-client rate limiting; also binds the client identity used for fair
+# queuing in the bulkheads (inside idempotency, so replays cost no tokens)
+if RATE_LIMIT_ENABLED:
+    app.add_middleware(RateLimitMiddleware, limiter=rate_limiter, costs=RATE_LIMIT_COSTS)
+
+# Idempotency keys (outside the deadline and memory budget: a retry that
+# attaches to in-flight work holds no budget, and the first request's work
+# keeps running when its client disconnects)
+if IDEMPOTENCY_ENABLED:
+    app.add_middleware(
+        IdempotencyMiddleware,
+        store=idempotency_store,
+        ttl=IDEMPOTENCY_TTL,
+        lock_ttl=IDEMPOTENCY_LOCK_TTL,
+        max_response_bytes=IDEMPOTENCY_MAX_RESPONSE_BYTES
+    )
+
 # CORS configuration - allow all origins for development
 # In production, restrict to specific origins
 app.add_middleware(
@@ -31,8 +107,25 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Sampling profiler, installed only when an admin token or profile secret is set
+if profiler.enabled:
+    app.add_middleware(ProfilerMiddleware, profiler=profiler)
+
 # Include routers
 app.include_router(translation.router)
+app.include_router(jobs.router)
+app.include_router(history.router)
+app.include_router(phrase_packs.router)
+app.include_router(metrics.router)
+if profiler.admin_token:
+    app.include_router(admin.router)
+
+
+@app.exception_handler(ServiceError)
+async def service_error_handler(request: Request, exc: ServiceError):
+    """Map service errors (overload, ...) to their HTTP status"""
+    headers = {"Retry-After": str(exc.retry_after)} if exc.retry_after is not None else None
+    return JSONResponse(status_code=exc.status_code, content={"detail": str(exc)}, headers=headers)
 
 
 @app.get("/")
@@ -45,6 +138,15 @@ async def root():
     }
 
 
+@app.get("/ready")
+async def ready():
+    """Readiness endpoint: 503 until warm-up has finished"""
+    return JSONResponse(
+        status_code=200 if readiness.ready else 503,
+        content=readiness.status()
+    )
+
+
 if __name__ == "__main__":
     import uvicorn
     import os
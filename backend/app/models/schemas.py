@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field, ConfigDict
-from typing import Optional
+from typing import Optional, List
 
 
 class TranslationRequest(BaseModel):
@@ -8,6 +8,12 @@ class TranslationRequest(BaseModel):
     target_language: str
 
 
+class MultiTranslationRequest(BaseModel):
+    """Request model for multi-target translation endpoint"""
+    text: str
+    target_languages: List[str] = Field(..., min_length=1, max_length=8)
+
+
 class TranslationResponse(BaseModel):
     """Response model for translation endpoint"""
     model_config = ConfigDict(populate_by_name=True)
@@ -21,6 +27,8 @@ class SynthesizeRequest(BaseModel):
     """Request model for speech synthesis endpoint"""
     text: str
     voice: str = "Kore"
+    # Stream PCM pieces as NDJSON while long texts are still being synthesized
+    stream: bool = False
 
 
 class SynthesizeResponse(BaseModel):
@@ -30,6 +38,13 @@ class SynthesizeResponse(BaseModel):
     sample_rate: int
 
 
+class TranslateAndSpeakRequest(BaseModel):
+    """Request model for the combined translate + synthesize endpoint"""
+    text: str
+    target_language: str
+    voice: str = "Kore"
+
+
 class AudioTranslationResponse(BaseModel):
     """Response model for audio translation endpoint"""
     model_config = ConfigDict(populate_by_name=True)
@@ -39,6 +54,50 @@ class AudioTranslationResponse(BaseModel):
     language: str
 
 
+class JobResponse(BaseModel):
+    """Response model for asynchronous translation jobs"""
+    job_id: str
+    kind: str
+    status: str
+    target_language: str
+    result: Optional[AudioTranslationResponse] = None
+    error: Optional[str] = None
+    created_at: float
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+
+
+class HistoryEntryIn(BaseModel):
+    """History entry uploaded by a client"""
+    original_text: str
+    translated_text: str
+    language: str
+    source: str = "text"
+    created_at: Optional[float] = None
+
+
+class HistoryImportRequest(BaseModel):
+    """Request model for uploading client-side history"""
+    entries: List[HistoryEntryIn] = Field(..., max_length=1000)
+
+
+class HistoryEntry(BaseModel):
+    """Stored history entry"""
+    id: int
+    original_text: str
+    translated_text: str
+    language: str
+    source: str
+    created_at: float
+
+
+class HistoryPage(BaseModel):
+    """Page of history entries with the cursor for the next request"""
+    entries: List[HistoryEntry]
+    next_cursor: Optional[int] = None
+    has_more: bool = False
+
+
 class ErrorResponse(BaseModel):
     """Error response model"""
     error: str
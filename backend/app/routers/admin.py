@@ -0,0 +1,62 @@
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from fastapi.responses import PlainTextResponse
+from typing import Optional
+from app.utils.profiler import profiler, SessionBusy
+from app.utils.rate_limit import rate_limiter
+from app.utils.watchdog import watchdog
+import time
+
+router = APIRouter(prefix="/api/admin", tags=["admin"])
+
+
+def require_admin(authorization: Optional[str] = Header(None)):
+    """Bearer-token check against ADMIN_TOKEN"""
+    token = authorization[7:] if authorization and authorization.startswith("Bearer ") else None
+    if not profiler.check_admin_token(token):
+        raise HTTPException(status_code=401, detail="Invalid admin token")
+
+
+@router.post("/profile", response_class=PlainTextResponse, dependencies=[Depends(require_admin)])
+async def run_profile(
+    seconds: float = Query(10.0, gt=0, description="Session duration (or timeout when profiling requests)"),
+    requests: Optional[int] = Query(None, ge=1, description="Stop after this many matching requests"),
+    route: Optional[str] = Query(None, description="Path prefix of the requests to profile"),
+    interval_ms: float = Query(5.0, ge=1, le=100, description="Sampling interval")
+):
+    """
+    Sample the live process and return collapsed stacks
+    
+    Runs for `seconds`, or until `requests` requests whose path starts with
+    `route` have completed (sampling only while one of them is in flight).
+    The body is in collapsed format, ready for flamegraph.pl or speedscope.
+    """
+    try:
+        collapsed = await profiler.profile(seconds, requests, route, interval_ms / 1000.0)
+    except SessionBusy as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    
+    filename = time.strftime("profile-%Y%m%d-%H%M%S.folded")
+    return PlainTextResponse(
+        collapsed,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+
+@router.get("/stalls", dependencies=[Depends(require_admin)])
+async def get_stalls():
+    """Recent event-loop stalls with the blocking stack captured during each"""
+    return {
+        "threshold_ms": watchdog.threshold * 1000,
+        "stalls": watchdog.recent_stalls()
+    }
+
+
+@router.get("/clients", dependencies=[Depends(require_admin)])
+async def get_clients(limit: int = Query(100, ge=1, le=1000)):
+    """Per-client usage counters of the rate limiter, heaviest clients first"""
+    return {
+        "tracked": len(rate_limiter),
+        "rate": rate_limiter.rate,
+        "burst": rate_limiter.burst,
+        "clients": rate_limiter.usage(limit)
+    }
@@ -0,0 +1,119 @@
+from fastapi import APIRouter, HTTPException, Header, Query, Request, Response
+from typing import Optional
+from app.models.schemas import HistoryImportRequest, HistoryPage, HistoryEntry
+from app.services.history import history_service
+import asyncio
+import hashlib
+import logging
+
+router = APIRouter(prefix="/api/history", tags=["history"])
+logger = logging.getLogger(__name__)
+
+
+def _client_id(x_client_id: Optional[str]) -> str:
+    """History is private to a client: reject requests without an ID this server issued"""
+    if not x_client_id or not x_client_id.strip():
+        raise HTTPException(status_code=400, detail="X-Client-Id header is required")
+    client_id = history_service.verified_client_id(x_client_id)
+    if client_id is None:
+        raise HTTPException(status_code=403, detail="Unknown X-Client-Id, request one from POST /api/history/client-id")
+    return client_id
+
+
+@router.post("/client-id", status_code=201)
+async def issue_client_id():
+    """
+    Issue a new history client ID
+
+    Send it as X-Client-Id on translation, job and history requests. It is
+    the only credential for the history: store it like a password.
+    """
+    return {"client_id": history_service.issue_client_id()}
+
+
+def _page(entries: list, limit: int) -> HistoryPage:
+    has_more = len(entries) > limit
+    entries = entries[:limit]
+    return HistoryPage(
+        entries=[HistoryEntry(**entry) for entry in entries],
+        next_cursor=entries[-1]["id"] if entries else None,
+        has_more=has_more
+    )
+
+
+@router.post("", status_code=202)
+async def import_history(
+    request: HistoryImportRequest,
+    x_client_id: Optional[str] = Header(None)
+):
+    """
+    Upload client-side history entries (e.g. from localStorage)
+    
+    Entries are appended by the background writer; they become visible to
+    sync and search within the flush interval. They are stored with source
+    'import' and never feed the shared translation cache.
+    """
+    client_id = _client_id(x_client_id)
+    for entry in request.entries:
+        history_service.record(
+            original_text=entry.original_text,
+            translated_text=entry.translated_text,
+            language=entry.language,
+            source="import",
+            client_id=client_id,
+            created_at=entry.created_at
+        )
+    return {"accepted": len(request.entries)}
+
+
+@router.get("", response_model=HistoryPage)
+async def sync_history(
+    request: Request,
+    response: Response,
+    since: int = Query(0, ge=0, description="Cursor returned by the previous sync"),
+    limit: int = Query(100, ge=1, le=1000),
+    x_client_id: Optional[str] = Header(None)
+):
+    """
+    Incremental history sync
+    
+    Returns entries newer than the 'since' cursor, oldest first. The store is
+    append-only, so the delta only changes when new entries arrive; clients
+    send the previous ETag in If-None-Match and get 304 when nothing changed.
+    """
+    client_id = _client_id(x_client_id)
+    store = history_service.store
+    latest_id = await asyncio.to_thread(store.latest_id, client_id)
+    
+    digest = hashlib.sha1(f"{client_id}:{since}:{limit}:{latest_id}".encode()).hexdigest()[:20]
+    etag = f'"h{digest}"'
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+    
+    entries = await asyncio.to_thread(store.since, since, limit + 1, client_id)
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = "private, no-cache"
+    return _page(entries, limit)
+
+
+@router.get("/search", response_model=HistoryPage)
+async def search_history(
+    q: str = Query(..., min_length=1, max_length=200),
+    before: Optional[int] = Query(None, ge=1, description="Cursor returned by the previous page"),
+    limit: int = Query(50, ge=1, le=200),
+    x_client_id: Optional[str] = Header(None)
+):
+    """
+    Full-text search over original and translated text, newest first
+    
+    Matching is accent-insensitive and the last word is a prefix match.
+    """
+    client_id = _client_id(x_client_id)
+    try:
+        entries = await asyncio.to_thread(
+            history_service.store.search, q, limit + 1, before, client_id
+        )
+    except Exception as e:
+        logger.error(f"History search error: {str(e)}")
+        raise HTTPException(status_code=400, detail=f"Invalid search query: {str(e)}")
+    return _page(entries, limit)
@@ -0,0 +1,131 @@
+from fastapi import APIRouter, HTTPException, UploadFile, File, Form, Header, Request
+import json
+from fastapi.responses import StreamingResponse
+from typing import Optional
+from app.models.schemas import JobResponse
+from app.services.jobs import job_queue, QueueFullError, FINAL_STATUSES
+import logging
+
+router = APIRouter(prefix="/api/jobs", tags=["jobs"])
+logger = logging.getLogger(__name__)
+
+MAX_AUDIO_SIZE = 20 * 1024 * 1024  # 20MB
+
+
+def _to_response(job: dict) -> JobResponse:
+    return JobResponse(
+        job_id=job["id"],
+        kind=job["kind"],
+        status=job["status"],
+        target_language=job["target_language"],
+        result=job["result"],
+        error=job["error"],
+        created_at=job["created_at"],
+        started_at=job["started_at"],
+        finished_at=job["finished_at"]
+    )
+
+
+@router.post("", response_model=JobResponse, status_code=202)
+async def create_job(
+    file: Optional[UploadFile] = File(None),
+    text: Optional[str] = Form(None),
+    target_language: str = Form("English"),
+    x_client_id: Optional[str] = Header(None)
+):
+    """
+    Submit an audio or long-text translation job
+    
+    Returns immediately with a job ID. Poll GET /api/jobs/{job_id} or
+    subscribe to GET /api/jobs/{job_id}/events for completion.
+    
+    Args:
+        file: Audio file (WAV, MP3, M4A, etc.) for an audio job
+        text: Text for a text job (ignored when a file is sent)
+        target_language: Target language for translation
+        
+    Returns:
+        The queued job
+        
+    Raises:
+        HTTPException: If the request is invalid or the queue is full
+    """
+    try:
+        if file is not None:
+            audio_content = await file.read()
+            if len(audio_content) > MAX_AUDIO_SIZE:
+                raise HTTPException(
+                    status_code=413,
+                    detail=f"Audio file too large. Maximum size is {MAX_AUDIO_SIZE // (1024*1024)}MB"
+                )
+            job = await job_queue.submit(
+                kind="audio",
+                target_language=target_language,
+                audio=audio_content,
+                content_type=file.content_type,
+                client_id=x_client_id
+            )
+        elif text:
+            job = await job_queue.submit(kind="text", target_language=target_language, text=text,
+                                         client_id=x_client_id)
+        else:
+            raise HTTPException(status_code=400, detail="Either 'file' or 'text' is required")
+        
+        logger.info(f"Queued {job['kind']} job {job['id']} to {target_language}")
+        return _to_response(job)
+        
+    except HTTPException:
+        raise
+    except QueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
+    except Exception as e:
+        logger.error(f"Job submission error: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Job submission failed: {str(e)}")
+
+
+@router.get("/{job_id}", response_model=JobResponse)
+async def get_job(job_id: str):
+    """Get the current status and, once finished, the result of a job"""
+    job = await job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return _to_response(job)
+
+
+@router.get("/{job_id}/events")
+async def job_events(job_id: str, request: Request):
+    """
+    Server-Sent Events stream of job status changes
+    
+    Emits a 'status' event on every change and closes after the job has
+    completed or failed, or with a 'gone' event if the job was purged.
+    """
+    job = await job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    async def event_stream():
+        current = job
+        last_status = None
+        while True:
+            if current["status"] != last_status:
+                last_status = current["status"]
+                payload = _to_response(current).model_dump_json()
+                yield f"event: status\ndata: {payload}\n\n"
+            if last_status in FINAL_STATUSES or await request.is_disconnected():
+                return
+            await job_queue.wait_for_change(job_id, timeout=15.0)
+            current = await job_queue.get(job_id)
+            if current is None:
+                payload = json.dumps({"job_id": job_id, "detail": "Job not found"})
+                yield f"event: gone\ndata: {payload}\n\n"
+                return
+            if current["status"] == last_status:
+                # Comment line keeps idle connections open through proxies
+                yield ": keep-alive\n\n"
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
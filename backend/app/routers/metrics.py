@@ -0,0 +1,10 @@
+from fastapi import APIRouter
+from app.utils.metrics import metrics
+
+router = APIRouter(prefix="/api", tags=["metrics"])
+
+
+@router.get("/metrics")
+async def get_metrics():
+    """Snapshot of in-process counters, gauges and histograms"""
+    return metrics.snapshot()
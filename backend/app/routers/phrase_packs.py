@@ -0,0 +1,56 @@
+from fastapi import APIRouter, HTTPException, Query, Response
+from fastapi.responses import FileResponse
+from typing import Optional
+from app.services.langid import LANGUAGE_NAMES
+from app.services.phrase_packs import phrase_packs
+import logging
+
+router = APIRouter(prefix="/api/phrase-packs", tags=["phrase-packs"])
+logger = logging.getLogger(__name__)
+
+
+@router.get("/{source}/{target}", response_class=FileResponse,
+            responses={200: {"content": {"application/vnd.sqlite3": {}}}, 304: {"description": "Up to date"}})
+async def get_phrase_pack(
+    source: str,
+    target: str,
+    voice: str = Query("Kore", pattern=r"^[A-Za-z]{1,50}$"),
+    since_version: Optional[int] = Query(None, ge=1, description="Pack version the client already has")
+):
+    """
+    Offline phrase pack for a language pair (SQLite file)
+    
+    Without `since_version` the full pack is returned. With it, the response
+    is a delta against that version (added or changed phrases plus removed
+    keys), a full pack if that version is no longer kept, or 304 if the
+    client is up to date. X-Pack-Version, X-Pack-Kind and, for deltas,
+    X-Pack-Base-Version describe the file.
+    
+    Raises:
+        HTTPException: If the language pair is not supported
+    """
+    if source not in LANGUAGE_NAMES or target not in LANGUAGE_NAMES or source == target:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Unsupported language pair, use two of: {', '.join(sorted(LANGUAGE_NAMES))}"
+        )
+    
+    try:
+        version, path, kind = await phrase_packs.export(source, target, voice, since_version)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Phrase pack export error: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Phrase pack export failed: {str(e)}")
+    
+    headers = {"X-Pack-Version": str(version), "X-Pack-Kind": kind, "Cache-Control": "no-cache"}
+    if kind == "current":
+        return Response(status_code=304, headers=headers)
+    if kind == "delta":
+        headers["X-Pack-Base-Version"] = str(since_version)
+    return FileResponse(
+        path,
+        media_type="application/vnd.sqlite3",
+        filename=f"phrases-{source}-{target}-v{version}{'-delta' if kind == 'delta' else ''}.sqlite3",
+        headers=headers
+    )
@@ -1,14 +1,49 @@
-from fastapi import APIRouter, HTTPException, UploadFile, File, Form
-from app.models.schemas import TranslationRequest, TranslationResponse, SynthesizeRequest, SynthesizeResponse, AudioTranslationResponse, ErrorResponse
-from app.services.gemini import gemini_service
+from fastapi import APIRouter, HTTPException, UploadFile, File, Form, Header, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from typing import Optional
+from app.models.schemas import TranslationRequest, MultiTranslationRequest, TranslationResponse, SynthesizeRequest, SynthesizeResponse, AudioTranslationResponse, TranslateAndSpeakRequest, ErrorResponse
+from app.services.gemini import gemini_service, TRANSLATE_PROMPT_VERSION, TTS_PROMPT_VERSION
+from app.services.history import history_service
+from app.services.prefetch import speech_prefetcher
+from app.utils.cache import normalize_text, translation_cache_key, speech_cache_key
+from app.utils.errors import ServiceError
+from app.utils.http_cache import strong_etag, etag_matches, cache_control
+import asyncio
+import base64
+import hashlib
+import json
 import logging
+import os
 
 router = APIRouter(prefix="/api", tags=["translation"])
 logger = logging.getLogger(__name__)
 
+# Shared-cache lifetimes for the GET variants (seconds)
+TRANSLATE_HTTP_MAX_AGE = int(os.getenv("TRANSLATE_HTTP_MAX_AGE", "86400"))
+SPEECH_HTTP_MAX_AGE = int(os.getenv("SPEECH_HTTP_MAX_AGE", "604800"))
+
+
+def _translation_etag(text: str, language: str, translated_text: str) -> str:
+    return strong_etag("translate", text, language, translated_text,
+                       gemini_service.model, TRANSLATE_PROMPT_VERSION)
+
+
+def _speech_etag(voice: str, pcm_data: bytes) -> str:
+    return strong_etag("speech", hashlib.sha256(pcm_data).hexdigest(), voice,
+                       gemini_service.model, TTS_PROMPT_VERSION)
+
+
+async def _encode_audio(wav_data: bytes) -> str:
+    """Base64-encode audio in a worker thread so large clips do not stall the event loop"""
+    return await asyncio.to_thread(lambda: base64.b64encode(wav_data).decode('utf-8'))
+
+
+def _not_modified(etag: str, max_age: int) -> Response:
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": cache_control(max_age)})
+
 
 @router.post("/translate", response_model=TranslationResponse)
-async def translate_text(request: TranslationRequest):
+async def translate_text(request: TranslationRequest, x_client_id: Optional[str] = Header(None)):
     """
     Translate text to target language using Google Gemini API
     
@@ -28,6 +63,8 @@ async def translate_text(request: TranslationRequest):
             text=request.text,
             target_language=request.target_language
         )
+        history_service.record(request.text, translated_text, request.target_language, client_id=x_client_id)
+        speech_prefetcher.schedule(translated_text)
         
         return TranslationResponse(
             original_text=request.text,
@@ -35,6 +72,8 @@ async def translate_text(request: TranslationRequest):
             language=request.target_language
         )
         
+    except ServiceError:
+        raise
     except Exception as e:
         logger.error(f"Translation error: {str(e)}")
         raise HTTPException(
@@ -43,11 +82,123 @@ async def translate_text(request: TranslationRequest):
         )
 
 
+@router.get("/translate", response_model=TranslationResponse)
+async def translate_text_cacheable(
+    request: Request,
+    response: Response,
+    text: str = Query(..., min_length=1, max_length=2000),
+    target_language: str = Query("English", max_length=50),
+    x_client_id: Optional[str] = Header(None)
+):
+    """
+    Cacheable (idempotent) variant of POST /api/translate
+    
+    Responses carry a strong ETag derived from the canonical input, the
+    translation, the model and the prompt version, plus a public
+    Cache-Control so a CDN or reverse proxy can serve repeated phrases.
+    If-None-Match is answered with 304 without calling the upstream API when
+    the translation is cached.
+    
+    Raises:
+        HTTPException: If translation fails
+    """
+    text = normalize_text(text)
+    target_language = normalize_text(target_language)
+    if_none_match = request.headers.get("if-none-match")
+    
+    cached = gemini_service.translation_cache.get(translation_cache_key(text, target_language))
+    if cached is not None and if_none_match:
+        etag = _translation_etag(text, target_language, cached)
+        if etag_matches(if_none_match, etag):
+            return _not_modified(etag, TRANSLATE_HTTP_MAX_AGE)
+    
+    try:
+        translated_text = await gemini_service.translate(text=text, target_language=target_language)
+    except ServiceError:
+        raise
+    except Exception as e:
+        logger.error(f"Translation error: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Translation failed: {str(e)}"
+        )
+    history_service.record(text, translated_text, target_language, client_id=x_client_id)
+    speech_prefetcher.schedule(translated_text)
+    
+    etag = _translation_etag(text, target_language, translated_text)
+    if etag_matches(if_none_match, etag):
+        return _not_modified(etag, TRANSLATE_HTTP_MAX_AGE)
+    
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = cache_control(TRANSLATE_HTTP_MAX_AGE)
+    return TranslationResponse(
+        original_text=text,
+        translated_text=translated_text,
+        language=target_language
+    )
+
+
+@router.post("/translate/multi")
+async def translate_multi(request: MultiTranslationRequest, x_client_id: Optional[str] = Header(None)):
+    """
+    Translate one text into several target languages
+    
+    Streams newline-delimited JSON with one line per target as soon as it is
+    ready: {"type": "translation", "language", "translated_text"} or
+    {"type": "error", "language", "detail"}. Cached targets come first;
+    the remaining ones share one structured upstream call for short texts,
+    or run as concurrent per-target calls. An unexpected failure after the
+    stream has started ends it with a {"type": "error", "detail"} line
+    without a language.
+    """
+    logger.info(f"Translating text to {len(request.target_languages)} target(s)")
+    
+    async def stream():
+        try:
+            async for language, translated_text, error in gemini_service.translate_multi(
+                request.text, request.target_languages
+            ):
+                if error is not None:
+                    logger.error(f"Translation error ({language}): {error}")
+                    yield json.dumps({
+                        "type": "error",
+                        "language": language,
+                        "detail": f"Translation failed: {error}"
+                    }) + "\n"
+                    continue
+                history_service.record(request.text, translated_text, language, client_id=x_client_id)
+                speech_prefetcher.schedule(translated_text)
+                yield json.dumps({
+                    "type": "translation",
+                    "original_text": request.text,
+                    "translated_text": translated_text,
+                    "language": language
+                }) + "\n"
+        except Exception as e:
+            # Headers are already sent: report the failure in-band instead of truncating the stream
+            logger.error(f"Multi-target translation error: {str(e)}")
+            yield json.dumps({
+                "type": "error",
+                "detail": f"Translation failed: {str(e)}"
+            }) + "\n"
+    
+    return StreamingResponse(
+        stream(),
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-store", "X-Accel-Buffering": "no"}
+    )
+
+
 @router.post("/synthesize", response_model=SynthesizeResponse)
 async def synthesize_speech(request: SynthesizeRequest):
     """
     Synthesize speech from text using Gemini TTS
     
+    With `stream: true` the response is newline-delimited JSON instead:
+    {"type": "audio", "format": "pcm16", "index", "audio_base64"} lines in
+    playback order as soon as each sentence chunk is ready, then
+    {"type": "done"} (or {"type": "error"} if synthesis fails midway).
+    
     Args:
         request: Synthesis request with text and voice name
         
@@ -57,6 +208,9 @@ async def synthesize_speech(request: SynthesizeRequest):
     Raises:
         HTTPException: If synthesis fails
     """
+    if request.stream:
+        return _stream_speech(request.text, request.voice)
+    
     try:
         logger.info(f"Speech synthesis requested for text: {request.text[:50]}...")
         
@@ -66,8 +220,7 @@ async def synthesize_speech(request: SynthesizeRequest):
             voice_name=request.voice
         )
         
-        import base64
-        audio_base64 = base64.b64encode(wav_data).decode('utf-8')
+        audio_base64 = await _encode_audio(wav_data)
         
         return SynthesizeResponse(
             audio_base64=audio_base64,
@@ -75,18 +228,172 @@ async def synthesize_speech(request: SynthesizeRequest):
             sample_rate=24000
         )
         
+    except ServiceError:
+        raise
+    except Exception as e:
+        logger.error(f"Synthesis error: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Speech synthesis failed: {str(e)}"
+        )
+
+
+def _stream_speech(text: str, voice: str) -> StreamingResponse:
+    """NDJSON stream of PCM16 pieces for POST /api/synthesize with stream=true"""
+    logger.info(f"Streaming speech synthesis for text: {text[:50]}...")
+    
+    async def stream():
+        index = 0
+        try:
+            async for pcm_data in gemini_service.synthesize_stream(text=text, voice_name=voice):
+                if not pcm_data:
+                    continue
+                yield json.dumps({
+                    "type": "audio",
+                    "format": "pcm16",
+                    "sample_rate": 24000,
+                    "index": index,
+                    "audio_base64": await _encode_audio(pcm_data)
+                }) + "\n"
+                index += 1
+        except Exception as e:
+            logger.error(f"Synthesis error: {str(e)}")
+            yield json.dumps({
+                "type": "error",
+                "stage": "synthesis",
+                "detail": f"Speech synthesis failed: {str(e)}"
+            }) + "\n"
+            return
+        yield json.dumps({"type": "done", "chunks": index}) + "\n"
+    
+    return StreamingResponse(
+        stream(),
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-store", "X-Accel-Buffering": "no"}
+    )
+
+
+@router.get("/synthesize", response_class=Response, responses={200: {"content": {"audio/wav": {}}}})
+async def synthesize_speech_cacheable(
+    request: Request,
+    text: str = Query(..., min_length=1, max_length=2000),
+    voice: str = Query("Kore", max_length=50)
+):
+    """
+    Cacheable variant of POST /api/synthesize returning audio/wav bytes
+    
+    Usable directly as an <audio> source. Carries a strong ETag derived from
+    the PCM content, voice, model and prompt version.
+    
+    Raises:
+        HTTPException: If synthesis fails
+    """
+    from app.services.audio import pcm_to_wav
+    
+    text = normalize_text(text)
+    voice = voice.strip()
+    if_none_match = request.headers.get("if-none-match")
+    
+    cached = gemini_service.speech_cache.get(speech_cache_key(text, voice))
+    if cached is not None and if_none_match:
+        etag = _speech_etag(voice, cached)
+        if etag_matches(if_none_match, etag):
+            return _not_modified(etag, SPEECH_HTTP_MAX_AGE)
+    
+    try:
+        pcm_data = await gemini_service.synthesize_pcm(text=text, voice_name=voice)
+    except ServiceError:
+        raise
     except Exception as e:
         logger.error(f"Synthesis error: {str(e)}")
         raise HTTPException(
             status_code=500,
             detail=f"Speech synthesis failed: {str(e)}"
         )
+    
+    etag = _speech_etag(voice, pcm_data)
+    if etag_matches(if_none_match, etag):
+        return _not_modified(etag, SPEECH_HTTP_MAX_AGE)
+    
+    return Response(
+        content=pcm_to_wav(pcm_data),
+        media_type="audio/wav",
+        headers={"ETag": etag, "Cache-Control": cache_control(SPEECH_HTTP_MAX_AGE)}
+    )
+
+
+@router.post("/translate-and-speak")
+async def translate_and_speak(request: TranslateAndSpeakRequest, x_client_id: Optional[str] = Header(None)):
+    """
+    Translate text and synthesize the translation in one round trip
+    
+    Streams newline-delimited JSON: a "translation" line as soon as the text
+    is ready, followed by an "audio" line (base64 WAV) once synthesis has
+    finished, or an "error" line if synthesis fails.
+    
+    Args:
+        request: Text, target language and voice name
+        
+    Returns:
+        application/x-ndjson stream
+        
+    Raises:
+        HTTPException: If translation fails (before anything is streamed)
+    """
+    try:
+        logger.info(f"Translate-and-speak to {request.target_language}")
+        translated_text = await gemini_service.translate(
+            text=request.text,
+            target_language=request.target_language
+        )
+    except ServiceError:
+        raise
+    except Exception as e:
+        logger.error(f"Translation error: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Translation failed: {str(e)}"
+        )
+    history_service.record(request.text, translated_text, request.target_language, client_id=x_client_id)
+    
+    async def stream():
+        yield json.dumps({
+            "type": "translation",
+            "original_text": request.text,
+            "translated_text": translated_text,
+            "language": request.target_language
+        }) + "\n"
+        try:
+            wav_data = await gemini_service.synthesize_speech(
+                text=translated_text,
+                voice_name=request.voice
+            )
+            yield json.dumps({
+                "type": "audio",
+                "format": "wav",
+                "sample_rate": 24000,
+                "audio_base64": await _encode_audio(wav_data)
+            }) + "\n"
+        except Exception as e:
+            logger.error(f"Synthesis error: {str(e)}")
+            yield json.dumps({
+                "type": "error",
+                "stage": "synthesis",
+                "detail": f"Speech synthesis failed: {str(e)}"
+            }) + "\n"
+    
+    return StreamingResponse(
+        stream(),
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 
 @router.post("/translate-audio", response_model=AudioTranslationResponse)
 async def translate_audio(
     file: UploadFile = File(...),
-    target_language: str = Form("English")
+    target_language: str = Form("English"),
+    x_client_id: Optional[str] = Header(None)
 ):
     """
     Translate audio file to text and target language using Google Gemini API
@@ -123,6 +430,9 @@ async def translate_audio(
         )
         
         logger.info(f"Audio translation successful. Original: '{result['original'][:50]}...', Translated: '{result['translated'][:50]}...'")
+        history_service.record(result["original"], result["translated"], target_language, source="audio",
+                               client_id=x_client_id)
+        speech_prefetcher.schedule(result["translated"])
         
         return AudioTranslationResponse(
             original_text=result["original"],
@@ -132,6 +442,8 @@ async def translate_audio(
         
     except HTTPException:
         raise
+    except ServiceError:
+        raise
     except Exception as e:
         logger.error(f"Audio translation error: {str(e)}")
         raise HTTPException(
@@ -0,0 +1,232 @@
+"""
+Upstream context caching for stable system instructions
+
+Gemini can store a system instruction server-side as a cached content
+resource (`cachedContents/...`) that later requests reference by name instead
+of re-sending the text. One cached context is kept per (model, system
+instruction) pair: it is created in the background the first time the pair
+is seen, its TTL is extended shortly before it expires, and it is dropped
+when the API reports it missing. Until a context is ready, or whenever it
+cannot be used, requests carry the instruction inline exactly as before.
+
+The API refuses to cache fewer than a model-dependent minimum of tokens
+(1,024 to 4,096 for current models). Instructions estimated below
+`min_tokens` are never offered for caching, since creation would always fail
+and every request would go inline anyway. The translation and TTS
+instructions in this service are a few hundred characters, so caching stays
+inactive for them until an instruction (e.g. with a glossary) grows past the
+minimum.
+"""
+import asyncio
+import logging
+import time
+from typing import Callable, Dict, Optional
+
+import httpx
+
+from app.utils.cache import MIN_CACHE_TOKENS, cache_key, estimate_tokens
+from app.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class CachedContext:
+    """A cached content resource and its expiry"""
+
+    def __init__(self, name: str, expires_at: float):
+        """
+        Args:
+            name: Resource name (cachedContents/...)
+            expires_at: time.monotonic() deadline after which the API drops it
+        """
+        self.name = name
+        self.expires_at = expires_at
+
+
+class ContextCacheManager:
+    """Creates, refreshes and resolves cached contexts for generateContent requests"""
+
+    def __init__(self, base_url: str, api_key: Optional[str], get_client: Callable[[], httpx.AsyncClient],
+                 enabled: bool = False, ttl: float = 3600.0, refresh_margin: float = 300.0,
+                 min_remaining: float = 60.0, failure_backoff: float = 600.0,
+                 min_tokens: int = MIN_CACHE_TOKENS):
+        """
+        Initialize context cache manager
+
+        Args:
+            base_url: Gemini REST base URL (…/v1beta)
+            api_key: Gemini API key
+            get_client: Returns the shared HTTP client
+            enabled: Whether requests may reference cached contexts
+            ttl: Lifetime requested for each cached context, in seconds
+            refresh_margin: Extend a context once less than this many seconds remain
+            min_remaining: Stop referencing a context with less time left than this
+            failure_backoff: Seconds before retrying a pair whose creation failed
+            min_tokens: Instructions estimated below this many tokens are always
+                sent inline (the API would reject them)
+        """
+        self.base_url = base_url
+        self.api_key = api_key
+        self.get_client = get_client
+        self.enabled = enabled
+        self.ttl = ttl
+        self.refresh_margin = min(refresh_margin, ttl / 2)
+        self.min_remaining = min(min_remaining, self.refresh_margin)
+        self.failure_backoff = failure_backoff
+        self.min_tokens = min_tokens
+        self._contexts: Dict[str, CachedContext] = {}
+        self._failed_until: Dict[str, float] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+
+    @staticmethod
+    def _instruction(request_body: dict) -> Optional[dict]:
+        instruction = request_body.get("systemInstruction")
+        if not instruction or "cachedContent" in request_body:
+            return None
+        return instruction
+
+    @staticmethod
+    def _text(instruction: dict) -> str:
+        return "".join(part.get("text", "") for part in instruction.get("parts", []))
+
+    @staticmethod
+    def _key(model: str, instruction: dict) -> str:
+        return cache_key("context", model, ContextCacheManager._text(instruction))
+
+    def prepare(self, model: str, request_body: dict) -> dict:
+        """
+        Swap the inline system instruction for a cached context reference
+
+        Returns the request body unchanged while no usable context exists, and
+        schedules its creation (or refresh) in the background. Instructions
+        below min_tokens are always left inline.
+
+        Args:
+            model: Model name the request is sent to
+            request_body: generateContent body with an inline systemInstruction
+
+        Returns:
+            Request body to send
+        """
+        if not self.enabled or not self.api_key:
+            return request_body
+        instruction = self._instruction(request_body)
+        if instruction is None:
+            return request_body
+        if estimate_tokens(self._text(instruction)) < self.min_tokens:
+            metrics.inc("context_cache_total", result="too_small")
+            return request_body
+
+        key = self._key(model, instruction)
+        now = time.monotonic()
+        context = self._contexts.get(key)
+        if context is not None and context.expires_at - now < self.min_remaining:
+            self._contexts.pop(key, None)
+            context = None
+
+        if context is None:
+            metrics.inc("context_cache_total", result="miss")
+            if self._failed_until.get(key, 0.0) <= now:
+                self._schedule(key, self._create(key, model, instruction))
+            return request_body
+
+        if context.expires_at - now < self.refresh_margin:
+            self._schedule(key, self._refresh(key, context))
+        metrics.inc("context_cache_total", result="hit")
+        body = {k: v for k, v in request_body.items() if k != "systemInstruction"}
+        body["cachedContent"] = context.name
+        return body
+
+    @staticmethod
+    def is_cache_error(response: httpx.Response) -> bool:
+        """True if a request failed because its cached context is missing or expired"""
+        if response.status_code not in (400, 403, 404):
+            return False
+        return "cachedcontent" in response.text.lower().replace("_", "")
+
+    def invalidate(self, model: str, request_body: dict) -> None:
+        """Forget the context for a request body's instruction (used after a cache error)"""
+        instruction = self._instruction(request_body)
+        if instruction is None:
+            return
+        if self._contexts.pop(self._key(model, instruction), None) is not None:
+            metrics.inc("context_cache_total", result="fallback")
+
+    def _schedule(self, key: str, coro) -> None:
+        if key in self._tasks:
+            coro.close()
+            return
+        task = asyncio.ensure_future(coro)
+        self._tasks[key] = task
+        task.add_done_callback(lambda _: self._tasks.pop(key, None))
+
+    def _ttl(self) -> str:
+        return f"{int(self.ttl)}s"
+
+    async def _create(self, key: str, model: str, instruction: dict) -> None:
+        started = time.monotonic()
+        try:
+            response = await self.get_client().post(
+                f"{self.base_url}/cachedContents",
+                params={"key": self.api_key},
+                json={"model": f"models/{model}", "systemInstruction": instruction, "ttl": self._ttl()},
+                timeout=15.0
+            )
+            if response.status_code != 200:
+                raise Exception(f"{response.status_code} - {response.text[:200]}")
+            name = response.json()["name"]
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.info(f"Context cache unavailable for {model}, sending instructions inline: {str(e)}")
+            self._failed_until[key] = time.monotonic() + self.failure_backoff
+            metrics.inc("context_cache_ops_total", op="create", status="failed")
+            return
+
+        self._contexts[key] = CachedContext(name, started + self.ttl)
+        self._failed_until.pop(key, None)
+        metrics.inc("context_cache_ops_total", op="create", status="ok")
+        metrics.set_gauge("context_cache_entries", len(self._contexts))
+
+    async def _refresh(self, key: str, context: CachedContext) -> None:
+        started = time.monotonic()
+        try:
+            response = await self.get_client().patch(
+                f"{self.base_url}/{context.name}",
+                params={"key": self.api_key, "updateMask": "ttl"},
+                json={"ttl": self._ttl()},
+                timeout=15.0
+            )
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"Context cache refresh failed: {str(e)}")
+            metrics.inc("context_cache_ops_total", op="refresh", status="failed")
+            return
+
+        if response.status_code == 200:
+            context.expires_at = started + self.ttl
+            metrics.inc("context_cache_ops_total", op="refresh", status="ok")
+            return
+        metrics.inc("context_cache_ops_total", op="refresh", status="failed")
+        if response.status_code == 404:
+            # Gone upstream: the next request recreates it
+            self._contexts.pop(key, None)
+            metrics.set_gauge("context_cache_entries", len(self._contexts))
+
+    async def close(self) -> None:
+        """Cancel pending work and delete the contexts this process created"""
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+        contexts, self._contexts = list(self._contexts.values()), {}
+        metrics.set_gauge("context_cache_entries", 0)
+        for context in contexts:
+            try:
+                await self.get_client().delete(
+                    f"{self.base_url}/{context.name}", params={"key": self.api_key}, timeout=5.0
+                )
+            except Exception as e:
+                logger.info(f"Could not delete cached context {context.name}: {str(e)}")
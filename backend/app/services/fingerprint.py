@@ -0,0 +1,273 @@
+"""
+Audio fingerprinting for the transcription cache
+
+Uploads are decoded to mono PCM, resampled, trimmed of leading/trailing
+silence and peak-normalized, then reduced to a binary spectral fingerprint
+(sign of band-energy differences across frequency and time). Re-encoded
+copies of the same recording differ in a small fraction of bits, so lookups
+match on Hamming distance rather than on an exact hash of the file bytes.
+
+Memory stays bounded regardless of upload size: decoding stops after
+MAX_DECODE_SECONDS, only the first MAX_SECONDS of voiced audio are analyzed
+(plenty for a cache key), and spectra are computed in float32 blocks of
+BLOCK_FRAMES frames instead of one overlapped matrix over the whole file.
+
+numpy is imported lazily: it is only needed once audio is actually received.
+Formats other than WAV are decoded with the ffmpeg binary. Without it on the
+PATH, such uploads fall back to a byte hash (exact retries only) and a
+warning is logged once.
+"""
+import asyncio
+import hashlib
+import io
+import logging
+import shutil
+import subprocess
+import wave
+from typing import Any, List, NamedTuple, Optional, Tuple
+
+from app.utils.cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_RATE = 8000
+FRAME_SIZE = 1024         # 128 ms
+HOP_SIZE = 128            # 16 ms, heavy overlap keeps bits stable under small time shifts
+NUM_BANDS = 17            # 16 bits per frame
+BAND_RANGE = (300.0, 3000.0)
+SILENCE_RATIO = 0.05      # 5 ms windows below 5% of peak RMS are silence
+ENERGY_FLOOR = 1e-3       # band energies below -30 dB of the loudest band are treated as equal
+MAX_SECONDS = 60          # voiced audio analyzed per recording
+MAX_DECODE_SECONDS = 120  # audio decoded per upload (leaves room for leading silence)
+BLOCK_FRAMES = 256        # frames transformed at once (~1 MB of float32 per block)
+
+
+class AudioFingerprint(NamedTuple):
+    """Fingerprint of one recording"""
+    key: str                  # exact-match key
+    bits: Optional[Any]       # packed bits, one row per frame (None if audio could not be decoded)
+    frames: int
+
+
+def _decode_wav(data: bytes):
+    import numpy as np
+
+    with wave.open(io.BytesIO(data)) as wav:
+        channels = wav.getnchannels()
+        width = wav.getsampwidth()
+        rate = wav.getframerate()
+        if width not in (1, 2, 4):
+            raise ValueError(f"Unsupported WAV sample width: {width}")
+        samples = np.empty(min(wav.getnframes(), rate * MAX_DECODE_SECONDS), dtype=np.float32)
+        # Convert and downmix ten seconds at a time, so only mono float32 is held in full
+        filled = 0
+        while filled < len(samples):
+            raw = wav.readframes(min(rate * 10, len(samples) - filled))
+            if not raw:
+                break
+            if width == 1:
+                block = (np.frombuffer(raw, dtype=np.uint8).astype(np.float32) - 128.0) / 128.0
+            elif width == 2:
+                block = np.frombuffer(raw, dtype="<i2").astype(np.float32) / 32768.0
+            else:
+                block = np.frombuffer(raw, dtype="<i4").astype(np.float32) / 2147483648.0
+            if channels > 1:
+                block = block[: len(block) // channels * channels].reshape(-1, channels).mean(axis=1)
+            samples[filled:filled + len(block)] = block
+            filled += len(block)
+    return samples[:filled], rate
+
+
+def _decode_ffmpeg(data: bytes):
+    import numpy as np
+
+    result = subprocess.run(
+        ["ffmpeg", "-v", "error", "-i", "pipe:0", "-t", str(MAX_DECODE_SECONDS), "-f", "s16le", "-ac", "1", "-ar", str(SAMPLE_RATE), "pipe:1"],
+        input=data,
+        capture_output=True,
+        timeout=30
+    )
+    if result.returncode != 0:
+        raise ValueError(result.stderr.decode("utf-8", "replace").strip())
+    return np.frombuffer(result.stdout, dtype="<i2").astype(np.float32) / 32768.0, SAMPLE_RATE
+
+
+_ffmpeg_warned = False
+
+
+def decode_audio(data: bytes):
+    """
+    Decode an upload to mono float32 PCM at SAMPLE_RATE
+
+    WAV is decoded in-process; other containers (M4A, MP3, ...) need ffmpeg on
+    the PATH. Only the first MAX_DECODE_SECONDS are decoded.
+
+    Returns:
+        numpy array of samples, or None if the audio could not be decoded
+    """
+    import numpy as np
+
+    try:
+        if data[:4] == b"RIFF" and data[8:12] == b"WAVE":
+            samples, rate = _decode_wav(data)
+        elif shutil.which("ffmpeg"):
+            samples, rate = _decode_ffmpeg(data)
+        else:
+            global _ffmpeg_warned
+            if not _ffmpeg_warned:
+                _ffmpeg_warned = True
+                logger.warning("ffmpeg not found on PATH: non-WAV uploads only match byte-identical retries")
+            return None
+    except Exception as e:
+        logger.info(f"Audio decode failed, falling back to byte hash: {str(e)}")
+        return None
+
+    if rate != SAMPLE_RATE and len(samples):
+        samples = _resample(samples, rate)
+    return samples
+
+
+def _resample(samples, rate: int):
+    """Linear resampling to SAMPLE_RATE, a second of output at a time (np.interp works in float64)"""
+    import numpy as np
+
+    step = rate / SAMPLE_RATE
+    resampled = np.empty(int(len(samples) / step), dtype=np.float32)
+    for start in range(0, len(resampled), SAMPLE_RATE):
+        positions = np.arange(start, min(start + SAMPLE_RATE, len(resampled))) * step
+        low = int(positions[0])
+        high = min(int(positions[-1]) + 2, len(samples))
+        resampled[start:start + len(positions)] = np.interp(positions - low, np.arange(high - low), samples[low:high])
+    return resampled
+
+
+def compute_fingerprint(data: bytes) -> AudioFingerprint:
+    """
+    Fingerprint an uploaded recording
+
+    Falls back to a hash of the raw bytes when the audio cannot be decoded or
+    is too short, which still catches byte-identical retries.
+    """
+    import numpy as np
+
+    samples = decode_audio(data)
+    if samples is None or len(samples) < FRAME_SIZE * 2:
+        return AudioFingerprint("raw:" + hashlib.sha256(data).hexdigest(), None, 0)
+
+    # Trim leading/trailing silence at 5 ms resolution so padding differences do not shift frames
+    window = SAMPLE_RATE // 200
+    envelope = np.sqrt(np.mean(samples[: len(samples) // window * window].reshape(-1, window) ** 2, axis=1))
+    voiced = np.flatnonzero(envelope >= envelope.max() * SILENCE_RATIO)
+    if len(voiced) == 0:
+        return AudioFingerprint("raw:" + hashlib.sha256(data).hexdigest(), None, 0)
+    samples = samples[voiced[0] * window: min((voiced[-1] + 1) * window, voiced[0] * window + MAX_SECONDS * SAMPLE_RATE)]
+    if len(samples) < FRAME_SIZE * 2:
+        return AudioFingerprint("raw:" + hashlib.sha256(data).hexdigest(), None, 0)
+    samples = samples / np.float32(np.abs(samples).max() or 1.0)
+
+    energy = _band_energies(samples)
+    energy = np.log(np.maximum(energy, energy.max() * ENERGY_FLOOR))
+
+    band_diff = energy[:, :-1] - energy[:, 1:]
+    bits = (band_diff[1:] - band_diff[:-1]) > 0
+    packed = np.packbits(bits, axis=1)
+    return AudioFingerprint("fp:" + hashlib.sha256(packed.tobytes()).hexdigest(), packed, len(packed))
+
+
+def _band_energies(samples):
+    """Per-frame energy in NUM_BANDS log-spaced bands, one block of frames at a time"""
+    import numpy as np
+
+    freqs = np.fft.rfftfreq(FRAME_SIZE, 1.0 / SAMPLE_RATE)
+    edges = np.geomspace(BAND_RANGE[0], BAND_RANGE[1], NUM_BANDS + 1)
+    band_index = np.searchsorted(edges, freqs) - 1
+    # Bin-to-band summation as a matrix product
+    bands = np.zeros((len(freqs), NUM_BANDS), dtype=np.float32)
+    valid = np.flatnonzero((band_index >= 0) & (band_index < NUM_BANDS))
+    bands[valid, band_index[valid]] = 1.0
+    hann = np.hanning(FRAME_SIZE).astype(np.float32)
+
+    frame_count = 1 + (len(samples) - FRAME_SIZE) // HOP_SIZE
+    energy = np.empty((frame_count, NUM_BANDS), dtype=np.float64)
+    offsets = np.arange(FRAME_SIZE)[None, :]
+    for first in range(0, frame_count, BLOCK_FRAMES):
+        count = min(BLOCK_FRAMES, frame_count - first)
+        frames = samples[offsets + HOP_SIZE * np.arange(first, first + count)[:, None]]
+        frames *= hann
+        spectrum = np.fft.rfft(frames, axis=1)
+        power = spectrum.real ** 2 + spectrum.imag ** 2
+        energy[first:first + count] = power @ bands
+    return energy
+
+
+def bit_error_rate(a, b) -> float:
+    """Fraction of differing bits over the overlapping frames of two fingerprints"""
+    import numpy as np
+
+    rows = min(len(a), len(b))
+    if rows == 0:
+        return 1.0
+    differing = np.unpackbits(np.bitwise_xor(a[:rows], b[:rows])).sum()
+    total = rows * (NUM_BANDS - 1)
+    # Frames present in only one of the recordings count as fully different
+    return (differing + abs(len(a) - len(b)) * (NUM_BANDS - 1)) / (total + abs(len(a) - len(b)) * (NUM_BANDS - 1))
+
+
+class TranscriptCache:
+    """Transcripts keyed by audio fingerprint, with approximate matching"""
+
+    def __init__(self, maxsize: int = 500, ttl: float = 86400.0, max_bit_error_rate: float = 0.05,
+                 max_scan: int = 64):
+        """
+        Initialize transcript cache
+
+        Args:
+            maxsize: Maximum cached transcripts
+            ttl: Seconds a transcript stays valid
+            max_bit_error_rate: Maximum fraction of differing bits for a match
+            max_scan: Most recently used candidates compared per approximate lookup
+        """
+        self.max_bit_error_rate = max_bit_error_rate
+        self.max_scan = max_scan
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    async def lookup(self, fingerprint: AudioFingerprint) -> Optional[str]:
+        """
+        Transcript of the same or a near-identical recording
+
+        The exact lookup and candidate selection run on the event loop (the
+        cache is not thread-safe). The bit comparisons run in a worker thread
+        over a snapshot of at most max_scan candidates.
+        """
+        entry = self._cache.get(fingerprint.key)
+        if entry is not None:
+            return entry[1]
+        if fingerprint.bits is None:
+            return None
+
+        tolerance = max(2, fingerprint.frames // 50)
+        candidates = [
+            (key, candidate.bits) for key, (candidate, _) in self._cache.items()
+            if candidate.bits is not None and abs(candidate.frames - fingerprint.frames) <= tolerance
+        ][-self.max_scan:]
+        if not candidates:
+            return None
+        best_key = await asyncio.to_thread(self._closest, fingerprint.bits, candidates)
+        if best_key is None:
+            return None
+        entry = self._cache.get(best_key)
+        return entry[1] if entry is not None else None
+
+    def _closest(self, bits, candidates: List[Tuple[str, Any]]) -> Optional[str]:
+        best_key, best_rate = None, self.max_bit_error_rate
+        for key, candidate_bits in candidates:
+            rate = bit_error_rate(bits, candidate_bits)
+            if rate <= best_rate:
+                best_key, best_rate = key, rate
+        return best_key
+
+    def store(self, fingerprint: AudioFingerprint, transcript: str) -> None:
+        self._cache.set(fingerprint.key, (fingerprint, transcript))
+
+    def __len__(self) -> int:
+        return len(self._cache)
@@ -1,8 +1,30 @@
 import httpx
+import json
+import logging
 import os
-from typing import Optional
+import time
+from typing import AsyncIterator, Dict, List, Optional, Set, Tuple
 import asyncio
 import base64
+from app.services.context_cache import ContextCacheManager
+from app.services.fingerprint import TranscriptCache, compute_fingerprint
+from app.services.langid import LANGUAGE_NAMES, identify_source, language_code, language_id
+from app.services.speech_chunks import PcmStitcher, split_sentences
+from app.utils.bulkhead import bulkheads
+from app.utils import deadline
+from app.utils.cache import MIN_CACHE_TOKENS, TTLCache, normalize_text, translation_cache_key, speech_cache_key
+from app.utils.errors import ServiceError
+from app.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Bump when a prompt or system instruction changes so cached responses
+# (and their HTTP ETags) are invalidated
+TRANSLATE_PROMPT_VERSION = "2"
+TTS_PROMPT_VERSION = "1"
+
+# Request size buckets in bytes
+BYTE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
 
 
 class GeminiService:
@@ -11,7 +33,128 @@ class GeminiService:
     def __init__(self):
         self.api_key = os.getenv("GEMINI_API_KEY")
         self.model = os.getenv("GEMINI_MODEL", "gemini-2.0-flash-exp")
-        self.base_url = "https://generativelanguage.googleapis.com/v1beta"
+        self.base_url = os.getenv("GEMINI_BASE_URL", "https://generativelanguage.googleapis.com/v1beta").rstrip("/")
+        self._client: Optional[httpx.AsyncClient] = None
+        self.context_cache = ContextCacheManager(
+            self.base_url,
+            self.api_key,
+            self._get_client,
+            enabled=os.getenv("GEMINI_CONTEXT_CACHE_ENABLED", "false").lower() in ("1", "true", "yes"),
+            ttl=float(os.getenv("GEMINI_CONTEXT_CACHE_TTL", "3600")),
+            min_tokens=int(os.getenv("GEMINI_CONTEXT_CACHE_MIN_TOKENS", str(MIN_CACHE_TOKENS)))
+        )
+        self.translation_cache = TTLCache(
+            maxsize=int(os.getenv("TRANSLATION_CACHE_SIZE", "5000")),
+            ttl=float(os.getenv("TRANSLATION_CACHE_TTL", "86400"))
+        )
+        self.speech_cache = TTLCache(
+            maxsize=int(os.getenv("SPEECH_CACHE_SIZE", "200")),
+            ttl=float(os.getenv("SPEECH_CACHE_TTL", "86400")),
+            on_evict=self._on_speech_evicted
+        )
+        self.transcript_cache = TranscriptCache(
+            maxsize=int(os.getenv("TRANSCRIPT_CACHE_SIZE", "500")),
+            ttl=float(os.getenv("TRANSCRIPT_CACHE_TTL", "86400")),
+            max_scan=int(os.getenv("TRANSCRIPT_CACHE_MAX_SCAN", "64"))
+        )
+        # Multi-target requests up to this many characters use one structured call
+        self.multi_structured_max_chars = int(os.getenv("TRANSLATE_MULTI_STRUCTURED_MAX_CHARS", "300"))
+        # TTS texts longer than this are split at sentence boundaries and
+        # synthesized as concurrent chunks
+        self.tts_chunk_chars = int(os.getenv("TTS_CHUNK_CHARS", "400"))
+        self.tts_chunk_concurrency = int(os.getenv("TTS_CHUNK_CONCURRENCY", "3"))
+        self.tts_chunk_retries = int(os.getenv("TTS_CHUNK_RETRIES", "3"))
+        # Upstream requests currently in flight (load signal for background work)
+        self.active_requests = 0
+        # Speech cache key -> (upstream task, started by a prefetch)
+        self._speech_inflight: Dict[str, Tuple[asyncio.Future, bool]] = {}
+        # Speech cache keys filled speculatively and not yet requested by a client
+        self._prefetched: Set[str] = set()
+    
+    def _get_client(self) -> httpx.AsyncClient:
+        """
+        Shared HTTP client so requests reuse pooled keep-alive connections
+        instead of paying a TCP + TLS handshake per call
+        """
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                timeout=30.0,
+                limits=httpx.Limits(max_connections=100, max_keepalive_connections=20, keepalive_expiry=60.0)
+            )
+        return self._client
+    
+    async def warm_up(self):
+        """
+        Pre-open a connection to the Gemini API
+        
+        Fetches the model metadata, which is cheap and leaves a warm pooled
+        connection behind for the first real request.
+        """
+        if not self.api_key:
+            raise Exception("GEMINI_API_KEY not set, skipping upstream warm-up")
+        
+        client = self._get_client()
+        response = await client.get(
+            f"{self.base_url}/models/{self.model}",
+            params={"key": self.api_key},
+            timeout=10.0
+        )
+        if response.status_code != 200:
+            raise Exception(f"Warm-up request failed: {response.status_code}")
+    
+    async def _post(self, url: str, request_body: dict, timeout: float, workload: str,
+                    offload: bool = False) -> httpx.Response:
+        """
+        POST to the Gemini API through the shared client
+        
+        The call holds a slot in its workload bulkhead (text, tts, audio or
+        background) so slow classes cannot starve interactive translation. The
+        system instruction is replaced by a cached context when one is ready;
+        if the API no longer knows it, the request is resent inline. With
+        offload=True the body is serialized in a worker thread (audio payloads
+        of several MB would otherwise block the event loop).
+        """
+        workload = bulkheads.resolve(workload)
+        async with bulkheads.acquire(workload):
+            self.active_requests += 1
+            try:
+                body = self.context_cache.prepare(self.model, request_body)
+                response = await self._send(url, body, timeout, workload, offload)
+                if body is not request_body and self.context_cache.is_cache_error(response):
+                    self.context_cache.invalidate(self.model, request_body)
+                    response = await self._send(url, request_body, timeout, workload, offload)
+                return response
+            finally:
+                self.active_requests -= 1
+    
+    async def _send(self, url: str, request_body: dict, timeout: float, workload: str,
+                    offload: bool = False) -> httpx.Response:
+        """Send one request, recording its size and time to first byte"""
+        if offload:
+            payload = await asyncio.to_thread(lambda: json.dumps(request_body).encode("utf-8"))
+        else:
+            payload = json.dumps(request_body).encode("utf-8")
+        metrics.observe("gemini_request_bytes", len(payload), buckets=BYTE_BUCKETS, workload=workload)
+        
+        client = self._get_client()
+        request = client.build_request(
+            "POST", url, content=payload, headers={"Content-Type": "application/json"}, timeout=timeout
+        )
+        start = time.monotonic()
+        response = await client.send(request, stream=True)
+        try:
+            metrics.observe("gemini_first_byte_seconds", time.monotonic() - start, workload=workload)
+            await response.aread()
+        finally:
+            await response.aclose()
+        return response
+    
+    async def aclose(self):
+        """Close pooled upstream connections"""
+        await self.context_cache.close()
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
         
     async def translate(self, text: str, target_language: str, max_retries: int = 3) -> str:
         """
@@ -28,13 +171,28 @@ class GeminiService:
         Raises:
             Exception: If translation fails after all retries
         """
+        cache_key = translation_cache_key(text, target_language)
+        cached = self.translation_cache.get(cache_key)
+        if cached is not None:
+            metrics.inc("translation_cache_total", result="hit")
+            return cached
+        metrics.inc("translation_cache_total", result="miss")
+        
+        source, same_language = identify_source(text, target_language)
+        if same_language:
+            # Already in the target language: nothing to translate
+            return text
+        
         system_instruction = (
             "Aja como um tradutor linguístico profissional. "
             "Dada uma frase e uma língua de destino, forneça apenas a tradução do texto, "
             "sem qualquer formatação ou texto adicional."
         )
         
-        prompt = f'Traduza o seguinte texto para {target_language}: "{text}"'
+        if source is not None:
+            prompt = f'Traduza o seguinte texto de {LANGUAGE_NAMES[source]} para {target_language}: "{text}"'
+        else:
+            prompt = f'Traduza o seguinte texto para {target_language}: "{text}"'
         
         url = f"{self.base_url}/models/{self.model}:generateContent?key={self.api_key}"
         
@@ -53,39 +211,167 @@ class GeminiService:
         
         for attempt in range(max_retries):
             try:
-                async with httpx.AsyncClient(timeout=30.0) as client:
-                    response = await client.post(url, json=request_body)
-                    
-                    if response.status_code == 429:
-                        # Rate limit - exponential backoff
-                        wait_time = 2 ** attempt
-                        await asyncio.sleep(wait_time)
-                        continue
-                    
-                    if response.status_code != 200:
-                        error_data = response.json()
-                        raise Exception(f"API request failed: {response.status_code} - {error_data}")
-                    
-                    data = response.json()
-                    
-                    if not data.get("candidates") or not data["candidates"][0]:
-                        raise Exception("No translation result from API")
-                    
-                    translated_text = data["candidates"][0]["content"]["parts"][0]["text"].strip()
-                    return translated_text
-                    
+                response = await self._post(url, request_body, timeout=deadline.timeout(30.0), workload="text")
+                
+                if response.status_code == 429:
+                    # Rate limit - exponential backoff
+                    await deadline.backoff(2 ** attempt)
+                    continue
+                
+                if response.status_code != 200:
+                    error_data = response.json()
+                    raise Exception(f"API request failed: {response.status_code} - {error_data}")
+                
+                data = response.json()
+                
+                if not data.get("candidates") or not data["candidates"][0]:
+                    raise Exception("No translation result from API")
+                
+                translated_text = data["candidates"][0]["content"]["parts"][0]["text"].strip()
+                self.translation_cache.set(cache_key, translated_text)
+                return translated_text
+                
+            except ServiceError:
+                raise
+                
             except httpx.TimeoutException:
+                # A timeout cut short by the request deadline is final
+                deadline.check()
                 if attempt >= max_retries - 1:
                     raise Exception("Translation request timeout")
-                await asyncio.sleep(2 ** attempt)
+                await deadline.backoff(2 ** attempt)
                 
             except Exception as e:
                 if attempt >= max_retries - 1:
                     raise
-                await asyncio.sleep(2 ** attempt)
+                await deadline.backoff(2 ** attempt)
         
         raise Exception("Translation failed after all retries")
     
+    async def translate_multi(self, text: str,
+                              target_languages: List[str]) -> AsyncIterator[Tuple[str, Optional[str], Optional[str]]]:
+        """
+        Translate one text into several languages, yielding results as they complete
+        
+        Cached targets, and targets the text is already written in, are
+        yielded first. For short texts the remaining targets
+        share one structured upstream call (the input is sent once and output
+        is small); longer texts, and any target the structured call did not
+        return, are translated with concurrent per-target calls, so latency
+        tracks the slowest target rather than the sum.
+        
+        Args:
+            text: Text to translate
+            target_languages: Target languages (duplicates are ignored)
+            
+        Yields:
+            Tuples of (language, translated text or None, error message or None)
+        """
+        targets, seen = [], set()
+        for language in target_languages:
+            folded = normalize_text(language).casefold()
+            if folded and folded not in seen:
+                seen.add(folded)
+                targets.append(normalize_text(language))
+        
+        detection = language_id.detect(text)
+        source = detection.language if detection.confident else None
+        
+        pending = []
+        for language in targets:
+            cached = self.translation_cache.get(translation_cache_key(text, language))
+            if cached is not None:
+                metrics.inc("translation_cache_total", result="hit")
+                metrics.inc("translate_multi_targets_total", strategy="cached")
+                yield language, cached, None
+            elif source is not None and source == language_code(language):
+                metrics.inc("translate_multi_targets_total", strategy="skipped")
+                yield language, text, None
+            else:
+                pending.append(language)
+        
+        if len(pending) > 1 and len(normalize_text(text)) <= self.multi_structured_max_chars:
+            results = await self._translate_structured(text, pending)
+            for language in list(pending):
+                translated = results.get(language.casefold())
+                if translated:
+                    metrics.inc("translation_cache_total", result="miss")
+                    metrics.inc("translate_multi_targets_total", strategy="structured")
+                    self.translation_cache.set(translation_cache_key(text, language), translated)
+                    pending.remove(language)
+                    yield language, translated, None
+        
+        tasks = {asyncio.ensure_future(self.translate(text, language)): language for language in pending}
+        try:
+            while tasks:
+                done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    language = tasks.pop(task)
+                    metrics.inc("translate_multi_targets_total", strategy="per_target")
+                    if task.exception() is not None:
+                        yield language, None, str(task.exception())
+                    else:
+                        yield language, task.result(), None
+        finally:
+            # Consumer went away (client disconnect, deadline): stop the remaining calls
+            for task in tasks:
+                task.cancel()
+    
+    async def _translate_structured(self, text: str, target_languages: List[str]) -> Dict[str, str]:
+        """
+        Translate into several languages with one JSON-mode call
+        
+        Returns:
+            Translations keyed by case-folded language name (empty on any
+            failure, so callers fall back to per-target calls)
+        """
+        system_instruction = (
+            "Aja como um tradutor linguístico profissional. "
+            "Dada uma frase e uma lista de línguas de destino, forneça apenas as traduções, "
+            "num objeto JSON cujas chaves são exatamente os nomes das línguas indicadas "
+            "e cujos valores são as traduções, sem qualquer texto adicional."
+        )
+        
+        prompt = f'Traduza o seguinte texto para {", ".join(target_languages)}: "{text}"'
+        
+        url = f"{self.base_url}/models/{self.model}:generateContent?key={self.api_key}"
+        
+        request_body = {
+            "contents": [{
+                "parts": [{
+                    "text": prompt
+                }]
+            }],
+            "systemInstruction": {
+                "parts": [{
+                    "text": system_instruction
+                }]
+            },
+            "generationConfig": {
+                "response_mime_type": "application/json"
+            }
+        }
+        
+        try:
+            response = await self._post(url, request_body, timeout=deadline.timeout(30.0), workload="text")
+            if response.status_code != 200:
+                raise Exception(f"API request failed: {response.status_code}")
+            data = response.json()
+            result = json.loads(data["candidates"][0]["content"]["parts"][0]["text"])
+        except Exception as e:
+            # Overload and deadline errors included: the per-target calls
+            # report them per language rather than ending the stream
+            logger.warning(f"Structured multi-target translation failed, using per-target calls: {str(e)}")
+            return {}
+        
+        if not isinstance(result, dict):
+            return {}
+        return {
+            normalize_text(str(language)).casefold(): str(translated).strip()
+            for language, translated in result.items()
+            if isinstance(translated, str) and translated.strip()
+        }
+    
     async def translate_audio(self, audio_data: bytes, target_language: str, max_retries: int = 3) -> dict:
         """
         Transcribe and translate audio using Gemini API
@@ -101,6 +387,16 @@ class GeminiService:
         Raises:
             Exception: If translation fails after all retries
         """
+        # Repeat uploads (retries, re-encoded copies, a second target language)
+        # reuse the transcript and only need a text translation
+        fingerprint = await asyncio.to_thread(compute_fingerprint, audio_data)
+        transcript = await self.transcript_cache.lookup(fingerprint)
+        if transcript is not None:
+            metrics.inc("audio_transcript_cache_total", result="hit")
+            translated = await self.translate(transcript, target_language)
+            return {"original": transcript, "translated": translated}
+        metrics.inc("audio_transcript_cache_total", result="miss")
+        
         system_instruction = (
             "You are a professional transcriber and translator. "
             f"1. First, transcribe the audio exactly as spoken in its original language. "
@@ -109,8 +405,8 @@ class GeminiService:
             "and 'translated' (the translation in the target language)."
         )
         
-        # Encode audio to base64
-        audio_base64 = base64.b64encode(audio_data).decode('utf-8')
+        # Encode audio to base64 (off the event loop: uploads can be 20 MB)
+        audio_base64 = await asyncio.to_thread(lambda: base64.b64encode(audio_data).decode('utf-8'))
         
         url = f"{self.base_url}/models/{self.model}:generateContent?key={self.api_key}"
         
@@ -141,50 +437,57 @@ class GeminiService:
         
         for attempt in range(max_retries):
             try:
-                async with httpx.AsyncClient(timeout=60.0) as client:  # Longer timeout for audio
-                    response = await client.post(url, json=request_body)
-                    
-                    if response.status_code == 429:
-                        wait_time = 2 ** attempt
-                        await asyncio.sleep(wait_time)
-                        continue
-                    
-                    if response.status_code != 200:
-                        error_data = response.json()
-                        raise Exception(f"API request failed: {response.status_code} - {error_data}")
-                    
-                    data = response.json()
-                    
-                    if not data.get("candidates") or not data["candidates"][0]:
-                        raise Exception("No transcription result from API")
-                    
-                    # Parse the JSON response
-                    result_text = data["candidates"][0]["content"]["parts"][0]["text"].strip()
-                    
-                    # Try to parse as JSON
-                    import json
-                    try:
-                        result = json.loads(result_text)
-                        return {
-                            "original": result.get("original", ""),
-                            "translated": result.get("translated", "")
-                        }
-                    except json.JSONDecodeError:
-                        # Fallback: treat entire response as translated text
-                        return {
-                            "original": result_text,
-                            "translated": result_text
-                        }
-                    
+                response = await self._post(url, request_body, timeout=deadline.timeout(60.0), workload="audio", offload=True)  # Longer timeout for audio
+                
+                if response.status_code == 429:
+                    await deadline.backoff(2 ** attempt)
+                    continue
+                
+                if response.status_code != 200:
+                    error_data = response.json()
+                    raise Exception(f"API request failed: {response.status_code} - {error_data}")
+                
+                data = response.json()
+                
+                if not data.get("candidates") or not data["candidates"][0]:
+                    raise Exception("No transcription result from API")
+                
+                # Parse the JSON response
+                result_text = data["candidates"][0]["content"]["parts"][0]["text"].strip()
+                
+                # Try to parse as JSON
+                try:
+                    result = json.loads(result_text)
+                    original = result.get("original", "")
+                    translated = result.get("translated", "")
+                    if original and translated:
+                        self.transcript_cache.store(fingerprint, original)
+                        self.translation_cache.set(translation_cache_key(original, target_language), translated)
+                    return {
+                        "original": original,
+                        "translated": translated
+                    }
+                except json.JSONDecodeError:
+                    # Fallback: treat entire response as translated text
+                    return {
+                        "original": result_text,
+                        "translated": result_text
+                    }
+                
+            except ServiceError:
+                raise
+                
             except httpx.TimeoutException:
+                # A timeout cut short by the request deadline is final
+                deadline.check()
                 if attempt >= max_retries - 1:
                     raise Exception("Audio translation request timeout")
-                await asyncio.sleep(2 ** attempt)
+                await deadline.backoff(2 ** attempt)
                 
             except Exception as e:
                 if attempt >= max_retries - 1:
                     raise
-                await asyncio.sleep(2 ** attempt)
+                await deadline.backoff(2 ** attempt)
         
         raise Exception("Audio translation failed after all retries")
 
@@ -200,6 +503,159 @@ class GeminiService:
         Returns:
             Audio data in WAV format
         """
+        from app.services.audio import pcm_to_wav
+        return pcm_to_wav(await self.synthesize_pcm(text, voice_name))
+    
+    async def synthesize_pcm(self, text: str, voice_name: str = "Kore", background: bool = False) -> bytes:
+        """
+        Synthesize speech from text, returning raw PCM16 (24 kHz mono)
+        
+        Results are cached per (text, voice), and concurrent requests for the
+        same key share a single upstream call. A client request never joins
+        an in-flight prefetch (it waits in the background bulkhead and may be
+        shed); it starts its own call, which later requests join. Texts
+        longer than TTS_CHUNK_CHARS are synthesized in sentence chunks (see
+        synthesize_stream), each cached under its own key.
+        
+        Args:
+            text: Text to synthesize
+            voice_name: Voice name for TTS
+            background: True for speculative prefetches (not counted as client use)
+            
+        Returns:
+            Raw PCM16 audio data
+        """
+        cache_key = speech_cache_key(text, voice_name)
+        cached = self.speech_cache.get(cache_key)
+        if cached is not None:
+            metrics.inc("speech_cache_total", result="hit")
+            if not background:
+                self._consume_prefetched(cache_key)
+            return cached
+        
+        inflight = self._speech_inflight.get(cache_key)
+        if inflight is not None and (background or not inflight[1]):
+            metrics.inc("speech_cache_total", result="joined")
+            pcm_data = await asyncio.shield(inflight[0])
+            if not background:
+                self._consume_prefetched(cache_key)
+            return pcm_data
+        if inflight is not None:
+            # The prefetch keeps running; only this call is foreground
+            metrics.inc("tts_prefetch_superseded_total")
+        metrics.inc("speech_cache_total", result="miss")
+        
+        task = asyncio.ensure_future(self._request_speech(text, voice_name, cache_key, background))
+        self._speech_inflight[cache_key] = (task, background)
+        task.add_done_callback(lambda done: self._speech_done(cache_key, done))
+        return await asyncio.shield(task)
+    
+    def _speech_done(self, cache_key: str, task: asyncio.Future) -> None:
+        # A superseded prefetch must not drop the entry of the call that replaced it
+        entry = self._speech_inflight.get(cache_key)
+        if entry is not None and entry[0] is task:
+            del self._speech_inflight[cache_key]
+    
+    def _mark_prefetched(self, cache_key: str) -> None:
+        """Record a prefetch result, unless a client request superseded the prefetch"""
+        entry = self._speech_inflight.get(cache_key)
+        if entry is not None and entry[0] is asyncio.current_task():
+            self._prefetched.add(cache_key)
+    
+    async def synthesize_stream(self, text: str, voice_name: str = "Kore") -> AsyncIterator[bytes]:
+        """
+        Synthesize speech progressively, yielding PCM16 as chunks complete
+        
+        Long texts are split at sentence boundaries and the chunks are
+        synthesized concurrently (at most TTS_CHUNK_CONCURRENCY at a time).
+        Audio is yielded in order as soon as a chunk and all earlier ones are
+        ready, stitched with normalized pauses and short crossfades. Short
+        texts, and texts already cached, are yielded in one piece.
+        
+        Args:
+            text: Text to synthesize
+            voice_name: Voice name for TTS
+            
+        Yields:
+            Consecutive pieces of raw PCM16 audio
+        """
+        cache_key = speech_cache_key(text, voice_name)
+        chunks = split_sentences(text, self.tts_chunk_chars)
+        if len(chunks) <= 1 or cache_key in self.speech_cache or cache_key in self._speech_inflight:
+            yield await self.synthesize_pcm(text, voice_name)
+            return
+        
+        metrics.inc("speech_cache_total", result="miss")
+        pieces = []
+        async for pcm in self._synthesize_chunks(chunks, voice_name, background=False):
+            pieces.append(pcm)
+            yield pcm
+        self.speech_cache.set(cache_key, b"".join(pieces))
+    
+    async def _synthesize_chunks(self, chunks: List[str], voice_name: str, background: bool) -> AsyncIterator[bytes]:
+        """Synthesize chunks concurrently and yield the stitched audio in order"""
+        metrics.inc("tts_chunks_total", len(chunks))
+        semaphore = asyncio.Semaphore(self.tts_chunk_concurrency)
+        
+        async def run(chunk: str) -> bytes:
+            async with semaphore:
+                return await self._synthesize_chunk(chunk, voice_name, background)
+        
+        tasks = [asyncio.ensure_future(run(chunk)) for chunk in chunks]
+        stitcher = PcmStitcher()
+        try:
+            for task in tasks:
+                pcm = await task
+                # Stitching is vectorized but still CPU work: keep it off the loop
+                yield await asyncio.to_thread(stitcher.push, pcm)
+            yield stitcher.finish()
+        finally:
+            for task in tasks:
+                task.cancel()
+            if background:
+                # Only the full text counts as a prefetch, not its chunks
+                self._prefetched.difference_update(speech_cache_key(chunk, voice_name) for chunk in chunks)
+    
+    async def _synthesize_chunk(self, chunk: str, voice_name: str, background: bool) -> bytes:
+        """Synthesize one chunk, retrying it alone on failure"""
+        for attempt in range(self.tts_chunk_retries):
+            try:
+                return await self.synthesize_pcm(chunk, voice_name, background)
+            except ServiceError:
+                raise
+            except Exception as e:
+                if attempt >= self.tts_chunk_retries - 1:
+                    raise
+                metrics.inc("tts_chunk_retries_total")
+                logger.warning(f"TTS chunk failed (attempt {attempt + 1}), retrying: {e}")
+                await deadline.backoff(2 ** attempt)
+        raise Exception("TTS chunk failed after all retries")
+    
+    def speech_pending(self, text: str, voice_name: str = "Kore") -> bool:
+        """True if speech for (text, voice) is cached or being synthesized"""
+        cache_key = speech_cache_key(text, voice_name)
+        return cache_key in self._speech_inflight or cache_key in self.speech_cache
+    
+    def _consume_prefetched(self, cache_key: str) -> None:
+        if cache_key in self._prefetched:
+            self._prefetched.discard(cache_key)
+            metrics.inc("tts_prefetch_hits_total")
+    
+    def _on_speech_evicted(self, cache_key: str, _value: bytes) -> None:
+        if cache_key in self._prefetched:
+            self._prefetched.discard(cache_key)
+            metrics.inc("tts_prefetch_wasted_total")
+    
+    async def _request_speech(self, text: str, voice_name: str, cache_key: str, background: bool) -> bytes:
+        """Call Gemini TTS and store the PCM in the speech cache"""
+        chunks = split_sentences(text, self.tts_chunk_chars)
+        if len(chunks) > 1:
+            pcm_data = b"".join([pcm async for pcm in self._synthesize_chunks(chunks, voice_name, background)])
+            self.speech_cache.set(cache_key, pcm_data)
+            if background:
+                self._mark_prefetched(cache_key)
+            return pcm_data
+        
         system_instruction = "Você é um sintetizador de voz profissional."
         
         generation_config = {
@@ -229,31 +685,32 @@ class GeminiService:
             "generationConfig": generation_config
         }
         
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            response = await client.post(url, json=request_body)
-            
-            if response.status_code != 200:
-                error_data = response.json()
-                raise Exception(f"TTS API request failed: {response.status_code} - {error_data}")
-            
-            data = response.json()
-            
-            if not data.get("candidates") or not data["candidates"][0]:
-                raise Exception("No audio result from API")
-            
-            # Extract inline audio data
-            parts = data["candidates"][0]["content"]["parts"]
-            for part in parts:
-                if "inlineData" in part:
-                    # Found audio data
-                    pcm_base64 = part["inlineData"]["data"]
-                    pcm_data = base64.b64decode(pcm_base64)
-                    
-                    # Convert PCM to WAV
-                    from app.services.audio import pcm_to_wav
-                    return pcm_to_wav(pcm_data)
-            
-            raise Exception("No audio data found in response")
+        response = await self._post(url, request_body, timeout=deadline.timeout(30.0),
+                                   workload="background" if background else "tts")
+        
+        if response.status_code != 200:
+            error_data = response.json()
+            raise Exception(f"TTS API request failed: {response.status_code} - {error_data}")
+        
+        # Parsing and decoding the base64 PCM runs in a worker thread
+        data = await asyncio.to_thread(response.json)
+        
+        if not data.get("candidates") or not data["candidates"][0]:
+            raise Exception("No audio result from API")
+        
+        # Extract inline audio data
+        parts = data["candidates"][0]["content"]["parts"]
+        for part in parts:
+            if "inlineData" in part:
+                # Found audio data
+                pcm_base64 = part["inlineData"]["data"]
+                pcm_data = await asyncio.to_thread(base64.b64decode, pcm_base64)
+                self.speech_cache.set(cache_key, pcm_data)
+                if background:
+                    self._mark_prefetched(cache_key)
+                return pcm_data
+        
+        raise Exception("No audio data found in response")
 
 
 # Singleton instance
@@ -0,0 +1,355 @@
+"""
+Server-side translation history
+
+Append-only SQLite store with an FTS5 index over original and translated
+text. Entries are written in batches by a background task so recording a
+translation never adds latency to the request that produced it. Row IDs are
+monotonic and double as sync cursors.
+
+Entries belong to a client ID issued by the server: a random token signed
+with a key kept in the database (or HISTORY_CLIENT_SECRET), so IDs cannot be
+guessed or made up. The ID is a bearer secret: whoever holds it can read the
+history.
+"""
+import asyncio
+import base64
+import hashlib
+import hmac
+import logging
+import os
+import secrets
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from app.services.gemini import gemini_service
+from app.utils.cache import translation_cache_key
+from app.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS history (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    client_id TEXT,
+    original_text TEXT NOT NULL,
+    translated_text TEXT NOT NULL,
+    language TEXT NOT NULL,
+    source TEXT NOT NULL DEFAULT 'text',
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS history_client_id ON history (client_id, id);
+CREATE TABLE IF NOT EXISTS history_meta (
+    key TEXT PRIMARY KEY,
+    value BLOB NOT NULL
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS history_fts USING fts5(
+    original_text,
+    translated_text,
+    content='history',
+    content_rowid='id',
+    tokenize='unicode61 remove_diacritics 2'
+);
+CREATE TRIGGER IF NOT EXISTS history_ai AFTER INSERT ON history BEGIN
+    INSERT INTO history_fts (rowid, original_text, translated_text)
+    VALUES (new.id, new.original_text, new.translated_text);
+END;
+"""
+
+_COLUMNS = "id, client_id, original_text, translated_text, language, source, created_at"
+
+
+def fts_query(text: str) -> str:
+    """
+    Turn free text into a safe FTS5 query
+
+    Every term is quoted so user input cannot inject FTS5 operators, and the
+    last term is a prefix match to support search-as-you-type.
+    """
+    terms = ['"' + term.replace('"', '""') + '"' for term in text.split()]
+    if not terms:
+        return ""
+    terms[-1] += "*"
+    return " ".join(terms)
+
+
+class HistoryStore:
+    """Append-only SQLite history store with full-text search"""
+
+    def __init__(self, path: str):
+        """
+        Initialize history store
+
+        Args:
+            path: SQLite database file path
+        """
+        self.path = path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def open(self) -> None:
+        """Open the database and create the schema if needed"""
+        if self._conn is not None:
+            return
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def client_id_key(self) -> bytes:
+        """Key signing client IDs, created on first use and shared by every process using the database"""
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR IGNORE INTO history_meta (key, value) VALUES ('client_id_key', ?)",
+                (secrets.token_bytes(32),)
+            )
+            self._conn.commit()
+            return self._conn.execute("SELECT value FROM history_meta WHERE key = 'client_id_key'").fetchone()[0]
+
+    def append_many(self, entries: List[Dict]) -> None:
+        """Insert a batch of entries in one transaction"""
+        rows = [
+            (e.get("client_id"), e["original_text"], e["translated_text"], e["language"],
+             e.get("source", "text"), e.get("created_at") or time.time())
+            for e in entries
+        ]
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT INTO history (client_id, original_text, translated_text, language, source, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                rows
+            )
+
+    def latest_id(self, client_id: Optional[str] = None) -> int:
+        """Highest row ID visible to a client (0 if empty)"""
+        with self._lock:
+            if client_id is None:
+                row = self._conn.execute("SELECT MAX(id) FROM history").fetchone()
+            else:
+                row = self._conn.execute("SELECT MAX(id) FROM history WHERE client_id = ?", (client_id,)).fetchone()
+        return row[0] or 0
+
+    def since(self, cursor: int, limit: int, client_id: Optional[str] = None) -> List[Dict]:
+        """Entries with an ID greater than the cursor, oldest first"""
+        with self._lock:
+            if client_id is None:
+                rows = self._conn.execute(
+                    f"SELECT {_COLUMNS} FROM history WHERE id > ? ORDER BY id LIMIT ?",
+                    (cursor, limit)
+                ).fetchall()
+            else:
+                rows = self._conn.execute(
+                    f"SELECT {_COLUMNS} FROM history WHERE client_id = ? AND id > ? ORDER BY id LIMIT ?",
+                    (client_id, cursor, limit)
+                ).fetchall()
+        return [dict(row) for row in rows]
+
+    def search(self, query: str, limit: int, before: Optional[int] = None,
+               client_id: Optional[str] = None) -> List[Dict]:
+        """Full-text search, newest first, paginated with a 'before' cursor"""
+        match = fts_query(query)
+        if not match:
+            return []
+        sql = (
+            f"SELECT {', '.join('h.' + c.strip() for c in _COLUMNS.split(','))} "
+            "FROM history_fts JOIN history h ON h.id = history_fts.rowid "
+            "WHERE history_fts MATCH ?"
+        )
+        params: list = [match]
+        if before is not None:
+            sql += " AND history_fts.rowid < ?"
+            params.append(before)
+        if client_id is not None:
+            sql += " AND h.client_id = ?"
+            params.append(client_id)
+        sql += " ORDER BY history_fts.rowid DESC LIMIT ?"
+        params.append(limit)
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [dict(row) for row in rows]
+
+    def top_phrases(self, limit: int, min_uses: int = 1) -> List[Tuple[str, str, str, int]]:
+        """
+        Most frequently translated (text, language) pairs
+
+        Only translations this server made are counted: imported entries are
+        client-supplied and must not end up in the shared cache or in
+        phrase packs.
+
+        Args:
+            limit: Maximum pairs returned
+            min_uses: Pairs translated fewer times are left out
+
+        Returns:
+            List of (original_text, language, latest translated_text, uses)
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT original_text, language, translated_text, COUNT(*) AS uses, MAX(id) "
+                "FROM history WHERE source = 'text' GROUP BY original_text, language "
+                "HAVING uses >= ? ORDER BY uses DESC LIMIT ?",
+                (min_uses, limit)
+            ).fetchall()
+        return [(row[0], row[1], row[2], row[3]) for row in rows]
+
+
+class HistoryService:
+    """Batches history writes off the request path"""
+
+    def __init__(self, store: HistoryStore, batch_size: int = 100,
+                 flush_interval: float = 0.5, max_pending: int = 10000,
+                 client_id_secret: Optional[str] = None):
+        """
+        Initialize history service
+
+        Args:
+            store: History store
+            batch_size: Maximum entries written per transaction
+            flush_interval: Seconds to wait for more entries before writing a partial batch
+            max_pending: Maximum buffered entries; further entries are dropped
+            client_id_secret: Key signing client IDs (default: generated and
+                kept in the database)
+        """
+        self.store = store
+        self._client_id_key = client_id_secret.encode() if client_id_secret else None
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        await asyncio.to_thread(self.store.open)
+        if self._client_id_key is None:
+            self._client_id_key = await asyncio.to_thread(self.store.client_id_key)
+        self._queue = asyncio.Queue(maxsize=self.max_pending)
+        self._task = asyncio.create_task(self._writer())
+
+    async def stop(self) -> None:
+        """Flush pending entries and close the store"""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+            await self._flush(self._drain(self.max_pending))
+        await asyncio.to_thread(self.store.close)
+
+    def _sign(self, token: str) -> str:
+        digest = hmac.new(self._client_id_key, token.encode(), hashlib.sha256).digest()[:16]
+        return base64.urlsafe_b64encode(digest).rstrip(b"=").decode()
+
+    def issue_client_id(self) -> str:
+        """New client ID: 192 random bits and their signature"""
+        token = secrets.token_urlsafe(24)
+        return f"{token}.{self._sign(token)}"
+
+    def verified_client_id(self, client_id: Optional[str]) -> Optional[str]:
+        """The client ID if this server issued it, else None"""
+        if not client_id or self._client_id_key is None:
+            return None
+        token, _, signature = client_id.strip().partition(".")
+        if not token or not hmac.compare_digest(signature.encode(), self._sign(token).encode()):
+            return None
+        return client_id.strip()
+
+    def record(self, original_text: str, translated_text: str, language: str,
+               source: str = "text", client_id: Optional[str] = None,
+               created_at: Optional[float] = None) -> None:
+        """
+        Buffer an entry for the background writer (never blocks)
+
+        Args:
+            original_text: Text that was translated
+            translated_text: Translation
+            language: Target language
+            source: text or audio for translations made here, import for
+                uploaded entries (never used to prime the cache)
+            client_id: Client the entry belongs to (X-Client-Id); an ID this
+                server did not issue is dropped and the entry stays unowned
+            created_at: Time of the translation, if it was made elsewhere
+        """
+        if self._queue is None:
+            return
+        entry = {
+            "client_id": self.verified_client_id(client_id),
+            "original_text": original_text,
+            "translated_text": translated_text,
+            "language": language,
+            "source": source,
+            "created_at": created_at if created_at is not None else time.time()
+        }
+        try:
+            self._queue.put_nowait(entry)
+        except asyncio.QueueFull:
+            metrics.inc("history_dropped_total")
+
+    def _drain(self, limit: int) -> List[Dict]:
+        batch = []
+        while len(batch) < limit:
+            try:
+                batch.append(self._queue.get_nowait())
+            except asyncio.QueueEmpty:
+                break
+        return batch
+
+    async def _flush(self, batch: List[Dict]) -> None:
+        if not batch:
+            return
+        try:
+            await asyncio.to_thread(self.store.append_many, batch)
+            metrics.inc("history_written_total", len(batch))
+            metrics.observe("history_batch_size", len(batch), buckets=(1, 5, 10, 25, 50, 100, 250))
+        except Exception as e:
+            logger.error(f"History write failed, dropping {len(batch)} entries: {str(e)}")
+            metrics.inc("history_dropped_total", len(batch))
+
+    async def _writer(self) -> None:
+        batch: List[Dict] = []
+        try:
+            while True:
+                batch = [await self._queue.get()]
+                deadline = time.monotonic() + self.flush_interval
+                while len(batch) < self.batch_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    try:
+                        batch.append(await asyncio.wait_for(self._queue.get(), timeout=remaining))
+                    except asyncio.TimeoutError:
+                        break
+                batch.extend(self._drain(self.batch_size - len(batch)))
+                pending, batch = batch, []
+                await self._flush(pending)
+        except asyncio.CancelledError:
+            # Entries collected but not yet handed to the store
+            await self._flush(batch)
+            raise
+
+    async def prime_cache(self, limit: int = 500) -> None:
+        """Warm the translation cache with the most frequently translated phrases"""
+        phrases = await asyncio.to_thread(self.store.top_phrases, limit)
+        for original_text, language, translated_text, _ in phrases:
+            gemini_service.translation_cache.set(
+                translation_cache_key(original_text, language),
+                translated_text
+            )
+        metrics.set_gauge("translation_cache_primed", len(phrases))
+
+# Singleton instance
+history_service = HistoryService(
+    HistoryStore(os.getenv("HISTORY_DB_PATH", "data/history.sqlite3")),
+    batch_size=int(os.getenv("HISTORY_BATCH_SIZE", "100")),
+    flush_interval=float(os.getenv("HISTORY_FLUSH_INTERVAL", "0.5")),
+    client_id_secret=os.getenv("HISTORY_CLIENT_SECRET") or None
+)
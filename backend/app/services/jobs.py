@@ -0,0 +1,464 @@
+"""
+Asynchronous translation jobs
+
+Long audio and text translations are accepted immediately, persisted in a
+local SQLite queue and processed by a bounded pool of background workers, so
+HTTP requests never wait on upstream retries. Queued and interrupted jobs are
+picked up again after a restart.
+
+Several worker processes may share one database. A worker claims a job under
+a lease it renews while the job runs; only jobs whose lease has expired (their
+worker crashed or was killed) are returned to the queue, so a job running in
+another live process is never started twice.
+"""
+import asyncio
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Dict, List, Optional
+
+from app.services.gemini import gemini_service
+from app.services.history import history_service
+from app.utils.bulkhead import bulkheads
+from app.utils.errors import OverloadedError
+from app.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+JOB_KINDS = ("audio", "text")
+FINAL_STATUSES = ("completed", "failed")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    status TEXT NOT NULL,
+    target_language TEXT NOT NULL,
+    text TEXT,
+    audio BLOB,
+    content_type TEXT,
+    result TEXT,
+    error TEXT,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    client_id TEXT,
+    owner TEXT,
+    lease_expires REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_status_created ON jobs (status, created_at);
+"""
+
+# Columns returned to clients (the audio payload stays in the database)
+_PUBLIC_COLUMNS = "id, kind, status, target_language, result, error, created_at, started_at, finished_at"
+
+
+class QueueFullError(Exception):
+    """Raised when the job queue has reached its maximum depth"""
+
+
+class LeaseLostError(Exception):
+    """Raised when a running job's lease expired and another process may own it"""
+
+
+class JobStore:
+    """SQLite-backed persistent job queue"""
+
+    def __init__(self, path: str, lease_seconds: float = 60.0):
+        """
+        Initialize job store
+
+        Args:
+            path: SQLite database file path
+            lease_seconds: How long a claim stays valid without being renewed
+        """
+        self.path = path
+        self.lease_seconds = lease_seconds
+        # Unique per process lifetime, so a restarted process never mistakes
+        # its predecessor's claims for its own
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def open(self) -> None:
+        """Open the database and create the schema if needed"""
+        if self._conn is not None:
+            return
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        columns = {row["name"] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+        for column, kind in (("client_id", "TEXT"), ("owner", "TEXT"), ("lease_expires", "REAL")):
+            if column not in columns:
+                self._conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} {kind}")
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def create(self, kind: str, target_language: str, text: Optional[str],
+               audio: Optional[bytes], content_type: Optional[str], client_id: Optional[str] = None) -> Dict:
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (id, kind, status, target_language, text, audio, content_type, created_at, client_id) "
+                "VALUES (?, ?, 'queued', ?, ?, ?, ?, ?, ?)",
+                (job_id, kind, target_language, text, audio, content_type, now, client_id)
+            )
+        return {"id": job_id, "kind": kind, "status": "queued", "target_language": target_language,
+                "result": None, "error": None, "created_at": now, "started_at": None, "finished_at": None}
+
+    def claim_next(self) -> Optional[Dict]:
+        """Atomically lease the oldest queued job to this process and return it with its payload"""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT * FROM jobs WHERE status = 'queued' ORDER BY created_at LIMIT 1"
+                ).fetchone()
+                if row is None:
+                    self._conn.execute("COMMIT")
+                    return None
+                started_at = time.time()
+                self._conn.execute(
+                    "UPDATE jobs SET status = 'running', started_at = ?, owner = ?, lease_expires = ? WHERE id = ?",
+                    (started_at, self.owner, started_at + self.lease_seconds, row["id"])
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        job = dict(row)
+        job["status"] = "running"
+        job["started_at"] = started_at
+        return job
+
+    def finish(self, job_id: str, result: Optional[Dict] = None, error: Optional[str] = None) -> bool:
+        """
+        Record the outcome and drop the payload, which is no longer needed
+
+        Returns:
+            False if this process no longer holds the job's lease (the
+            outcome is discarded; the job's current owner records its own)
+        """
+        status = "failed" if error is not None else "completed"
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = ?, audio = NULL "
+                "WHERE id = ? AND status = 'running' AND owner = ?",
+                (status, json.dumps(result) if result is not None else None, error, time.time(), job_id, self.owner)
+            )
+            return cursor.rowcount > 0
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        with self._lock:
+            row = self._conn.execute(f"SELECT {_PUBLIC_COLUMNS} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+    def count(self, status: str) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM jobs WHERE status = ?", (status,)).fetchone()[0]
+
+    def renew(self, job_id: str) -> bool:
+        """
+        Extend this process's lease on a running job
+
+        Returns:
+            False if the lease was lost (it expired and the job was requeued)
+        """
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET lease_expires = ? WHERE id = ? AND status = 'running' AND owner = ?",
+                (time.time() + self.lease_seconds, job_id, self.owner)
+            )
+            return cursor.rowcount > 0
+
+    def requeue_expired(self) -> int:
+        """Return running jobs whose lease has expired (their worker died) to the queue"""
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET status = 'queued', started_at = NULL, owner = NULL, lease_expires = NULL "
+                "WHERE status = 'running' AND (lease_expires IS NULL OR lease_expires < ?)",
+                (time.time(),)
+            )
+            return cursor.rowcount
+
+    def release_owned(self) -> int:
+        """Return the jobs this process is running to the queue (on shutdown)"""
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET status = 'queued', started_at = NULL, owner = NULL, lease_expires = NULL "
+                "WHERE status = 'running' AND owner = ?",
+                (self.owner,)
+            )
+            return cursor.rowcount
+
+    def requeue(self, job_id: str) -> None:
+        """Return a job this process is running to the queue"""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = 'queued', started_at = NULL, owner = NULL, lease_expires = NULL "
+                "WHERE id = ? AND status = 'running' AND owner = ?",
+                (job_id, self.owner)
+            )
+
+    def purge(self, older_than: float) -> int:
+        """Delete finished jobs older than the given timestamp"""
+        with self._lock:
+            cursor = self._conn.execute(
+                "DELETE FROM jobs WHERE status IN ('completed', 'failed') AND finished_at < ?",
+                (older_than,)
+            )
+            return cursor.rowcount
+
+
+class JobQueue:
+    """Bounded worker pool processing jobs from a JobStore"""
+
+    def __init__(self, store: JobStore, workers: int = 2, max_queued: int = 100,
+                 retention: float = 86400.0, poll_interval: float = 5.0):
+        """
+        Initialize job queue
+
+        Args:
+            store: Persistent job store
+            workers: Number of concurrent workers
+            max_queued: Maximum number of queued jobs before submissions are rejected
+            retention: Seconds to keep finished jobs before purging them
+            poll_interval: Seconds an idle worker waits before re-checking the store
+        """
+        self.store = store
+        self.workers = workers
+        self.max_queued = max_queued
+        self.retention = retention
+        self.poll_interval = poll_interval
+        self._tasks: List[asyncio.Task] = []
+        self._pending: Optional[asyncio.Semaphore] = None
+        self._watchers: Dict[str, List[asyncio.Event]] = {}
+        self._last_purge = 0.0
+        self._last_recovery = 0.0
+
+    async def start(self) -> None:
+        """Open the store, recover jobs with expired leases and start the workers"""
+        await asyncio.to_thread(self.store.open)
+        requeued = await asyncio.to_thread(self.store.requeue_expired)
+        if requeued:
+            logger.info(f"Requeued {requeued} job(s) with an expired lease")
+        queued = await asyncio.to_thread(self.store.count, "queued")
+        metrics.set_gauge("jobs_queue_depth", queued)
+        self._pending = asyncio.Semaphore(queued)
+        self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+
+    async def stop(self) -> None:
+        """Stop the workers and return their running jobs to the queue"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        released = await asyncio.to_thread(self.store.release_owned)
+        if released:
+            logger.info(f"Requeued {released} running job(s) on shutdown")
+        await asyncio.to_thread(self.store.close)
+
+    async def submit(self, kind: str, target_language: str, text: Optional[str] = None,
+                     audio: Optional[bytes] = None, content_type: Optional[str] = None,
+                     client_id: Optional[str] = None) -> Dict:
+        """
+        Persist a new job and wake a worker
+
+        Args:
+            client_id: Client whose history the result is recorded in
+
+        Raises:
+            QueueFullError: If the queue is at its maximum depth
+        """
+        if kind not in JOB_KINDS:
+            raise ValueError(f"Unknown job kind: {kind}")
+        # Counted in the shared database: the gauge only sees this process's view
+        if await asyncio.to_thread(self.store.count, "queued") >= self.max_queued:
+            metrics.inc("jobs_rejected_total", kind=kind)
+            raise QueueFullError("Job queue is full, try again later")
+
+        job = await asyncio.to_thread(self.store.create, kind, target_language, text, audio, content_type, client_id)
+        metrics.add_gauge("jobs_queue_depth", 1)
+        metrics.inc("jobs_submitted_total", kind=kind)
+        self._pending.release()
+        return job
+
+    async def get(self, job_id: str) -> Optional[Dict]:
+        return await asyncio.to_thread(self.store.get, job_id)
+
+    async def wait_for_change(self, job_id: str, timeout: float) -> None:
+        """Wait until the job changes status or the timeout expires"""
+        event = asyncio.Event()
+        self._watchers.setdefault(job_id, []).append(event)
+        try:
+            await asyncio.wait_for(event.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            watchers = self._watchers.get(job_id, [])
+            if event in watchers:
+                watchers.remove(event)
+            if not watchers:
+                self._watchers.pop(job_id, None)
+
+    def _notify(self, job_id: str) -> None:
+        for event in self._watchers.get(job_id, []):
+            event.set()
+
+    async def _worker(self, index: int) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._pending.acquire(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+            job = await asyncio.to_thread(self.store.claim_next)
+            if job is None:
+                await self._maybe_recover()
+                await self._maybe_purge()
+                continue
+
+            metrics.add_gauge("jobs_queue_depth", -1)
+            metrics.observe("jobs_wait_seconds", job["started_at"] - job["created_at"], kind=job["kind"])
+            self._notify(job["id"])
+            await self._process(job)
+
+    async def _process(self, job: Dict) -> None:
+        start = time.monotonic()
+        result, error = None, None
+        try:
+            with bulkheads.workload("background"):
+                result = await self._run_leased(job)
+        except asyncio.CancelledError:
+            raise
+        except LeaseLostError:
+            logger.warning(f"Abandoned job {job['id']}: its lease expired")
+            metrics.inc("jobs_lease_lost_total", kind=job["kind"])
+            return
+        except OverloadedError:
+            # Shed in favour of interactive traffic: put the job back and back off
+            await asyncio.to_thread(self.store.requeue, job["id"])
+            metrics.add_gauge("jobs_queue_depth", 1)
+            metrics.inc("jobs_requeued_total", kind=job["kind"])
+            self._notify(job["id"])
+            await asyncio.sleep(self.poll_interval)
+            self._pending.release()
+            return
+        except Exception as e:
+            logger.error(f"Job {job['id']} failed: {str(e)}")
+            error = str(e) or type(e).__name__
+
+        if not await asyncio.to_thread(self.store.finish, job["id"], result, error):
+            logger.warning(f"Discarded the outcome of job {job['id']}: its lease expired")
+            metrics.inc("jobs_lease_lost_total", kind=job["kind"])
+            return
+        if result is not None:
+            history_service.record(result["original_text"], result["translated_text"],
+                                   result["language"], source=job["kind"], client_id=job.get("client_id"))
+        status = "failed" if error is not None else "completed"
+        metrics.observe("jobs_processing_seconds", time.monotonic() - start, kind=job["kind"])
+        metrics.inc("jobs_finished_total", kind=job["kind"], status=status)
+        self._notify(job["id"])
+
+    async def _run_leased(self, job: Dict) -> Dict:
+        """
+        Run a job while renewing its lease in the background
+
+        Raises:
+            LeaseLostError: If a renewal found the lease gone; the run is cancelled
+        """
+        run = asyncio.ensure_future(self._run(job))
+        heartbeat = asyncio.ensure_future(self._renew_lease(job["id"]))
+        try:
+            await asyncio.wait((run, heartbeat), return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            heartbeat.cancel()
+            if not run.done():
+                run.cancel()
+        if not run.done():
+            raise LeaseLostError(f"Lost the lease on job {job['id']}")
+        return run.result()
+
+    async def _renew_lease(self, job_id: str) -> None:
+        """Renew the lease every third of its duration; returns once it is lost"""
+        while True:
+            await asyncio.sleep(self.store.lease_seconds / 3)
+            if not await asyncio.to_thread(self.store.renew, job_id):
+                return
+
+    async def _run(self, job: Dict) -> Dict:
+        if job["kind"] == "audio":
+            translation = await gemini_service.translate_audio(
+                audio_data=job["audio"],
+                target_language=job["target_language"]
+            )
+            return {
+                "original_text": translation["original"],
+                "translated_text": translation["translated"],
+                "language": job["target_language"]
+            }
+        translated_text = await gemini_service.translate(
+            text=job["text"],
+            target_language=job["target_language"]
+        )
+        return {
+            "original_text": job["text"],
+            "translated_text": translated_text,
+            "language": job["target_language"]
+        }
+
+    async def _recover_expired(self) -> None:
+        requeued = await asyncio.to_thread(self.store.requeue_expired)
+        if requeued:
+            logger.info(f"Requeued {requeued} job(s) with an expired lease")
+            metrics.add_gauge("jobs_queue_depth", requeued)
+            for _ in range(requeued):
+                self._pending.release()
+
+    async def _maybe_recover(self) -> None:
+        """Periodically requeue jobs whose worker, in any process, has died"""
+        now = time.monotonic()
+        if now - self._last_recovery < self.store.lease_seconds / 2:
+            return
+        self._last_recovery = now
+        await self._recover_expired()
+
+    async def _maybe_purge(self) -> None:
+        now = time.time()
+        if now - self._last_purge < 600:
+            return
+        self._last_purge = now
+        purged = await asyncio.to_thread(self.store.purge, now - self.retention)
+        if purged:
+            logger.info(f"Purged {purged} finished job(s)")
+
+
+# Singleton instance
+job_queue = JobQueue(
+    JobStore(
+        os.getenv("JOBS_DB_PATH", "data/jobs.sqlite3"),
+        lease_seconds=float(os.getenv("JOB_LEASE_SECONDS", "60"))
+    ),
+    workers=int(os.getenv("JOB_WORKERS", "2")),
+    max_queued=int(os.getenv("JOB_MAX_QUEUED", "100")),
+    retention=float(os.getenv("JOB_RETENTION_SECONDS", "86400"))
+)
@@ -0,0 +1,271 @@
+"""
+Local language identification
+
+A character-trigram naive Bayes classifier for the languages the app
+supports (Portuguese, English, Changana/Xitsonga). Profiles are built once
+from the small sample corpora below (at startup, through the readiness
+hooks) and a detection is a few dozen dict lookups, i.e. microseconds.
+
+Only confident detections are acted on. Inputs that are too short, whose
+best and second-best languages score too close, or that fit even the best
+language poorly (too many trigrams it has never seen) are reported as
+uncertain. The classifier also knows a few neighbouring languages the app
+does not translate (Spanish, French, Italian, Zulu, Swahili). Text closest to
+one of them is unknown rather than forced onto the nearest supported
+language, so Spanish is never taken for Portuguese and returned untranslated.
+"""
+import asyncio
+import math
+import os
+import re
+import time
+import unicodedata
+from collections import Counter
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from app.utils.metrics import metrics
+
+# Detection time buckets in seconds
+DETECT_BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.005)
+
+_SAMPLES = {
+    "pt": (
+        "Todos os seres humanos nascem livres e iguais em dignidade e em direitos. Dotados de razão e de "
+        "consciência, devem agir uns para com os outros em espírito de fraternidade. Bom dia, como estás? "
+        "Estou bem, obrigado. Qual é o teu nome? O meu nome é Maria e moro em Maputo com a minha família. "
+        "Preciso de ir ao hospital hoje porque a minha filha está doente. Onde fica a paragem do autocarro? "
+        "As crianças vão à escola de manhã e voltam para casa à tarde. Quanto custa este pão? Não tenho "
+        "dinheiro suficiente, mas posso pagar amanhã. Quando chove muito ficamos em casa e a estrada fica "
+        "cheia de água. A minha mãe cozinha xima com caril de amendoim e peixe. Gostaria de aprender a falar "
+        "inglês e changana. Podes ajudar-me a encontrar o mercado? Obrigada pela tua ajuda, até amanhã. "
+        "O meu pai trabalha na machamba todos os dias desde muito cedo. Nós estamos muito felizes com a "
+        "notícia. Por favor, fala mais devagar porque não percebo bem. A reunião começa às nove horas."
+    ),
+    "en": (
+        "All human beings are born free and equal in dignity and rights. They are endowed with reason and "
+        "conscience and should act towards one another in a spirit of brotherhood. Good morning, how are "
+        "you? I am fine, thank you. What is your name? My name is Maria and I live in Maputo with my family. "
+        "I need to go to the hospital today because my daughter is sick. Where is the bus stop? The children "
+        "go to school in the morning and come back home in the afternoon. How much does this bread cost? I "
+        "do not have enough money, but I can pay tomorrow. When it rains a lot we stay at home and the road "
+        "is full of water. My mother cooks maize porridge with peanut curry and fish. I would like to learn "
+        "to speak English and Changana. Can you help me find the market? Thank you for your help, see you "
+        "tomorrow. My father works in the field every day from very early. We are very happy with the news. "
+        "Please speak more slowly because I do not understand well. The meeting starts at nine o'clock."
+    ),
+    "ts": (
+        "Vanhu hinkwavo va velekiwa va ntshunxekile naswona va ringana hi xindzhuti ni timfanelo. Va "
+        "nyikiwile ku anakanya ni ripfalo naswona va fanele ku khomana hi moya wa vumakwerhu. Avuxeni, u "
+        "pfuke njhani? Ndzi pfuke kahle, ndza khensa. Inkomu swinene. Hi mani vito ra wena? Vito ra mina i "
+        "Maria naswona ndzi tshama eMaputo ni ndyangu wa mina. Ndzi lava ku ya exibedlhele namuntlha hikuva "
+        "n'wana wa mina wa nhwanyana u vabya. Xana xitichi xa bazi xi kwihi? Vana va ya exikolweni nimixo "
+        "kutani va vuya ekaya nimadyambu. Xinkwa lexi xi durha njhani? A ndzi na mali yo ringana, kambe "
+        "ndzi nga hakela mundzuku. Loko mpfula yi na ngopfu hi tshama ekaya naswona ndlela yi tala mati. "
+        "Manana wa mina u sweka vuswa ni matsavu ni tinhlampfi. Ndzi lava ku dyondza ku vulavula Xinghezi "
+        "ni Xichangana. Xana u nga ndzi pfuna ku kuma makete? Ndza khensa hi ku ndzi pfuna, hi ta vonana "
+        "mundzuku. Tatana wa mina u tirha ensin'wini siku rin'wana ni rin'wana ku sukela nimpundzu swinene. "
+        "Hi tsakile swinene hi mahungu lawa. Hi kombela u vulavula hi ku nonoka hikuva a ndzi twisisi kahle. "
+        "Nhlengeletano yi sungula hi nkarhi wa nkaye. Famba kahle, sala kahle."
+    ),
+}
+
+# Languages the app does not translate, profiled only so that text in them
+# is recognized as unknown instead of matching the closest supported language
+_OTHER_SAMPLES = {
+    "es": (
+        "Todos los seres humanos nacen libres e iguales en dignidad y derechos y, dotados como están de razón "
+        "y conciencia, deben comportarse fraternalmente los unos con los otros. Buenos días, ¿cómo estás? "
+        "Estoy bien, gracias. ¿Cómo te llamas? Me llamo María y vivo en Maputo con mi familia. Necesito ir al "
+        "hospital hoy porque mi hija está enferma. ¿Dónde está la parada del autobús? Los niños van a la "
+        "escuela por la mañana y vuelven a casa por la tarde. ¿Cuánto cuesta este pan? No tengo suficiente "
+        "dinero, pero puedo pagar mañana. Cuando llueve mucho nos quedamos en casa y la carretera se llena "
+        "de agua. Mi madre cocina pescado con salsa de cacahuete. ¿Puedes ayudarme a encontrar el mercado? "
+        "Gracias por tu ayuda, hasta mañana. Por favor, habla más despacio porque no entiendo bien."
+    ),
+    "fr": (
+        "Tous les êtres humains naissent libres et égaux en dignité et en droits. Ils sont doués de raison et "
+        "de conscience et doivent agir les uns envers les autres dans un esprit de fraternité. Bonjour, "
+        "comment vas-tu? Je vais bien, merci. Comment t'appelles-tu? Je m'appelle Maria et j'habite à Maputo "
+        "avec ma famille. Je dois aller à l'hôpital aujourd'hui parce que ma fille est malade. Où est l'arrêt "
+        "de bus? Les enfants vont à l'école le matin et rentrent à la maison l'après-midi. Combien coûte ce "
+        "pain? Je n'ai pas assez d'argent, mais je peux payer demain. Merci pour ton aide, à demain."
+    ),
+    "it": (
+        "Tutti gli esseri umani nascono liberi ed eguali in dignità e diritti. Essi sono dotati di ragione e "
+        "di coscienza e devono agire gli uni verso gli altri in spirito di fratellanza. Buongiorno, come "
+        "stai? Sto bene, grazie. Come ti chiami? Mi chiamo Maria e abito a Maputo con la mia famiglia. Devo "
+        "andare all'ospedale oggi perché mia figlia è malata. Dov'è la fermata dell'autobus? I bambini vanno "
+        "a scuola la mattina e tornano a casa il pomeriggio. Quanto costa questo pane? Non ho abbastanza "
+        "soldi, ma posso pagare domani. Grazie per il tuo aiuto, a domani."
+    ),
+    "zu": (
+        "Bonke abantu bazalwa bekhululekile futhi belingana ngesithunzi nangamalungelo. Banomcabango "
+        "nonembeza futhi kufanele baphathane ngomoya wobuzalwane. Sawubona, unjani? Ngiyaphila, ngiyabonga. "
+        "Ubani igama lakho? Igama lami nguMaria futhi ngihlala eMaputo nomndeni wami. Ngidinga ukuya "
+        "esibhedlela namuhla ngoba indodakazi yami iyagula. Likuphi ibhasi? Izingane ziya esikoleni "
+        "ekuseni bese zibuyela ekhaya ntambama. Lesi sinkwa sibiza malini? Anginayo imali eyanele, kodwa "
+        "ngingakhokha kusasa. Ngiyabonga ngosizo lwakho, sizobonana kusasa."
+    ),
+    "sw": (
+        "Watu wote wamezaliwa huru, hadhi na haki zao ni sawa. Wote wamejaliwa akili na dhamiri, hivyo "
+        "yapasa watendeane kindugu. Habari za asubuhi, hujambo? Sijambo, asante. Jina lako nani? Jina langu "
+        "ni Maria na ninaishi Maputo pamoja na familia yangu. Ninahitaji kwenda hospitali leo kwa sababu "
+        "binti yangu ni mgonjwa. Kituo cha basi kiko wapi? Watoto wanaenda shule asubuhi na kurudi nyumbani "
+        "mchana. Mkate huu unagharimu kiasi gani? Sina pesa za kutosha, lakini ninaweza kulipa kesho. "
+        "Asante kwa msaada wako, tutaonana kesho."
+    ),
+}
+
+LANGUAGE_NAMES = {"pt": "Português", "en": "Inglês", "ts": "Changana"}
+
+# Target language names (accents stripped, case-folded) accepted by the API
+_LANGUAGE_ALIASES = {
+    "pt": ("pt", "portugues", "portuguese", "portugues (mocambique)"),
+    "en": ("en", "english", "ingles"),
+    "ts": ("ts", "changana", "xichangana", "tsonga", "xitsonga", "shangaan"),
+}
+
+
+def _fold(text: str) -> str:
+    decomposed = unicodedata.normalize("NFKD", text.casefold())
+    return "".join(c for c in decomposed if not unicodedata.combining(c)).strip()
+
+
+_ALIAS_TO_CODE = {alias: code for code, aliases in _LANGUAGE_ALIASES.items() for alias in aliases}
+
+
+def language_code(name: str) -> Optional[str]:
+    """Code of a supported language from its display name (None if unsupported)"""
+    return _ALIAS_TO_CODE.get(_fold(name))
+
+
+_WORD = re.compile(r"[^\W\d_]+(?:'[^\W\d_]+)*")
+
+
+def _trigrams(text: str) -> List[str]:
+    """Character trigrams of each word, padded with spaces so word edges count"""
+    grams = []
+    for word in _WORD.findall(unicodedata.normalize("NFC", text.casefold())):
+        padded = f" {word} "
+        grams.extend(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+class Detection(NamedTuple):
+    """Result of language identification"""
+    language: Optional[str]     # best supported language code (None for empty or unknown input)
+    confident: bool
+    margin: float               # per-trigram log-likelihood lead over the runner-up
+    unseen: float = 0.0         # share of trigrams the best language's profile never saw
+
+
+class LanguageIdentifier:
+    """Character-trigram naive Bayes language identifier"""
+
+    def __init__(self, min_letters: int = 12, min_margin: float = 0.5, max_unseen: float = 0.45,
+                 smoothing: float = 0.5):
+        """
+        Initialize language identifier
+
+        Args:
+            min_letters: Inputs with fewer letters are never confident
+            min_margin: Minimum per-trigram log-likelihood lead for a confident result
+            max_unseen: Maximum share of trigrams missing from the best
+                language's profile for a confident result
+            smoothing: Additive smoothing for unseen trigrams
+        """
+        self.min_letters = min_letters
+        self.min_margin = min_margin
+        self.max_unseen = max_unseen
+        self.smoothing = smoothing
+        self._log_probs: Dict[str, Dict[str, float]] = {}
+        self._unseen: Dict[str, float] = {}
+
+    def load(self) -> None:
+        """Build trigram profiles from the sample corpora (idempotent)"""
+        if self._log_probs:
+            return
+        samples = {**_SAMPLES, **_OTHER_SAMPLES}
+        profiles = {code: Counter(_trigrams(sample)) for code, sample in samples.items()}
+        vocabulary = len(set().union(*profiles.values()))
+        for code, counts in profiles.items():
+            denominator = sum(counts.values()) + self.smoothing * vocabulary
+            self._log_probs[code] = {
+                gram: math.log((count + self.smoothing) / denominator) for gram, count in counts.items()
+            }
+            self._unseen[code] = math.log(self.smoothing / denominator)
+
+    async def warm_up(self) -> None:
+        """Readiness hook: build the profiles off the event loop"""
+        await asyncio.to_thread(self.load)
+
+    def detect(self, text: str) -> Detection:
+        """
+        Identify the language of a text
+
+        Args:
+            text: Text to classify
+
+        Returns:
+            Best supported language (None if the text is closest to an
+            unsupported one), whether it is confident, its score margin and
+            its share of unseen trigrams
+        """
+        if not self._log_probs:
+            self.load()
+        grams = _trigrams(text)
+        if not grams:
+            return Detection(None, False, 0.0)
+
+        scores = {}
+        for code, table in self._log_probs.items():
+            unseen = self._unseen[code]
+            scores[code] = sum([table.get(gram, unseen) for gram in grams]) / len(grams)
+        ranked = sorted(scores, key=scores.get, reverse=True)
+        margin = scores[ranked[0]] - scores[ranked[1]]
+        if ranked[0] not in _SAMPLES:
+            return Detection(None, False, margin)
+
+        table = self._log_probs[ranked[0]]
+        unseen = sum(1 for gram in grams if gram not in table) / len(grams)
+        # Each word of n letters yields n trigrams (with padding)
+        letters = len(grams)
+        confident = letters >= self.min_letters and margin >= self.min_margin and unseen <= self.max_unseen
+        return Detection(ranked[0], confident, margin, unseen)
+
+
+# Singleton instance
+language_id = LanguageIdentifier(
+    min_letters=int(os.getenv("LANGID_MIN_LETTERS", "12")),
+    min_margin=float(os.getenv("LANGID_MIN_MARGIN", "0.5")),
+    max_unseen=float(os.getenv("LANGID_MAX_UNSEEN", "0.45"))
+)
+
+
+def identify_source(text: str, target_language: str) -> Tuple[Optional[str], bool]:
+    """
+    Identify the source language of a text about to be translated
+
+    Args:
+        text: Text to translate
+        target_language: Target language for translation
+
+    Returns:
+        Tuple of (confidently detected language code or None,
+        whether the text is already in the target language)
+    """
+    started = time.perf_counter()
+    detection = language_id.detect(text)
+    metrics.observe("langid_seconds", time.perf_counter() - started, buckets=DETECT_BUCKETS)
+
+    if detection.language is None and detection.margin:
+        metrics.inc("langid_total", result="unknown")
+        return None, False
+    if not detection.confident:
+        metrics.inc("langid_total", result="uncertain")
+        return None, False
+    if detection.language == language_code(target_language):
+        metrics.inc("langid_total", result="skipped")
+        return detection.language, True
+    metrics.inc("langid_total", result="hinted")
+    return detection.language, False
@@ -0,0 +1,418 @@
+"""
+Offline phrase packs
+
+A phrase pack bundles the most-used translations for a language pair, with
+their synthesized audio, into one SQLite file that clients query locally.
+Rows live in a WITHOUT ROWID table keyed by an 8-byte hash of the
+normalized original text, so the file is stored sorted by key and a lookup
+is one B-tree probe. Audio is raw PCM16 compressed with zlib. A `manifest`
+table describes the pack (version, languages, key and audio encodings).
+
+Pack versions are stored on disk per (source, target, voice). A client that
+sends the version it has gets a delta: only the rows that were added or
+changed since, plus the keys of removed rows. Versions only advance when the
+content changed.
+
+Key: first 8 bytes of sha256 over the text after NFC normalization,
+whitespace collapsing and lower-casing.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+import sqlite3
+import time
+import zlib
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from app.services.gemini import gemini_service
+from app.services.history import HistoryStore, history_service
+from app.services.langid import language_code, language_id
+from app.utils.cache import normalize_text, speech_cache_key
+from app.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+PACK_FORMAT = 1
+
+# Pack names are built from request parameters and used as directory names
+_NAME_PART = re.compile(r"[A-Za-z]{1,50}")
+# Files this module writes into a pack directory: versions and deltas
+_PACK_FILE = re.compile(r"v(\d{6})\.sqlite3|d(\d{6})-(\d{6})\.sqlite3")
+
+_SCHEMA = """
+CREATE TABLE manifest (name TEXT PRIMARY KEY, value TEXT NOT NULL) WITHOUT ROWID;
+CREATE TABLE phrases (
+    key BLOB PRIMARY KEY,
+    digest BLOB NOT NULL,
+    original_text TEXT NOT NULL,
+    translated_text TEXT NOT NULL,
+    uses INTEGER NOT NULL,
+    audio BLOB
+) WITHOUT ROWID;
+CREATE TABLE removed (key BLOB PRIMARY KEY) WITHOUT ROWID;
+"""
+
+
+class PhraseEntry(NamedTuple):
+    """One phrase of a pack"""
+    original_text: str
+    translated_text: str
+    uses: int
+    pcm: Optional[bytes]
+
+
+def phrase_key(text: str) -> bytes:
+    """Lookup key of a phrase (see module docstring)"""
+    return hashlib.sha256(normalize_text(text).lower().encode("utf-8")).digest()[:8]
+
+
+def _entry_digests(entries: List[PhraseEntry]) -> Dict[bytes, Tuple[bytes, PhraseEntry]]:
+    """Key -> (content digest, entry); for duplicate keys the first entry wins"""
+    rows: Dict[bytes, Tuple[bytes, PhraseEntry]] = {}
+    for entry in entries:
+        key = phrase_key(entry.original_text)
+        if key in rows:
+            continue
+        audio_hash = hashlib.sha256(entry.pcm).hexdigest() if entry.pcm else ""
+        digest = hashlib.sha256(
+            "\x1f".join((entry.original_text, entry.translated_text, audio_hash)).encode("utf-8")
+        ).digest()[:8]
+        rows[key] = (digest, entry)
+    return rows
+
+
+def content_digest(digests: Dict[bytes, bytes]) -> str:
+    """Digest of a pack's content (key -> row digest), independent of version and build time"""
+    digest = hashlib.sha256()
+    for key in sorted(digests):
+        digest.update(key + digests[key])
+    return digest.hexdigest()[:16]
+
+
+def _write(path: str, manifest: Dict, rows: List[Tuple], removed: List[bytes] = ()) -> None:
+    """Write a pack file atomically (rows are compressed already)"""
+    tmp_path = f"{path}.tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    conn = sqlite3.connect(tmp_path)
+    try:
+        conn.execute("PRAGMA page_size=4096")
+        conn.executescript(_SCHEMA)
+        with conn:
+            conn.executemany("INSERT OR REPLACE INTO phrases VALUES (?, ?, ?, ?, ?, ?)", sorted(rows))
+            conn.executemany("INSERT OR IGNORE INTO removed VALUES (?)", [(key,) for key in sorted(removed)])
+            manifest = {**manifest, "entries": len(rows), "removed": len(removed)}
+            conn.executemany(
+                "INSERT INTO manifest VALUES (?, ?)",
+                [(name, json.dumps(value)) for name, value in sorted(manifest.items())]
+            )
+        conn.execute("VACUUM")
+    finally:
+        conn.close()
+    os.replace(tmp_path, path)
+
+
+def read_manifest(path: str) -> Dict:
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        return {name: json.loads(value) for name, value in conn.execute("SELECT name, value FROM manifest")}
+    finally:
+        conn.close()
+
+
+def _digests(path: str) -> Dict[bytes, bytes]:
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        return dict(conn.execute("SELECT key, digest FROM phrases"))
+    finally:
+        conn.close()
+
+
+def write_pack(path: str, entries: List[PhraseEntry], manifest: Dict) -> Dict:
+    """
+    Write a full pack
+
+    Args:
+        path: Output file
+        entries: Phrases to include (duplicate keys: the first wins)
+        manifest: Manifest fields (version, source, target, voice, ...)
+
+    Returns:
+        The manifest as written
+    """
+    digests = _entry_digests(entries)
+    rows = [
+        (key, digest, entry.original_text, entry.translated_text, entry.uses,
+         zlib.compress(entry.pcm, 9) if entry.pcm else None)
+        for key, (digest, entry) in digests.items()
+    ]
+    manifest = {
+        **manifest,
+        "format": PACK_FORMAT,
+        "kind": "full",
+        "key": "sha256(lower(nfc(collapse_whitespace(text))))[:8]",
+        "audio_encoding": "pcm16le+zlib",
+        "sample_rate": 24000,
+        "content_digest": content_digest({key: digest for key, (digest, _) in digests.items()}),
+        "created_at": time.time(),
+    }
+    _write(path, manifest, rows)
+    return read_manifest(path)
+
+
+def write_delta(base_path: str, new_path: str, out_path: str) -> Dict:
+    """
+    Write the rows of new_path that are missing or different in base_path,
+    plus the keys base_path has and new_path does not
+
+    Returns:
+        The delta manifest (kind "delta", base_version set)
+    """
+    base_manifest, new_manifest = read_manifest(base_path), read_manifest(new_path)
+    base = _digests(base_path)
+    conn = sqlite3.connect(f"file:{new_path}?mode=ro", uri=True)
+    try:
+        rows = [tuple(row) for row in conn.execute("SELECT * FROM phrases") if base.get(row[0]) != row[1]]
+        current = {row[0] for row in conn.execute("SELECT key FROM phrases")}
+    finally:
+        conn.close()
+    removed = [key for key in base if key not in current]
+    manifest = {**new_manifest, "kind": "delta", "base_version": base_manifest["version"], "created_at": time.time()}
+    _write(out_path, manifest, rows, removed)
+    return read_manifest(out_path)
+
+
+def apply_delta(base_path: str, delta_path: str, out_path: str) -> Dict:
+    """
+    Apply a delta to a full pack (what clients do on update)
+
+    Raises:
+        ValueError: If the delta was not made against this pack's version
+    """
+    base_manifest, delta_manifest = read_manifest(base_path), read_manifest(delta_path)
+    if delta_manifest.get("base_version") != base_manifest["version"]:
+        raise ValueError(
+            f"Delta is based on version {delta_manifest.get('base_version')}, pack is version {base_manifest['version']}"
+        )
+    shutil.copyfile(base_path, out_path)
+    conn = sqlite3.connect(out_path)
+    try:
+        conn.execute("ATTACH DATABASE ? AS delta", (delta_path,))
+        with conn:
+            conn.execute("DELETE FROM phrases WHERE key IN (SELECT key FROM delta.removed)")
+            conn.execute("INSERT OR REPLACE INTO phrases SELECT * FROM delta.phrases")
+            entries = conn.execute("SELECT COUNT(*) FROM phrases").fetchone()[0]
+            manifest = {**delta_manifest, "kind": "full", "entries": entries, "removed": 0}
+            manifest.pop("base_version", None)
+            conn.execute("DELETE FROM manifest")
+            conn.executemany(
+                "INSERT INTO manifest VALUES (?, ?)",
+                [(name, json.dumps(value)) for name, value in sorted(manifest.items())]
+            )
+        conn.execute("DETACH DATABASE delta")
+        conn.execute("VACUUM")
+    finally:
+        conn.close()
+    return manifest
+
+
+def select_phrases(phrases: List[Tuple[str, str, str, int]], source: str, target: str,
+                   limit: int) -> List[Tuple[str, str, int]]:
+    """
+    Most-used phrases of a language pair from history counts
+
+    History rows name the target language as the client sent it ("Inglês",
+    "English"), and do not record the source language, which is identified
+    locally (best guess, so short phrases are included too).
+
+    Args:
+        phrases: (original_text, language, translated_text, uses), most used first
+        source: Source language code
+        target: Target language code
+        limit: Maximum phrases returned
+
+    Returns:
+        List of (original_text, translated_text, uses), most used first
+    """
+    merged: Dict[bytes, List] = {}
+    for original_text, language, translated_text, uses in phrases:
+        if language_code(language) != target:
+            continue
+        key = phrase_key(original_text)
+        if key in merged:
+            merged[key][2] += uses
+            continue
+        if language_id.detect(original_text).language != source:
+            continue
+        merged[key] = [normalize_text(original_text), translated_text, uses]
+    ranked = sorted(merged.values(), key=lambda item: item[2], reverse=True)
+    return [tuple(item) for item in ranked[:limit]]
+
+
+class PhrasePacks:
+    """Builds, versions and serves phrase packs"""
+
+    def __init__(self, store: HistoryStore, directory: str, limit: int = 500, min_uses: int = 3,
+                 scan_limit: int = 20000, rebuild_interval: float = 300.0, keep: int = 5):
+        """
+        Initialize phrase packs
+
+        Args:
+            store: History store the usage counts come from
+            directory: Directory holding pack versions and deltas
+            limit: Maximum phrases per pack
+            min_uses: Phrases translated fewer times are never exported (they
+                may be private to one user)
+            scan_limit: Most-used history phrases considered per build
+            rebuild_interval: Seconds a built version is served before checking for changes
+            keep: Versions kept per pack (older clients get a full pack)
+        """
+        self.store = store
+        self.directory = directory
+        self.limit = limit
+        self.min_uses = min_uses
+        self.scan_limit = scan_limit
+        self.rebuild_interval = rebuild_interval
+        self.keep = keep
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._checked_at: Dict[str, float] = {}
+
+    @staticmethod
+    def pack_name(source: str, target: str, voice: str) -> str:
+        """
+        Directory name of a pack
+
+        Raises:
+            ValueError: If a part is not purely alphabetic
+        """
+        for part in (source, target, voice):
+            if not _NAME_PART.fullmatch(part):
+                raise ValueError(f"Invalid phrase pack name part: {part!r}")
+        return f"{source}-{target}-{voice}"
+
+    def _pack_dir(self, name: str) -> str:
+        root = os.path.realpath(self.directory)
+        directory = os.path.realpath(os.path.join(root, name))
+        if os.path.dirname(directory) != root:
+            raise ValueError(f"Phrase pack directory outside {self.directory}: {name!r}")
+        return directory
+
+    def _versions(self, name: str) -> List[int]:
+        directory = self._pack_dir(name)
+        if not os.path.isdir(directory):
+            return []
+        matches = (_PACK_FILE.fullmatch(f) for f in os.listdir(directory))
+        return sorted(int(m.group(1)) for m in matches if m and m.group(1))
+
+    def version_path(self, name: str, version: int) -> str:
+        return os.path.join(self._pack_dir(name), f"v{version:06d}.sqlite3")
+
+    async def collect(self, source: str, target: str, voice: str) -> List[PhraseEntry]:
+        """Most-used phrases of a pair, with their audio if it is in the speech cache"""
+        phrases = await asyncio.to_thread(self.store.top_phrases, self.scan_limit, self.min_uses)
+        selected = await asyncio.to_thread(select_phrases, phrases, source, target, self.limit)
+        # The speech cache is not thread-safe: read it on the event loop
+        return [
+            PhraseEntry(original, translated, uses,
+                        gemini_service.speech_cache.get(speech_cache_key(translated, voice)))
+            for original, translated, uses in selected
+        ]
+
+    async def latest(self, source: str, target: str, voice: str) -> Tuple[int, str]:
+        """
+        Current version of a pack, rebuilding it if the check interval passed
+
+        Returns:
+            Tuple of (version, file path)
+        """
+        name = self.pack_name(source, target, voice)
+        lock = self._locks.setdefault(name, asyncio.Lock())
+        async with lock:
+            versions = await asyncio.to_thread(self._versions, name)
+            if versions and time.monotonic() - self._checked_at.get(name, float("-inf")) < self.rebuild_interval:
+                return versions[-1], self.version_path(name, versions[-1])
+
+            entries = await self.collect(source, target, voice)
+            digests = await asyncio.to_thread(_entry_digests, entries)
+            digest = content_digest({key: row_digest for key, (row_digest, _) in digests.items()})
+            self._checked_at[name] = time.monotonic()
+            if versions:
+                current = self.version_path(name, versions[-1])
+                manifest = await asyncio.to_thread(read_manifest, current)
+                if manifest["content_digest"] == digest:
+                    return versions[-1], current
+
+            version = versions[-1] + 1 if versions else 1
+            path = self.version_path(name, version)
+            os.makedirs(self._pack_dir(name), exist_ok=True)
+            manifest = {"version": version, "source": source, "target": target, "voice": voice}
+            await asyncio.to_thread(write_pack, path, entries, manifest)
+            await asyncio.to_thread(self._prune, name, versions + [version])
+            metrics.inc("phrase_pack_builds_total")
+            logger.info(f"Built phrase pack {name} v{version} ({len(entries)} phrases)")
+            return version, path
+
+    def _prune(self, name: str, versions: List[int]) -> None:
+        """Drop versions beyond `keep` and the deltas that refer to them"""
+        kept = set(versions[-self.keep:])
+        directory = self._pack_dir(name)
+        for filename in os.listdir(directory):
+            match = _PACK_FILE.fullmatch(filename)
+            if match is None:
+                continue
+            numbers = {int(number) for number in match.groups() if number}
+            if not numbers <= kept:
+                os.remove(os.path.join(directory, filename))
+
+    async def export(self, source: str, target: str, voice: str,
+                     since_version: Optional[int] = None) -> Tuple[int, str, str]:
+        """
+        Pack file for a client
+
+        Args:
+            source: Source language code
+            target: Target language code
+            voice: TTS voice of the audio
+            since_version: Version the client already has (None: full pack)
+
+        Returns:
+            Tuple of (version, file path, "full" or "delta"); the path is
+            empty when the client is up to date
+
+        Raises:
+            ValueError: If the language codes or voice are not plain names
+        """
+        version, path = await self.latest(source, target, voice)
+        if since_version is None or since_version > version:
+            metrics.inc("phrase_pack_exports_total", kind="full")
+            return version, path, "full"
+        if since_version == version:
+            metrics.inc("phrase_pack_exports_total", kind="current")
+            return version, "", "current"
+
+        name = self.pack_name(source, target, voice)
+        base_path = self.version_path(name, since_version)
+        if not os.path.exists(base_path):
+            # Too old: the client replaces its pack
+            metrics.inc("phrase_pack_exports_total", kind="full")
+            return version, path, "full"
+        delta_path = os.path.join(self._pack_dir(name), f"d{since_version:06d}-{version:06d}.sqlite3")
+        async with self._locks[name]:
+            if not os.path.exists(delta_path):
+                await asyncio.to_thread(write_delta, base_path, path, delta_path)
+        metrics.inc("phrase_pack_exports_total", kind="delta")
+        return version, delta_path, "delta"
+
+
+# Singleton instance
+phrase_packs = PhrasePacks(
+    history_service.store,
+    os.getenv("PHRASE_PACK_DIR", "data/phrase_packs"),
+    limit=int(os.getenv("PHRASE_PACK_LIMIT", "500")),
+    min_uses=int(os.getenv("PHRASE_PACK_MIN_USES", "3")),
+    rebuild_interval=float(os.getenv("PHRASE_PACK_REBUILD_SECONDS", "300"))
+)
@@ -0,0 +1,123 @@
+"""
+Speculative TTS prefetch
+
+Almost every translation is followed by a synthesize request for the same
+text and the default voice. When enabled, each completed translation
+schedules a low-priority background synthesis so the follow-up request hits
+the speech cache (or joins the in-flight call). The queue is bounded,
+deduplicated, and shed whenever foreground traffic is busy.
+"""
+import asyncio
+import logging
+import os
+from typing import List, Optional, Set
+
+from app.services.gemini import gemini_service
+from app.utils.bulkhead import bulkheads
+from app.utils.cache import speech_cache_key
+from app.utils.errors import OverloadedError
+from app.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class SpeechPrefetcher:
+    """Bounded background queue of speculative synthesis jobs"""
+
+    def __init__(self, enabled: bool = False, voice: str = "Kore", max_queue: int = 50,
+                 workers: int = 1, max_text_length: int = 500, load_threshold: int = 8):
+        """
+        Initialize prefetcher
+
+        Args:
+            enabled: Whether translations schedule speculative synthesis
+            voice: Voice to prefetch (the client default)
+            max_queue: Maximum queued prefetches; further ones are dropped
+            workers: Concurrent prefetch syntheses
+            max_text_length: Longer translations are not prefetched
+            load_threshold: Foreground upstream requests above which prefetches are shed
+        """
+        self.enabled = enabled
+        self.voice = voice
+        self.max_queue = max_queue
+        self.workers = workers
+        self.max_text_length = max_text_length
+        self.load_threshold = load_threshold
+        self._queue: Optional[asyncio.Queue] = None
+        self._queued: Set[str] = set()
+        self._tasks: List[asyncio.Task] = []
+        self._active = 0
+
+    async def start(self) -> None:
+        if not self.enabled:
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._queue = None
+        self._queued.clear()
+
+    def _overloaded(self) -> bool:
+        return gemini_service.active_requests - self._active >= self.load_threshold
+
+    def schedule(self, text: str, voice: Optional[str] = None) -> None:
+        """Queue a speculative synthesis for a translation result (never blocks)"""
+        if self._queue is None or not text or len(text) > self.max_text_length:
+            return
+        voice = voice or self.voice
+        key = speech_cache_key(text, voice)
+        if key in self._queued or gemini_service.speech_pending(text, voice):
+            metrics.inc("tts_prefetch_total", outcome="deduplicated")
+            return
+        if self._overloaded():
+            metrics.inc("tts_prefetch_total", outcome="dropped_load")
+            return
+        try:
+            self._queue.put_nowait((key, text, voice))
+        except asyncio.QueueFull:
+            metrics.inc("tts_prefetch_total", outcome="dropped_full")
+            return
+        self._queued.add(key)
+        metrics.inc("tts_prefetch_total", outcome="enqueued")
+        metrics.set_gauge("tts_prefetch_queue_depth", self._queue.qsize())
+
+    async def _worker(self) -> None:
+        while True:
+            key, text, voice = await self._queue.get()
+            self._queued.discard(key)
+            metrics.set_gauge("tts_prefetch_queue_depth", self._queue.qsize())
+
+            # Foreground traffic picked up since scheduling: give way
+            if self._overloaded():
+                metrics.inc("tts_prefetch_total", outcome="cancelled")
+                continue
+
+            self._active += 1
+            try:
+                with bulkheads.workload("background"):
+                    await gemini_service.synthesize_pcm(text, voice, background=True)
+                metrics.inc("tts_prefetch_total", outcome="completed")
+            except asyncio.CancelledError:
+                raise
+            except OverloadedError:
+                metrics.inc("tts_prefetch_total", outcome="cancelled")
+            except Exception as e:
+                logger.warning(f"Speech prefetch failed: {str(e)}")
+                metrics.inc("tts_prefetch_total", outcome="failed")
+            finally:
+                self._active -= 1
+
+
+# Singleton instance
+speech_prefetcher = SpeechPrefetcher(
+    enabled=os.getenv("TTS_PREFETCH_ENABLED", "false").lower() in ("1", "true", "yes"),
+    voice=os.getenv("TTS_PREFETCH_VOICE", "Kore"),
+    max_queue=int(os.getenv("TTS_PREFETCH_MAX_QUEUE", "50")),
+    workers=int(os.getenv("TTS_PREFETCH_WORKERS", "1")),
+    load_threshold=int(os.getenv("TTS_PREFETCH_LOAD_THRESHOLD", "8"))
+)
@@ -0,0 +1,155 @@
+"""
+Chunked speech synthesis helpers
+
+Long texts are split at sentence boundaries into chunks that are synthesized
+concurrently and cached individually. The PCM16 chunks are stitched back in
+order: silence at each join is normalized to a fixed pause (trimmed or
+padded), then a short linear crossfade removes the click a hard cut would
+leave. The stitcher is incremental, so chunks can be streamed to the client
+as soon as they and all earlier ones are ready.
+
+numpy is imported lazily: it is only needed once a text is long enough to
+be chunked.
+"""
+import re
+from typing import List
+
+SAMPLE_RATE = 24000
+CROSSFADE_MS = 10
+PAUSE_MS = 160            # silence between two chunks after normalization
+SILENCE_LEVEL = 500       # |sample| below this (about -36 dBFS) counts as silence
+
+_SENTENCE_END = re.compile(r"(?<=[.!?…;:])\s+")
+_CLAUSE_END = re.compile(r"(?<=[,–—])\s+")
+
+
+def _split_long(sentence: str, max_chars: int) -> List[str]:
+    """Split a sentence longer than max_chars at clause breaks, then at spaces"""
+    pieces = []
+    for clause in _CLAUSE_END.split(sentence):
+        while len(clause) > max_chars:
+            cut = clause.rfind(" ", 0, max_chars + 1)
+            if cut <= 0:
+                cut = max_chars
+            pieces.append(clause[:cut].strip())
+            clause = clause[cut:].strip()
+        if clause:
+            pieces.append(clause)
+    return pieces
+
+
+def split_sentences(text: str, max_chars: int) -> List[str]:
+    """
+    Split text into chunks of whole sentences, each at most max_chars long
+
+    Consecutive sentences are packed into one chunk while they fit, so a
+    text is split into as few upstream calls as the limit allows. Only
+    sentences longer than the limit are broken up (at clause breaks, then
+    at spaces).
+
+    Args:
+        text: Text to split
+        max_chars: Maximum chunk length in characters
+
+    Returns:
+        Non-empty chunks in order (a single chunk for short texts)
+    """
+    text = text.strip()
+    if len(text) <= max_chars:
+        return [text] if text else []
+
+    chunks: List[str] = []
+    current = ""
+    for sentence in _SENTENCE_END.split(text):
+        for piece in _split_long(sentence, max_chars) if len(sentence) > max_chars else [sentence]:
+            if current and len(current) + 1 + len(piece) > max_chars:
+                chunks.append(current)
+                current = piece
+            else:
+                current = f"{current} {piece}" if current else piece
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+class PcmStitcher:
+    """Joins PCM16 mono chunks in order with normalized pauses and crossfades"""
+
+    def __init__(self, sample_rate: int = SAMPLE_RATE, crossfade_ms: int = CROSSFADE_MS,
+                 pause_ms: int = PAUSE_MS, silence_level: int = SILENCE_LEVEL):
+        """
+        Initialize stitcher
+
+        Args:
+            sample_rate: Sample rate of the PCM chunks
+            crossfade_ms: Length of the crossfade at each join
+            pause_ms: Silence between two chunks after normalization
+            silence_level: Absolute sample value below which audio counts as silence
+        """
+        self.fade = sample_rate * crossfade_ms // 1000
+        self.half_pause = sample_rate * pause_ms // 2000
+        self.silence_level = silence_level
+        self._tail = None       # held back until the next chunk's crossfade
+        self._started = False
+
+    def _normalize_edges(self, samples, lead: bool):
+        """Trim or pad edge silence to half a pause (the leading edge only if lead)"""
+        import numpy as np
+
+        loud = np.flatnonzero(np.abs(samples.astype(np.int32)) >= self.silence_level)
+        if not len(loud):
+            return samples[:0]
+        start = max(loud[0] - self.half_pause, 0) if lead else 0
+        end = loud[-1] + 1 + self.half_pause
+        pad_start = self.half_pause - loud[0] if lead and loud[0] < self.half_pause else 0
+        pad_end = max(end - len(samples), 0)
+        return np.concatenate([
+            np.zeros(pad_start, dtype=np.float32),
+            samples[start:end].astype(np.float32),
+            np.zeros(pad_end, dtype=np.float32),
+        ])
+
+    def push(self, pcm: bytes) -> bytes:
+        """
+        Add the next chunk
+
+        Args:
+            pcm: Raw PCM16 little-endian mono audio
+
+        Returns:
+            Audio that is final and can be emitted (the last few milliseconds
+            are held back for the next crossfade)
+        """
+        import numpy as np
+
+        samples = self._normalize_edges(np.frombuffer(pcm[: len(pcm) // 2 * 2], dtype="<i2"), self._started)
+        if not len(samples):
+            return b""
+
+        if self._tail is not None and len(self._tail):
+            fade = min(len(self._tail), len(samples))
+            ramp = np.linspace(0.0, 1.0, fade, endpoint=False, dtype=np.float32)
+            head = self._tail[len(self._tail) - fade:] * (1.0 - ramp) + samples[:fade] * ramp
+            samples = np.concatenate([self._tail[: len(self._tail) - fade], head, samples[fade:]])
+        self._started = True
+
+        split = max(len(samples) - self.fade, 0)
+        self._tail = samples[split:]
+        return self._to_pcm(samples[:split])
+
+    def finish(self) -> bytes:
+        """Return the held-back end of the last chunk"""
+        tail, self._tail = self._tail, None
+        return self._to_pcm(tail) if tail is not None else b""
+
+    @staticmethod
+    def _to_pcm(samples) -> bytes:
+        import numpy as np
+
+        return np.clip(np.rint(samples), -32768, 32767).astype("<i2").tobytes()
+
+
+def stitch_pcm(chunks: List[bytes]) -> bytes:
+    """Stitch complete PCM16 chunks in order (see PcmStitcher)"""
+    stitcher = PcmStitcher()
+    return b"".join([stitcher.push(chunk) for chunk in chunks] + [stitcher.finish()])
@@ -49,12 +49,15 @@ class TranslationService:
         # Get PCM audio from Gemini
         pcm_audio = await self.gemini_client.synthesize_speech(text, voice)
         
-        # Convert to WAV
+        # Convert to WAV and encode in a worker thread to keep the event loop free
         from app.services.audio import pcm_to_wav
+        import asyncio
         import base64
         
-        wav_audio = pcm_to_wav(pcm_audio, sample_rate=24000)
-        audio_base64 = base64.b64encode(wav_audio).decode('utf-8')
+        def _encode() -> str:
+            return base64.b64encode(pcm_to_wav(pcm_audio, sample_rate=24000)).decode('utf-8')
+        
+        audio_base64 = await asyncio.to_thread(_encode)
         
         return {
             "audio_base64": audio_base64,
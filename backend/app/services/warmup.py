@@ -0,0 +1,96 @@
+"""
+Startup warm-up and readiness tracking
+
+Liveness (/health) answers as soon as the server is listening. Readiness
+(/ready) only flips once every registered warm-up hook has run, so load
+balancers keep traffic away until upstream connections are open and caches
+are primed.
+"""
+import asyncio
+import logging
+import os
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+WarmupHook = Callable[[], Awaitable[None]]
+
+
+class Readiness:
+    """Runs warm-up hooks once and reports whether the service is ready"""
+
+    def __init__(self, timeout: float = 15.0):
+        """
+        Initialize readiness tracker
+
+        Args:
+            timeout: Maximum seconds a single warm-up hook may take
+        """
+        self.timeout = timeout
+        self.ready = False
+        self.started_at: Optional[float] = None
+        self.completed_at: Optional[float] = None
+        self.errors: Dict[str, str] = {}
+        self._hooks: List[Tuple[str, WarmupHook]] = []
+        self._task: Optional[asyncio.Task] = None
+
+    def register(self, name: str, hook: WarmupHook) -> None:
+        """
+        Register a warm-up hook
+
+        Args:
+            name: Hook name reported by /ready
+            hook: Coroutine function run once at startup
+        """
+        self._hooks = [(n, h) for n, h in self._hooks if n != name]
+        self._hooks.append((name, hook))
+
+    async def _run_hook(self, name: str, hook: WarmupHook) -> None:
+        try:
+            await asyncio.wait_for(hook(), timeout=self.timeout)
+        except Exception as e:
+            # Warm-up is best effort: a cold path is slower, not broken
+            self.errors[name] = str(e) or type(e).__name__
+            logger.warning(f"Warm-up hook '{name}' failed: {self.errors[name]}")
+
+    async def run(self) -> None:
+        """Run all registered hooks concurrently and mark the service ready"""
+        self.started_at = time.monotonic()
+        await asyncio.gather(*(self._run_hook(name, hook) for name, hook in self._hooks))
+        self.completed_at = time.monotonic()
+        self.ready = True
+        logger.info(f"Warm-up finished in {(self.completed_at - self.started_at) * 1000:.0f} ms")
+
+    def start(self) -> asyncio.Task:
+        """Start warm-up in the background so the server can accept liveness probes"""
+        if self._task is None:
+            self._task = asyncio.create_task(self.run())
+        return self._task
+
+    async def stop(self) -> None:
+        """Cancel warm-up if it is still running"""
+        if self._task and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+        self.ready = False
+
+    def status(self) -> dict:
+        """Readiness payload for the /ready endpoint"""
+        warmup_ms = None
+        if self.started_at is not None and self.completed_at is not None:
+            warmup_ms = round((self.completed_at - self.started_at) * 1000, 1)
+        return {
+            "status": "ready" if self.ready else "starting",
+            "hooks": [name for name, _ in self._hooks],
+            "warmup_ms": warmup_ms,
+            "errors": self.errors,
+        }
+
+
+# Singleton instance
+readiness = Readiness(timeout=float(os.getenv("WARMUP_TIMEOUT", "15")))
@@ -0,0 +1,269 @@
+"""
+Priority bulkheads for upstream work
+
+Each workload class (interactive text translation, TTS, audio translation,
+background work) gets its own concurrency limit and FIFO queue, so a burst
+in one class cannot take slots from another. When the total queue length
+crosses the pressure threshold, lower-priority classes are shed first:
+their new arrivals are rejected and their queued requests are evicted to
+make room for higher-priority ones.
+
+Within a class, waiters are served in weighted-fair order across clients
+(start-time fair queuing) rather than FIFO: each client's requests get
+successive virtual start tags spaced by 1/weight, and the smallest tag is
+served next. A client with a deep backlog therefore waits behind its own
+requests while others' new requests are interleaved, and when a class
+queue is full a newcomer with an earlier tag evicts the heaviest client's
+newest waiter instead of being rejected.
+"""
+import asyncio
+import contextvars
+import heapq
+import itertools
+import os
+from contextlib import asynccontextmanager, contextmanager
+from typing import Dict, List, Optional
+
+from app.utils import clients
+from app.utils.errors import OverloadedError
+from app.utils.metrics import metrics
+
+# Workload override for the current task (background jobs, prefetch)
+_workload_override: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("workload_override", default=None)
+
+
+class FairQueue:
+    """Weighted-fair wait queue (start-time fair queuing) keyed by client"""
+
+    def __init__(self):
+        self._heap: List[list] = []      # [start tag, seq, future, client, finish tag]
+        self._finish: Dict[str, float] = {}
+        self._seq = itertools.count()
+        self.virtual_time = 0.0
+
+    def tag(self, client: str) -> float:
+        """Start tag a new request from client would get"""
+        return max(self.virtual_time, self._finish.get(client, 0.0))
+
+    def push(self, future: asyncio.Future, client: str, weight: float = 1.0) -> None:
+        start = self.tag(client)
+        finish = self._finish[client] = start + 1.0 / weight
+        heapq.heappush(self._heap, [start, next(self._seq), future, client, finish])
+
+    def pop(self) -> Optional[asyncio.Future]:
+        """Remove and return the waiter to serve next, advancing virtual time"""
+        if not self._heap:
+            return None
+        start, _, future, _, _ = heapq.heappop(self._heap)
+        self.virtual_time = start
+        if len(self._finish) > 2 * len(self._heap) + 16:
+            # Tags at or behind virtual time are equivalent to no tag
+            self._finish = {c: f for c, f in self._finish.items() if f > start}
+        return future
+
+    def last_tag(self) -> Optional[float]:
+        """Start tag of the waiter that would be evicted first"""
+        return max(self._heap)[0] if self._heap else None
+
+    def pop_last(self) -> Optional[asyncio.Future]:
+        """Remove and return the waiter with the latest tag (the heaviest client's newest)"""
+        if not self._heap:
+            return None
+        entry = max(self._heap)
+        self._remove_entry(entry)
+        return entry[2]
+
+    def discard_done(self) -> int:
+        """Drop waiters whose future is already done (cancelled while queued, not yet cleaned up)"""
+        done = [entry for entry in self._heap if entry[2].done()]
+        for entry in done:
+            self._remove_entry(entry)
+        return len(done)
+
+    def remove(self, future: asyncio.Future) -> None:
+        for entry in self._heap:
+            if entry[2] is future:
+                self._remove_entry(entry)
+                return
+
+    def _remove_entry(self, entry: list) -> None:
+        self._heap.remove(entry)
+        heapq.heapify(self._heap)
+        start, _, _, client, finish = entry
+        # Give the slot back if it was the client's latest request
+        if self._finish.get(client) == finish:
+            self._finish[client] = start
+
+    def __contains__(self, future: asyncio.Future) -> bool:
+        return any(entry[2] is future for entry in self._heap)
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+
+class Bulkhead:
+    """Concurrency limit and wait queue for one workload class"""
+
+    def __init__(self, name: str, limit: int, max_queue: int, priority: int):
+        """
+        Args:
+            name: Workload class name
+            limit: Maximum concurrent operations
+            max_queue: Maximum queued operations
+            priority: Lower numbers are more important and shed last
+        """
+        self.name = name
+        self.limit = limit
+        self.max_queue = max_queue
+        self.priority = priority
+        self.active = 0
+        self.waiters = FairQueue()
+
+    def _update_gauges(self) -> None:
+        metrics.set_gauge("bulkhead_active", self.active, workload=self.name)
+        metrics.set_gauge("bulkhead_queued", len(self.waiters), workload=self.name)
+
+
+class BulkheadRegistry:
+    """Set of bulkheads sharing one pressure signal"""
+
+    def __init__(self, pressure_threshold: int = 64):
+        """
+        Args:
+            pressure_threshold: Total queued operations (all classes) above which
+                lower-priority classes are shed
+        """
+        self.pressure_threshold = pressure_threshold
+        self._bulkheads: Dict[str, Bulkhead] = {}
+
+    def configure(self, name: str, limit: int, max_queue: int, priority: int) -> None:
+        self._bulkheads[name] = Bulkhead(name, limit, max_queue, priority)
+
+    def get(self, name: str) -> Bulkhead:
+        return self._bulkheads[name]
+
+    def resolve(self, default: str) -> str:
+        """Workload class for the current task: the override if set, else the default"""
+        return _workload_override.get() or default
+
+    @contextmanager
+    def workload(self, name: str):
+        """Run the enclosed code (and tasks it creates) under another workload class"""
+        token = _workload_override.set(name)
+        try:
+            yield
+        finally:
+            _workload_override.reset(token)
+
+    def _discard_done(self) -> None:
+        for bulkhead in self._bulkheads.values():
+            if bulkhead.waiters.discard_done():
+                bulkhead._update_gauges()
+
+    def _queued_total(self) -> int:
+        return sum(len(b.waiters) for b in self._bulkheads.values())
+
+    def _shed_lower(self, priority: int) -> bool:
+        """Evict the newest waiter of the lowest-priority class below `priority`"""
+        candidates = [b for b in self._bulkheads.values() if b.priority > priority and b.waiters]
+        if not candidates:
+            return False
+        victim = max(candidates, key=lambda b: b.priority)
+        future = victim.waiters.pop_last()
+        future.set_exception(OverloadedError(f"Shed {victim.name} work under load", retry_after=2))
+        metrics.inc("bulkhead_rejected_total", workload=victim.name, reason="shed")
+        victim._update_gauges()
+        return True
+
+    def _evict_heavier(self, bulkhead: Bulkhead, client: str) -> bool:
+        """Make room for client by evicting a waiter that would be served after it"""
+        last = bulkhead.waiters.last_tag()
+        if last is None or bulkhead.waiters.tag(client) >= last:
+            return False
+        future = bulkhead.waiters.pop_last()
+        future.set_exception(OverloadedError(f"Too many concurrent {bulkhead.name} requests, retry later", retry_after=2))
+        metrics.inc("bulkhead_rejected_total", workload=bulkhead.name, reason="fair_evict")
+        return True
+
+    def _reject(self, bulkhead: Bulkhead, reason: str) -> OverloadedError:
+        metrics.inc("bulkhead_rejected_total", workload=bulkhead.name, reason=reason)
+        return OverloadedError(f"Too many concurrent {bulkhead.name} requests, retry later", retry_after=2)
+
+    @asynccontextmanager
+    async def acquire(self, name: str):
+        """
+        Hold a slot in a workload class for the duration of the block
+
+        Raises:
+            OverloadedError: If the class queue is full or the work was shed
+        """
+        bulkhead = self._bulkheads[name]
+        client = clients.current() or _BACKGROUND_CLIENT
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+
+        if bulkhead.active < bulkhead.limit and not bulkhead.waiters:
+            bulkhead.active += 1
+        else:
+            # A waiter cancelled by its deadline or a disconnect stays queued until
+            # its task runs again; it must neither count nor be shed
+            self._discard_done()
+            if self._queued_total() >= self.pressure_threshold and not self._shed_lower(bulkhead.priority):
+                raise self._reject(bulkhead, "pressure")
+            if len(bulkhead.waiters) >= bulkhead.max_queue and not self._evict_heavier(bulkhead, client.group):
+                raise self._reject(bulkhead, "queue_full")
+
+            future = loop.create_future()
+            bulkhead.waiters.push(future, client.group, client.group_weight)
+            bulkhead._update_gauges()
+            try:
+                # The releasing task hands its slot over, so active is not incremented here
+                await future
+            except asyncio.CancelledError:
+                if future.done() and not future.cancelled() and future.exception() is None:
+                    self._release(bulkhead)
+                elif future in bulkhead.waiters:
+                    bulkhead.waiters.remove(future)
+                bulkhead._update_gauges()
+                raise
+
+        metrics.observe("bulkhead_wait_seconds", loop.time() - start, workload=name)
+        bulkhead._update_gauges()
+        try:
+            yield
+        finally:
+            self._release(bulkhead)
+
+    def _release(self, bulkhead: Bulkhead) -> None:
+        while bulkhead.waiters:
+            future = bulkhead.waiters.pop()
+            if not future.done():
+                future.set_result(None)
+                bulkhead._update_gauges()
+                return
+        bulkhead.active -= 1
+        bulkhead._update_gauges()
+
+
+# Work started outside a request (job workers, startup)
+_BACKGROUND_CLIENT = clients.ClientIdentity("-", "background", 1.0, "-", 1.0)
+
+
+def _env_int(name: str, default: int) -> int:
+    return int(os.getenv(name, str(default)))
+
+
+# Singleton instance
+bulkheads = BulkheadRegistry(pressure_threshold=_env_int("BULKHEAD_PRESSURE_THRESHOLD", 64))
+for _name, _limit, _queue, _priority in (
+    ("text", 32, 64, 0),
+    ("tts", 8, 32, 1),
+    ("audio", 4, 16, 2),
+    ("background", 2, 16, 3),
+):
+    bulkheads.configure(
+        _name,
+        limit=_env_int(f"BULKHEAD_{_name.upper()}_LIMIT", _limit),
+        max_queue=_env_int(f"BULKHEAD_{_name.upper()}_QUEUE", _queue),
+        priority=_env_int(f"BULKHEAD_{_name.upper()}_PRIORITY", _priority)
+    )
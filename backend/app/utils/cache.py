@@ -0,0 +1,112 @@
+"""
+In-memory caching utilities
+"""
+import hashlib
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+
+
+def normalize_text(text: str) -> str:
+    """
+    Canonical form of user text for cache keys
+
+    Applies NFC normalization and collapses runs of whitespace, so inputs that
+    only differ in encoding or spacing share a cache entry.
+    """
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+# Rough size of a token in characters, for deciding whether context caching can apply
+CHARS_PER_TOKEN = 4
+# Smallest context the Gemini API accepts for caching on every current model
+MIN_CACHE_TOKENS = 4096
+
+
+def estimate_tokens(text: str) -> int:
+    """Approximate Gemini token count of a text"""
+    return len(text) // CHARS_PER_TOKEN
+
+
+def cache_key(*parts: str) -> str:
+    """
+    Hashed cache key from already-canonical parts
+
+    Args:
+        *parts: Key components (joined with a separator that cannot occur in text)
+
+    Returns:
+        Hex SHA-256 digest
+    """
+    return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+
+def translation_cache_key(text: str, target_language: str) -> str:
+    """Cache key for a text translation"""
+    return cache_key("translate", normalize_text(text), normalize_text(target_language).casefold())
+
+
+def speech_cache_key(text: str, voice: str) -> str:
+    """Cache key for synthesized speech"""
+    return cache_key("speech", normalize_text(text), voice.strip())
+
+
+class TTLCache:
+    """Bounded LRU cache whose entries expire after a fixed time to live"""
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 3600.0,
+                 on_evict: Optional[Callable[[Hashable, Any], None]] = None):
+        """
+        Initialize cache
+
+        Args:
+            maxsize: Maximum number of entries
+            ttl: Seconds an entry stays valid
+            on_evict: Called with (key, value) when an entry expires or is pushed out
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.on_evict = on_evict
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        item = self._data.get(key)
+        if item is None:
+            return default
+        expires_at, value = item
+        if expires_at < time.monotonic():
+            del self._data[key]
+            self._evicted(key, value)
+            return default
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        self._data[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            old_key, (_, old_value) = self._data.popitem(last=False)
+            self._evicted(old_key, old_value)
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        item = self._data.pop(key, None)
+        return default if item is None else item[1]
+
+    def items(self) -> list:
+        """Snapshot of live (key, value) pairs, without touching LRU order"""
+        now = time.monotonic()
+        return [(key, value) for key, (expires_at, value) in self._data.items() if expires_at >= now]
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def _evicted(self, key: Hashable, value: Any) -> None:
+        if self.on_evict is not None:
+            self.on_evict(key, value)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self.get(key) is not None
+
+    def __len__(self) -> int:
+        return len(self._data)
@@ -0,0 +1,127 @@
+"""
+Client identification
+
+Each request is attributed to a client, used for rate limiting and fair
+queuing:
+- a configured API token (`Authorization: Bearer ...`), by its name
+- else the Firebase UID the mobile app sends (`X-Firebase-UID`, from its
+  anonymous sign-in), within the group of its IP
+- else the peer IP address (the first `X-Forwarded-For` hop when
+  TRUST_PROXY_HEADERS is set)
+
+Unknown bearer tokens are ignored rather than trusted, so a client cannot
+get a fresh identity by making tokens up. The UID header is not verified,
+so it never escapes its IP: UID and IP clients belong to their IP's group,
+which is rate limited and fair-queued as a whole. The UID only splits the
+IP's share between devices behind it (a NAT, a campus network). Rotating
+UIDs therefore gains a script nothing.
+"""
+import contextvars
+import hashlib
+import hmac
+import os
+import re
+from typing import Dict, NamedTuple, Optional
+
+_UID = re.compile(r"[A-Za-z0-9_-]{1,128}")
+
+
+class ClientIdentity(NamedTuple):
+    """Who a request is attributed to"""
+    id: str              # "<kind>:<value>", e.g. "uid:Xy12..."
+    kind: str            # token, uid or ip
+    weight: float        # rate-limit share of this client within its group
+    group: str           # rate limited and fair-queued as a whole: the id for
+                         # tokens, "ip:<address>" otherwise
+    group_weight: float  # share of the group relative to other groups
+
+
+_current: contextvars.ContextVar[Optional[ClientIdentity]] = contextvars.ContextVar("client_identity", default=None)
+
+
+def current() -> Optional[ClientIdentity]:
+    """Client of the current request (None outside requests, e.g. background work)"""
+    return _current.get()
+
+
+def bind(identity: ClientIdentity) -> contextvars.Token:
+    return _current.set(identity)
+
+
+def unbind(token: contextvars.Token) -> None:
+    _current.reset(token)
+
+
+class ClientIdentifier:
+    """Derives a ClientIdentity from ASGI request headers"""
+
+    def __init__(self, api_tokens: Dict[str, str], trust_proxy: bool = False,
+                 weights: Optional[Dict[str, float]] = None):
+        """
+        Initialize client identifier
+
+        Args:
+            api_tokens: Map of client name to API token
+            trust_proxy: Take the IP from X-Forwarded-For (only behind a trusted proxy)
+            weights: Weight per identity kind: token and ip weigh a group
+                against other groups, uid a device within its IP's group
+        """
+        # Keyed by token digest so lookups do not compare raw secrets
+        self._tokens = {hashlib.sha256(token.encode()).digest(): name for name, token in api_tokens.items()}
+        self.trust_proxy = trust_proxy
+        self.weights = {"token": 1.0, "uid": 1.0, "ip": 1.0, **(weights or {})}
+
+    def _token_name(self, token: str) -> Optional[str]:
+        digest = hashlib.sha256(token.encode("latin-1")).digest()
+        for known, name in self._tokens.items():
+            if hmac.compare_digest(digest, known):
+                return name
+        return None
+
+    def identify(self, scope) -> ClientIdentity:
+        headers = {}
+        for name, value in scope["headers"]:
+            if name in (b"authorization", b"x-firebase-uid", b"x-forwarded-for"):
+                headers.setdefault(name, value.decode("latin-1"))
+
+        authorization = headers.get(b"authorization", "")
+        if self._tokens and authorization.startswith("Bearer "):
+            name = self._token_name(authorization[7:].strip())
+            if name is not None:
+                weight = self.weights["token"]
+                return ClientIdentity(f"token:{name}", "token", weight, f"token:{name}", weight)
+
+        ip = None
+        if self.trust_proxy and b"x-forwarded-for" in headers:
+            ip = headers[b"x-forwarded-for"].split(",")[0].strip()
+        if not ip:
+            client = scope.get("client")
+            ip = client[0] if client else "unknown"
+        group, group_weight = f"ip:{ip}", self.weights["ip"]
+
+        uid = headers.get(b"x-firebase-uid", "").strip()
+        if _UID.fullmatch(uid):
+            return ClientIdentity(f"uid:{uid}", "uid", self.weights["uid"], group, group_weight)
+        return ClientIdentity(group, "ip", group_weight, group, group_weight)
+
+
+def _parse_tokens(value: str) -> Dict[str, str]:
+    """Parse "name:token,name2:token2" """
+    tokens = {}
+    for item in value.split(","):
+        name, _, token = item.strip().partition(":")
+        if name and token:
+            tokens[name] = token
+    return tokens
+
+
+# Singleton instance
+client_identifier = ClientIdentifier(
+    _parse_tokens(os.getenv("API_TOKENS", "")),
+    trust_proxy=os.getenv("TRUST_PROXY_HEADERS", "false").lower() in ("1", "true", "yes"),
+    weights={
+        "token": float(os.getenv("CLIENT_WEIGHT_TOKEN", "8")),
+        "uid": float(os.getenv("CLIENT_WEIGHT_UID", "1")),
+        "ip": float(os.getenv("CLIENT_WEIGHT_IP", "4")),
+    }
+)
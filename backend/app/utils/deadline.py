@@ -0,0 +1,207 @@
+"""
+Request deadlines
+
+Each request gets a deadline: the client's `X-Request-Timeout-Ms` header
+(capped), or the route's default. The deadline is stored in a contextvar, so
+upstream calls made on the request's behalf derive their timeouts and retry
+decisions from the time left instead of fixed values. The middleware cancels
+the request when the deadline passes (answering 504 if nothing was sent yet)
+or when the client disconnects, so no quota or worker slots are spent on
+answers nobody will read.
+
+Background work (jobs, prefetch) runs outside any request and has no
+deadline. POST requests carrying an `Idempotency-Key` are executed once for
+all their attempts, so they ignore the client's per-attempt timeout and get
+the maximum deadline: the work outlives an attempt that gave up, and the
+retry joins it instead of starting over.
+"""
+import asyncio
+import contextvars
+import json
+import os
+import time
+from typing import Dict, Optional, Tuple
+
+from app.utils.errors import DeadlineExceeded
+from app.utils.metrics import metrics
+
+DEADLINE_HEADER = b"x-request-timeout-ms"
+IDEMPOTENCY_HEADER = b"idempotency-key"
+
+# Below this many seconds an upstream attempt is not worth starting
+MIN_ATTEMPT_SECONDS = 0.5
+
+_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("request_deadline", default=None)
+
+
+def remaining() -> Optional[float]:
+    """Seconds left before the current request's deadline (None without a deadline)"""
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def check(stage: str = "upstream") -> None:
+    """
+    Fail fast once too little time is left for a useful upstream attempt
+
+    Raises:
+        DeadlineExceeded: If the deadline has (nearly) passed
+    """
+    left = remaining()
+    if left is not None and left < MIN_ATTEMPT_SECONDS:
+        metrics.inc("deadline_exceeded_total", stage=stage)
+        raise DeadlineExceeded("Request deadline exceeded")
+
+
+def timeout(default: float) -> float:
+    """
+    Timeout for the next upstream attempt: the default, capped by the time left
+
+    Raises:
+        DeadlineExceeded: If too little time is left for a useful attempt
+    """
+    check()
+    left = remaining()
+    return default if left is None else min(default, left)
+
+
+async def backoff(delay: float) -> None:
+    """
+    Sleep before a retry, unless the retry could no longer finish in time
+
+    Raises:
+        DeadlineExceeded: If the time left after sleeping is too short for an attempt
+    """
+    left = remaining()
+    if left is not None and left - delay < MIN_ATTEMPT_SECONDS:
+        metrics.inc("deadline_exceeded_total", stage="retry")
+        raise DeadlineExceeded("Request deadline exceeded before retry")
+    await asyncio.sleep(delay)
+
+
+class DeadlineMiddleware:
+    """ASGI middleware setting the request deadline and cancelling abandoned work"""
+
+    def __init__(self, app, default: Optional[float], maximum: float,
+                 routes: Dict[Tuple[str, str], Optional[float]], exempt_suffixes: Tuple[str, ...] = (),
+                 detach_keyed: bool = False):
+        """
+        Args:
+            app: ASGI application
+            default: Deadline in seconds for routes without an entry (None: no deadline)
+            maximum: Upper bound for client-supplied deadlines, in seconds
+            routes: Map of (method, path) to a default deadline (None: no deadline)
+            exempt_suffixes: Paths ending with one of these never get a deadline
+                (long-lived streams such as SSE)
+            detach_keyed: Give POSTs with an Idempotency-Key the maximum deadline
+                instead of the client's (set when idempotency keys are honoured)
+        """
+        self.app = app
+        self.default = default
+        self.maximum = maximum
+        self.routes = routes
+        self.exempt_suffixes = exempt_suffixes
+        self.detach_keyed = detach_keyed
+
+    def _budget(self, scope) -> Optional[float]:
+        path = scope["path"]
+        if path.endswith(self.exempt_suffixes):
+            return None
+        if self.detach_keyed and scope["method"] == "POST":
+            if any(name == IDEMPOTENCY_HEADER for name, _ in scope["headers"]):
+                return self.maximum
+        for name, value in scope["headers"]:
+            if name == DEADLINE_HEADER:
+                try:
+                    return min(max(int(value), 0) / 1000.0, self.maximum)
+                except ValueError:
+                    break
+        return self.routes.get((scope["method"], path), self.default)
+
+    async def __call__(self, scope, receive, send):
+        budget = self._budget(scope) if scope["type"] == "http" else None
+        if budget is None:
+            await self.app(scope, receive, send)
+            return
+
+        # Pump incoming messages so a disconnect is noticed even while the app
+        # is not reading (the one-slot queue keeps upload backpressure)
+        messages: asyncio.Queue = asyncio.Queue(maxsize=1)
+        disconnected = asyncio.Event()
+
+        async def pump():
+            while True:
+                message = await receive()
+                if message["type"] == "http.disconnect":
+                    disconnected.set()
+                await messages.put(message)
+                if message["type"] == "http.disconnect":
+                    return
+
+        response_started = False
+
+        async def send_tracked(message):
+            nonlocal response_started
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
+        token = _deadline.set(time.monotonic() + budget)
+        try:
+            app_task = asyncio.ensure_future(self.app(scope, messages.get, send_tracked))
+        finally:
+            _deadline.reset(token)
+        pump_task = asyncio.ensure_future(pump())
+        disconnect_task = asyncio.ensure_future(disconnected.wait())
+
+        try:
+            done, _ = await asyncio.wait(
+                {app_task, disconnect_task}, timeout=budget, return_when=asyncio.FIRST_COMPLETED
+            )
+            if app_task in done:
+                app_task.result()
+                return
+
+            app_task.cancel()
+            await asyncio.gather(app_task, return_exceptions=True)
+            if disconnected.is_set():
+                metrics.inc("requests_cancelled_total", reason="disconnect")
+                return
+
+            metrics.inc("deadline_exceeded_total", stage="request")
+            if not response_started:
+                await self._reject(send)
+        finally:
+            for task in (pump_task, disconnect_task, app_task):
+                task.cancel()
+            await asyncio.gather(pump_task, disconnect_task, return_exceptions=True)
+
+    @staticmethod
+    async def _reject(send) -> None:
+        body = json.dumps({"detail": "Request deadline exceeded"}).encode("utf-8")
+        await send({
+            "type": "http.response.start",
+            "status": 504,
+            "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+
+def _env_seconds(name: str, default: str) -> Optional[float]:
+    value = os.getenv(name, default)
+    return float(value) / 1000.0 if value else None
+
+
+DEFAULT_DEADLINE = _env_seconds("DEADLINE_DEFAULT_MS", "30000")
+MAX_DEADLINE = _env_seconds("DEADLINE_MAX_MS", "120000")
+TRANSLATE_DEADLINE = _env_seconds("DEADLINE_TRANSLATE_MS", "15000")
+
+# Per-route defaults; routes not listed use DEFAULT_DEADLINE
+ROUTE_DEADLINES: Dict[Tuple[str, str], Optional[float]] = {
+    ("POST", "/api/translate"): TRANSLATE_DEADLINE,
+    ("GET", "/api/translate"): TRANSLATE_DEADLINE,
+    ("POST", "/api/admin/profile"): None,
+}
+
+# Server-sent event streams stay open for the life of a job
+EXEMPT_SUFFIXES = ("/events",)
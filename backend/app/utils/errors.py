@@ -0,0 +1,26 @@
+"""
+Service errors that map to a specific HTTP status
+
+Routes re-raise these instead of wrapping them in a generic 500, and retry
+loops never retry them.
+"""
+from typing import Optional
+
+
+class ServiceError(Exception):
+    """Base class for errors with a dedicated HTTP status"""
+    status_code = 500
+
+    def __init__(self, message: str, retry_after: Optional[int] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class OverloadedError(ServiceError):
+    """Work was shed because its workload class is saturated"""
+    status_code = 503
+
+
+class DeadlineExceeded(ServiceError):
+    """The request's deadline passed, or too little time is left to try again"""
+    status_code = 504
@@ -0,0 +1,46 @@
+"""
+HTTP caching helpers (ETag / Cache-Control)
+"""
+import hashlib
+from typing import Optional
+
+
+def strong_etag(*parts: str) -> str:
+    """
+    Strong ETag from content and the versions that produced it
+
+    Args:
+        *parts: Content digest, model name, prompt version, ...
+
+    Returns:
+        Quoted ETag value
+    """
+    digest = hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()[:32]
+    return f'"{digest}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    Evaluate an If-None-Match header against an ETag
+
+    Handles lists of tags, '*' and weak validators (weak comparison, as
+    required for If-None-Match).
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
+
+
+def cache_control(max_age: int) -> str:
+    """Cache-Control value for shared (CDN / reverse proxy) caching"""
+    if max_age <= 0:
+        return "no-cache"
+    return f"public, max-age={max_age}"
@@ -0,0 +1,444 @@
+"""
+Idempotency keys for POST requests
+
+Mobile clients retry a POST when their own timeout fires, often while the
+first attempt is still running upstream. A request carrying an
+`Idempotency-Key` header is executed at most once per (path, key): retries
+attach to the first request while it is in flight and replay its stored
+response once it has finished.
+
+Once its body has been received, the first request's work is detached from
+its connection, so a client that gives up and retries collects the result
+instead of starting over. Completed responses are kept in SQLite for a TTL,
+shared by all workers on the host; a worker that finds the key in flight in
+another worker polls the store until it completes. 5xx responses and failed
+executions are not stored, so their retries run again.
+
+A retry must carry the same request as the first attempt. Bodies are
+compared by sha256; multipart bodies by their parts (headers and content),
+since each retry of a form upload gets a new random boundary.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from app.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+KEY_HEADER = b"idempotency-key"
+MAX_KEY_LENGTH = 255
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS idempotency (
+    key TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    fingerprint TEXT,
+    response_status INTEGER,
+    response_headers TEXT,
+    response_body BLOB,
+    expires_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idempotency_expires ON idempotency (expires_at);
+"""
+
+
+class StoredResponse(NamedTuple):
+    """Response recorded for an idempotency key"""
+    status: int
+    headers: List[Tuple[bytes, bytes]]
+    body: bytes
+
+
+class IdempotencyStore:
+    """SQLite table of idempotency keys, shared by all workers on a host"""
+
+    def __init__(self, path: str, max_entries: int = 5000, purge_every: int = 50):
+        """
+        Initialize idempotency store
+
+        Args:
+            path: SQLite database file path
+            max_entries: Completed entries kept at most (oldest expiring first are dropped)
+            purge_every: Completions between purges of expired and excess entries
+        """
+        self.path = path
+        self.max_entries = max_entries
+        self.purge_every = purge_every
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._completions = 0
+
+    def open(self) -> None:
+        """Open the database and create the schema if needed"""
+        if self._conn is not None:
+            return
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=5.0)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def claim(self, key: str, lock_ttl: float) -> Optional[Dict]:
+        """
+        Take ownership of a key unless it is running or done
+
+        Args:
+            key: Scoped idempotency key
+            lock_ttl: Seconds after which a running claim is considered abandoned
+
+        Returns:
+            None if the key was claimed, otherwise the live entry
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT * FROM idempotency WHERE key = ? AND expires_at >= ?", (key, now)
+                ).fetchone()
+                if row is None:
+                    self._conn.execute(
+                        "INSERT OR REPLACE INTO idempotency (key, status, expires_at) VALUES (?, 'running', ?)",
+                        (key, now + lock_ttl)
+                    )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return dict(row) if row is not None else None
+
+    def get(self, key: str) -> Optional[Dict]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT * FROM idempotency WHERE key = ? AND expires_at >= ?", (key, time.time())
+            ).fetchone()
+        return dict(row) if row is not None else None
+
+    def complete(self, key: str, fingerprint: Optional[str], response: StoredResponse, ttl: float) -> None:
+        """Store the response of a claimed key for ttl seconds"""
+        headers = json.dumps([[name.decode("latin-1"), value.decode("latin-1")] for name, value in response.headers])
+        with self._lock:
+            self._conn.execute(
+                "UPDATE idempotency SET status = 'done', fingerprint = ?, response_status = ?, "
+                "response_headers = ?, response_body = ?, expires_at = ? WHERE key = ?",
+                (fingerprint, response.status, headers, response.body, time.time() + ttl, key)
+            )
+            self._completions += 1
+            if self._completions % self.purge_every == 0:
+                self._purge()
+
+    def release(self, key: str) -> None:
+        """Give up a claim so the next retry runs again"""
+        with self._lock:
+            self._conn.execute("DELETE FROM idempotency WHERE key = ? AND status = 'running'", (key,))
+
+    def _purge(self) -> None:
+        self._conn.execute("DELETE FROM idempotency WHERE expires_at < ?", (time.time(),))
+        excess = self._conn.execute(
+            "SELECT COUNT(*) FROM idempotency WHERE status = 'done'"
+        ).fetchone()[0] - self.max_entries
+        if excess > 0:
+            self._conn.execute(
+                "DELETE FROM idempotency WHERE key IN "
+                "(SELECT key FROM idempotency WHERE status = 'done' ORDER BY expires_at LIMIT ?)",
+                (excess,)
+            )
+
+    @staticmethod
+    def response(row: Dict) -> StoredResponse:
+        headers = [(name.encode("latin-1"), value.encode("latin-1")) for name, value in json.loads(row["response_headers"])]
+        return StoredResponse(row["response_status"], headers, row["response_body"] or b"")
+
+
+class _InFlight:
+    """Work for one key running in this worker"""
+
+    def __init__(self):
+        loop = asyncio.get_running_loop()
+        # Fingerprint of the request body (None if it was not read completely)
+        self.fingerprint: asyncio.Future = loop.create_future()
+        # StoredResponse, or None if the execution must not be replayed
+        self.response: asyncio.Future = loop.create_future()
+
+
+class _BodyFingerprint:
+    """Incremental sha256 of a request body that ignores the multipart boundary"""
+
+    def __init__(self, scope):
+        self._digest = hashlib.sha256()
+        self._parser = None
+        content_type = next((value for name, value in scope["headers"] if name == b"content-type"), b"")
+        if content_type.lower().startswith(b"multipart/form-data"):
+            self._parser = self._multipart_parser(content_type)
+
+    def _multipart_parser(self, content_type: bytes):
+        try:
+            from python_multipart.multipart import MultipartParser, parse_options_header
+        except ImportError:  # python-multipart < 0.0.13
+            from multipart.multipart import MultipartParser, parse_options_header
+
+        _, options = parse_options_header(content_type)
+        boundary = options.get(b"boundary")
+        if not boundary:
+            return None
+        field, value = bytearray(), bytearray()
+        digest = self._digest
+
+        def on_header_field(data, start, end):
+            field.extend(data[start:end].lower())
+
+        def on_header_value(data, start, end):
+            value.extend(data[start:end])
+
+        def on_header_end():
+            digest.update(bytes(field) + b":" + bytes(value) + b"\r\n")
+            field.clear()
+            value.clear()
+
+        def on_part_data(data, start, end):
+            digest.update(data[start:end])
+
+        def on_part_end():
+            digest.update(b"\r\n--part--\r\n")
+
+        return MultipartParser(boundary, {
+            "on_header_field": on_header_field,
+            "on_header_value": on_header_value,
+            "on_header_end": on_header_end,
+            "on_part_data": on_part_data,
+            "on_part_end": on_part_end,
+        })
+
+    def update(self, chunk: bytes) -> None:
+        if self._parser is None:
+            self._digest.update(chunk)
+            return
+        try:
+            self._parser.write(chunk)
+        except Exception:
+            # Malformed form: the app rejects it anyway, compare the raw bytes
+            self._parser = None
+            self._digest.update(chunk)
+
+    def hexdigest(self) -> str:
+        return self._digest.hexdigest()
+
+
+async def _read_fingerprint(scope, receive) -> Optional[str]:
+    """Drain a request body, returning its fingerprint (None if the client disconnected)"""
+    fingerprint = _BodyFingerprint(scope)
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            return None
+        fingerprint.update(message.get("body", b""))
+        if not message.get("more_body"):
+            return fingerprint.hexdigest()
+
+
+async def _send_json(send, status: int, detail: str) -> None:
+    body = json.dumps({"detail": detail}).encode("utf-8")
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+class IdempotencyMiddleware:
+    """ASGI middleware executing POST requests at most once per Idempotency-Key"""
+
+    def __init__(self, app, store: IdempotencyStore, ttl: float = 600.0, lock_ttl: float = 120.0,
+                 max_response_bytes: int = 8 * 1024 * 1024, poll_interval: float = 0.2):
+        """
+        Args:
+            app: ASGI application
+            store: Shared idempotency store
+            ttl: Seconds a completed response is replayed for
+            lock_ttl: Seconds after which an unfinished execution (e.g. of a
+                crashed worker) no longer blocks its key
+            max_response_bytes: Larger responses are not stored (retries run again)
+            poll_interval: Seconds between store checks while another worker runs the key
+        """
+        self.app = app
+        self.store = store
+        self.ttl = ttl
+        self.lock_ttl = lock_ttl
+        self.max_response_bytes = max_response_bytes
+        self.poll_interval = poll_interval
+        self._inflight: Dict[str, _InFlight] = {}
+
+    async def __call__(self, scope, receive, send):
+        header = None
+        if scope["type"] == "http" and scope["method"] == "POST":
+            for name, value in scope["headers"]:
+                if name == KEY_HEADER:
+                    header = value
+                    break
+        if header is None:
+            await self.app(scope, receive, send)
+            return
+        if not header.strip() or len(header) > MAX_KEY_LENGTH:
+            await _send_json(send, 400, f"Idempotency-Key must be 1 to {MAX_KEY_LENGTH} characters")
+            return
+
+        key = f"{scope['path']}:{header.decode('latin-1').strip()}"
+        while True:
+            entry = self._inflight.get(key)
+            if entry is not None:
+                response = await asyncio.shield(entry.response)
+                if response is None:
+                    # The first attempt failed: this retry runs (or joins the next one)
+                    continue
+                metrics.inc("idempotency_total", result="attached")
+                await self._replay(entry.fingerprint.result(), response, scope, receive, send)
+                return
+
+            row = await asyncio.to_thread(self.store.claim, key, self.lock_ttl)
+            if row is None:
+                metrics.inc("idempotency_total", result="executed")
+                await self._execute(key, scope, receive, send)
+                return
+
+            if row["status"] == "running":
+                row = await self._wait_elsewhere(key)
+                if row is None:
+                    continue
+            metrics.inc("idempotency_total", result="replayed")
+            await self._replay(row["fingerprint"], self.store.response(row), scope, receive, send)
+            return
+
+    async def _wait_elsewhere(self, key: str) -> Optional[Dict]:
+        """
+        Poll while another worker runs the key
+
+        Returns:
+            The completed entry, or None once the key was released, expired or
+            started in this worker
+        """
+        metrics.inc("idempotency_total", result="waited")
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            if key in self._inflight:
+                return None
+            row = await asyncio.to_thread(self.store.get, key)
+            if row is None or row["status"] == "done":
+                return row
+
+    async def _replay(self, fingerprint: Optional[str], response: StoredResponse, scope, receive, send) -> None:
+        """Send a recorded response, unless the retry's body differs from the original's"""
+        received = await _read_fingerprint(scope, receive)
+        if received is None:
+            return
+        if fingerprint is not None and received != fingerprint:
+            metrics.inc("idempotency_total", result="mismatch")
+            await _send_json(send, 422, "Idempotency-Key was already used with a different request body")
+            return
+        await send({
+            "type": "http.response.start",
+            "status": response.status,
+            "headers": response.headers + [(b"idempotent-replayed", b"true")],
+        })
+        await send({"type": "http.response.body", "body": response.body})
+
+    async def _execute(self, key: str, scope, receive, send) -> None:
+        entry = _InFlight()
+        self._inflight[key] = entry
+        # Shielded: if this connection is cancelled, the work goes on for the retries
+        await asyncio.shield(asyncio.ensure_future(self._run(key, entry, scope, receive, send)))
+
+    async def _run(self, key: str, entry: _InFlight, scope, receive, send) -> None:
+        """Run the app for the first request of a key and record its response"""
+        fingerprint = _BodyFingerprint(scope)
+        finished = asyncio.Event()
+        body_received = False
+        connected = True
+        status = None
+        headers: List[Tuple[bytes, bytes]] = []
+        chunks: List[bytes] = []
+        size = 0
+
+        async def receive_detached():
+            nonlocal body_received
+            message = await receive()
+            if message["type"] == "http.disconnect" and body_received:
+                # The app never sees the disconnect, so nothing cancels the work
+                await finished.wait()
+            elif message["type"] == "http.request" and not body_received:
+                fingerprint.update(message.get("body", b""))
+                if not message.get("more_body"):
+                    body_received = True
+                    entry.fingerprint.set_result(fingerprint.hexdigest())
+            return message
+
+        async def send_recorded(message):
+            nonlocal connected, status, headers, size
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers = list(message.get("headers", []))
+            elif message["type"] == "http.response.body":
+                body = message.get("body", b"")
+                size += len(body)
+                if size <= self.max_response_bytes:
+                    chunks.append(body)
+            if connected:
+                try:
+                    await send(message)
+                except Exception:
+                    # Client went away: keep recording for the retries
+                    connected = False
+
+        response = None
+        try:
+            await self.app(scope, receive_detached, send_recorded)
+            if status is not None and status < 500 and status != 429 and size <= self.max_response_bytes:
+                response = StoredResponse(status, headers, b"".join(chunks))
+        finally:
+            finished.set()
+            if not entry.fingerprint.done():
+                entry.fingerprint.set_result(None)
+            try:
+                if response is not None:
+                    await asyncio.to_thread(self.store.complete, key, entry.fingerprint.result(), response, self.ttl)
+                else:
+                    metrics.inc("idempotency_total", result="not_stored")
+                    await asyncio.to_thread(self.store.release, key)
+            except Exception as e:
+                logger.error(f"Idempotency store update failed for {key}: {e}")
+                response = None
+            finally:
+                self._inflight.pop(key, None)
+                entry.response.set_result(response)
+
+
+def _env_bool(name: str, default: str) -> bool:
+    return os.getenv(name, default).lower() in ("1", "true", "yes")
+
+
+IDEMPOTENCY_ENABLED = _env_bool("IDEMPOTENCY_ENABLED", "true")
+IDEMPOTENCY_TTL = float(os.getenv("IDEMPOTENCY_TTL", "600"))
+IDEMPOTENCY_LOCK_TTL = float(os.getenv("IDEMPOTENCY_LOCK_TTL", "120"))
+IDEMPOTENCY_MAX_RESPONSE_BYTES = int(os.getenv("IDEMPOTENCY_MAX_RESPONSE_BYTES", str(8 * 1024 * 1024)))
+
+# Singleton instance
+idempotency_store = IdempotencyStore(
+    os.getenv("IDEMPOTENCY_DB_PATH", "data/idempotency.sqlite3"),
+    max_entries=int(os.getenv("IDEMPOTENCY_MAX_ENTRIES", "5000"))
+)
@@ -0,0 +1,279 @@
+"""
+Global memory budget and admission control for in-flight audio work
+
+Audio routes hold several copies of their payload at once (upload, base64,
+JSON body; or PCM, WAV, base64). Each request reserves an estimate of its
+peak footprint from a shared byte budget before its body is read. Requests
+that do not fit wait in a bounded FIFO queue, or are turned away with 503 and
+Retry-After, so an upload burst degrades into queueing instead of an OOM
+kill.
+
+Upload routes also have a body size limit, enforced before the route reads
+the body: a Content-Length above it is rejected with 413 straight away, and
+a chunked upload is cut off with 413 as soon as it grows past it. Otherwise
+the route would buffer an oversized body in full before its own size check,
+outside the budget.
+"""
+import asyncio
+import json
+import math
+import os
+from collections import deque
+from typing import Callable, Deque, Dict, Optional, Tuple
+
+from app.utils.metrics import metrics
+
+MB = 1024 * 1024
+
+
+class _BodyTooLarge(Exception):
+    """Raised from receive() once a chunked body grows past its limit"""
+
+
+class BudgetExceeded(Exception):
+    """Raised when a reservation cannot be admitted"""
+
+    def __init__(self, message: str, retry_after: int = 1, status_code: int = 503):
+        super().__init__(message)
+        self.retry_after = retry_after
+        self.status_code = status_code
+
+
+class MemoryBudget:
+    """Byte-accounted semaphore with a bounded FIFO wait queue"""
+
+    def __init__(self, capacity: int, max_waiters: int = 32, max_wait: float = 10.0):
+        """
+        Initialize memory budget
+
+        Args:
+            capacity: Total bytes that may be reserved at once
+            max_waiters: Maximum queued reservations; beyond that requests are rejected
+            max_wait: Maximum seconds a reservation may wait in the queue
+        """
+        self.capacity = capacity
+        self.max_waiters = max_waiters
+        self.max_wait = max_wait
+        self.reserved = 0
+        self._waiters: Deque[Tuple[int, asyncio.Future]] = deque()
+
+    def _retry_after(self) -> int:
+        return max(1, math.ceil(self.max_wait / 2))
+
+    async def acquire(self, nbytes: int) -> None:
+        """
+        Reserve bytes, waiting in the queue if necessary
+
+        Raises:
+            BudgetExceeded: If the reservation can never fit, the queue is full,
+                or the wait timed out
+        """
+        if nbytes > self.capacity:
+            metrics.inc("memory_budget_rejected_total", reason="too_large")
+            raise BudgetExceeded("Request is larger than the server memory budget", status_code=413)
+
+        if not self._waiters and self.reserved + nbytes <= self.capacity:
+            self._reserve(nbytes)
+            return
+
+        if len(self._waiters) >= self.max_waiters:
+            metrics.inc("memory_budget_rejected_total", reason="queue_full")
+            raise BudgetExceeded("Server is busy, retry later", retry_after=self._retry_after())
+
+        future = asyncio.get_running_loop().create_future()
+        entry = (nbytes, future)
+        self._waiters.append(entry)
+        metrics.set_gauge("memory_budget_waiters", len(self._waiters))
+        start = asyncio.get_running_loop().time()
+        try:
+            await asyncio.wait_for(asyncio.shield(future), timeout=self.max_wait)
+        except asyncio.TimeoutError:
+            if future.done() and not future.cancelled():
+                # Granted just as the timeout fired: keep the reservation
+                return
+            future.cancel()
+            metrics.inc("memory_budget_rejected_total", reason="timeout")
+            raise BudgetExceeded("Server is busy, retry later", retry_after=self._retry_after())
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self.release(nbytes)
+            else:
+                future.cancel()
+            raise
+        finally:
+            if entry in self._waiters:
+                self._waiters.remove(entry)
+            metrics.set_gauge("memory_budget_waiters", len(self._waiters))
+            metrics.observe("memory_budget_wait_seconds", asyncio.get_running_loop().time() - start)
+
+    def _reserve(self, nbytes: int) -> None:
+        self.reserved += nbytes
+        metrics.set_gauge("memory_budget_reserved_bytes", self.reserved)
+        metrics.inc("memory_budget_reserved_bytes_total", nbytes)
+
+    def release(self, nbytes: int) -> None:
+        """Return bytes to the budget and admit queued reservations in FIFO order"""
+        self.reserved -= nbytes
+        metrics.inc("memory_budget_released_bytes_total", nbytes)
+        while self._waiters:
+            waiting_bytes, future = self._waiters[0]
+            if future.done():
+                self._waiters.popleft()
+                continue
+            if self.reserved + waiting_bytes > self.capacity:
+                break
+            self._waiters.popleft()
+            self._reserve(waiting_bytes)
+            future.set_result(None)
+        metrics.set_gauge("memory_budget_reserved_bytes", self.reserved)
+        metrics.set_gauge("memory_budget_waiters", len(self._waiters))
+
+
+CostFunction = Callable[[Optional[int]], int]
+
+
+def upload_cost(multiplier: float, max_upload: int) -> CostFunction:
+    """
+    Cost of an upload route: peak copies of the body held at once
+
+    Without a Content-Length (chunked upload) the maximum upload size is assumed.
+    """
+    def cost(content_length: Optional[int]) -> int:
+        size = content_length if content_length is not None else max_upload
+        return int(min(size, max_upload) * multiplier)
+    return cost
+
+
+def fixed_cost(nbytes: int) -> CostFunction:
+    """Cost of a route whose footprint does not depend on the request body"""
+    return lambda _content_length: nbytes
+
+
+class MemoryBudgetMiddleware:
+    """ASGI middleware reserving budget per request before the body is read"""
+
+    def __init__(self, app, budget: MemoryBudget, costs: Dict[Tuple[str, str], CostFunction],
+                 body_limits: Optional[Dict[Tuple[str, str], int]] = None):
+        """
+        Args:
+            app: ASGI application
+            budget: Shared memory budget
+            costs: Map of (method, path) to a function of Content-Length returning bytes to reserve
+            body_limits: Map of (method, path) to the maximum request body size in bytes
+        """
+        self.app = app
+        self.budget = budget
+        self.costs = costs
+        self.body_limits = body_limits or {}
+
+    async def __call__(self, scope, receive, send):
+        cost = self.costs.get((scope.get("method"), scope.get("path"))) if scope["type"] == "http" else None
+        if cost is None:
+            await self.app(scope, receive, send)
+            return
+
+        content_length = None
+        for name, value in scope["headers"]:
+            if name == b"content-length":
+                try:
+                    content_length = int(value)
+                except ValueError:
+                    pass
+                break
+
+        limit = self.body_limits.get((scope["method"], scope["path"]))
+        if limit is not None and content_length is not None and content_length > limit:
+            metrics.inc("memory_budget_rejected_total", reason="body_too_large")
+            await self._reject(send, self._too_large(limit))
+            return
+
+        nbytes = cost(content_length)
+        try:
+            await self.budget.acquire(nbytes)
+        except BudgetExceeded as e:
+            await self._reject(send, e)
+            return
+
+        try:
+            if limit is None:
+                await self.app(scope, receive, send)
+            else:
+                await self._call_limited(scope, receive, send, limit)
+        finally:
+            self.budget.release(nbytes)
+
+    async def _call_limited(self, scope, receive, send, limit: int) -> None:
+        """Run the app, answering 413 once more than `limit` body bytes arrive"""
+        received = 0
+        exceeded = False
+        response_started = False
+
+        async def receive_limited():
+            nonlocal received, exceeded
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    exceeded = True
+                    raise _BodyTooLarge()
+            return message
+
+        async def send_guarded(message):
+            nonlocal response_started
+            if exceeded:
+                # Drop the app's own error response for the aborted body
+                return
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
+        try:
+            await self.app(scope, receive_limited, send_guarded)
+        except Exception:
+            if not exceeded:
+                raise
+        if exceeded:
+            metrics.inc("memory_budget_rejected_total", reason="body_too_large")
+            if not response_started:
+                await self._reject(send, self._too_large(limit))
+
+    @staticmethod
+    def _too_large(limit: int) -> BudgetExceeded:
+        return BudgetExceeded(f"Request body too large, the limit is {limit // MB}MB", status_code=413)
+
+    @staticmethod
+    async def _reject(send, error: BudgetExceeded) -> None:
+        body = json.dumps({"detail": str(error)}).encode("utf-8")
+        headers = [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())]
+        if error.status_code == 503:
+            headers.append((b"retry-after", str(error.retry_after).encode()))
+        await send({"type": "http.response.start", "status": error.status_code, "headers": headers})
+        await send({"type": "http.response.body", "body": body})
+
+
+MAX_AUDIO_UPLOAD = 20 * MB
+# Multipart framing and form fields around the uploaded file
+FORM_OVERHEAD = 64 * 1024
+SYNTHESIS_RESERVATION = int(os.getenv("SYNTHESIS_RESERVATION_BYTES", str(4 * MB)))
+
+# Peak footprint per route: upload + base64 copy (4/3) + JSON request body (4/3)
+ROUTE_COSTS: Dict[Tuple[str, str], CostFunction] = {
+    ("POST", "/api/translate-audio"): upload_cost(3.7, MAX_AUDIO_UPLOAD),
+    ("POST", "/api/jobs"): upload_cost(2.0, MAX_AUDIO_UPLOAD),
+    ("POST", "/api/synthesize"): fixed_cost(SYNTHESIS_RESERVATION),
+    ("GET", "/api/synthesize"): fixed_cost(SYNTHESIS_RESERVATION),
+    ("POST", "/api/translate-and-speak"): fixed_cost(SYNTHESIS_RESERVATION),
+}
+
+# Largest accepted request bodies, checked before the route reads them
+BODY_LIMITS: Dict[Tuple[str, str], int] = {
+    ("POST", "/api/translate-audio"): MAX_AUDIO_UPLOAD + FORM_OVERHEAD,
+    ("POST", "/api/jobs"): MAX_AUDIO_UPLOAD + FORM_OVERHEAD,
+}
+
+# Singleton instance
+memory_budget = MemoryBudget(
+    capacity=int(os.getenv("MEMORY_BUDGET_BYTES", str(256 * MB))),
+    max_waiters=int(os.getenv("MEMORY_BUDGET_MAX_WAITERS", "32")),
+    max_wait=float(os.getenv("MEMORY_BUDGET_MAX_WAIT", "10"))
+)
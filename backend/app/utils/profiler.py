@@ -0,0 +1,264 @@
+"""
+On-demand sampling profiler
+
+A background thread snapshots every thread's Python stack with
+sys._current_frames() at a fixed interval and counts identical stacks. The
+result is emitted in the collapsed ("folded") format read by flamegraph.pl,
+inferno and speedscope. Nothing runs unless a session is active: the sampler
+thread only exists for the duration of a session, and the middleware is only
+installed when ADMIN_TOKEN or PROFILE_SECRET is configured.
+
+Sessions:
+- for a fixed number of seconds (admin endpoint)
+- for the next N requests matching a path prefix (admin endpoint); samples
+  are only kept while at least one matching request is in flight
+- for a single request with `?profile=1` and the X-Profile-Secret header; the
+  response body is replaced by that request's collapsed stacks
+"""
+import asyncio
+import hmac
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Callable, Dict, Optional
+from urllib.parse import parse_qs
+
+from app.utils.metrics import metrics
+
+DEFAULT_INTERVAL = 0.005
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    path = code.co_filename.replace("\\", "/").rsplit("/", 2)
+    filename = "/".join(path[-2:])
+    return f"{code.co_name} ({filename}:{code.co_firstlineno})".replace(";", ":")
+
+
+def collapse_stack(frame) -> str:
+    """Stack of a frame in collapsed format, outermost call first"""
+    labels = []
+    while frame is not None:
+        labels.append(_frame_label(frame))
+        frame = frame.f_back
+    return ";".join(reversed(labels))
+
+
+class StackSampler:
+    """Thread that samples all Python stacks until stopped"""
+
+    def __init__(self, interval: float = DEFAULT_INTERVAL, gate: Optional[Callable[[], bool]] = None):
+        """
+        Args:
+            interval: Seconds between samples
+            gate: Samples are only taken while this returns True
+        """
+        self.interval = interval
+        self.gate = gate
+        self.samples: Counter = Counter()
+        self.sample_count = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._thread_names: Dict[int, str] = {}
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name="profiler-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop sampling (blocks until the sampler thread has exited)"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _thread_name(self, ident: int) -> str:
+        name = self._thread_names.get(ident)
+        if name is None:
+            self._thread_names = {t.ident: t.name for t in threading.enumerate()}
+            name = self._thread_names.get(ident, f"thread-{ident}")
+        return name.replace(";", ":").replace(" ", "_")
+
+    def _run(self) -> None:
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            if self.gate is not None and not self.gate():
+                continue
+            self.sample_count += 1
+            for ident, frame in sys._current_frames().items():
+                if ident != own:
+                    self.samples[self._thread_name(ident) + ";" + collapse_stack(frame)] += 1
+
+    def collapsed(self) -> str:
+        """Samples in collapsed format, one `stack count` line per distinct stack"""
+        return "".join(f"{stack} {count}\n" for stack, count in self.samples.most_common())
+
+
+class ProfileSession:
+    """One profiling run, by duration or by number of matching requests"""
+
+    def __init__(self, seconds: float, requests: Optional[int] = None, path_prefix: Optional[str] = None,
+                 interval: float = DEFAULT_INTERVAL):
+        """
+        Args:
+            seconds: Maximum duration of the session
+            requests: Stop after this many matching requests (None: run for `seconds`)
+            path_prefix: Only requests whose path starts with this count (None: all)
+            interval: Seconds between samples
+        """
+        self.seconds = seconds
+        self.requests = requests
+        self.path_prefix = path_prefix
+        self.completed = 0
+        self._in_flight = 0
+        self._done = asyncio.Event()
+        self.sampler = StackSampler(interval, gate=(lambda: self._in_flight > 0) if requests else None)
+
+    def matches(self, path: str) -> bool:
+        return self.requests is not None and (self.path_prefix is None or path.startswith(self.path_prefix))
+
+    def request_started(self) -> None:
+        self._in_flight += 1
+
+    def request_finished(self) -> None:
+        self._in_flight -= 1
+        self.completed += 1
+        if self.completed >= self.requests:
+            self._done.set()
+
+    async def run(self) -> str:
+        """Sample until the session ends and return collapsed stacks"""
+        started = time.monotonic()
+        self.sampler.start()
+        try:
+            await asyncio.wait_for(self._done.wait(), timeout=self.seconds)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            await asyncio.to_thread(self.sampler.stop)
+        metrics.observe("profiler_session_seconds", time.monotonic() - started)
+        metrics.inc("profiler_samples_total", self.sampler.sample_count)
+        return self.sampler.collapsed()
+
+
+class SessionBusy(Exception):
+    """Raised when a profiling session is already running"""
+
+
+class Profiler:
+    """Process-wide profiling controller (one session at a time)"""
+
+    def __init__(self, admin_token: Optional[str] = None, profile_secret: Optional[str] = None,
+                 max_seconds: float = 60.0):
+        """
+        Args:
+            admin_token: Bearer token for the admin endpoint (None disables it)
+            profile_secret: Secret for per-request `?profile=1` (None disables it)
+            max_seconds: Upper bound on any session's duration
+        """
+        self.admin_token = admin_token
+        self.profile_secret = profile_secret
+        self.max_seconds = max_seconds
+        self.session: Optional[ProfileSession] = None
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.admin_token or self.profile_secret)
+
+    @staticmethod
+    def _matches(given: Optional[str], expected: Optional[str]) -> bool:
+        return bool(expected) and given is not None and hmac.compare_digest(given.encode(), expected.encode())
+
+    def check_admin_token(self, token: Optional[str]) -> bool:
+        return self._matches(token, self.admin_token)
+
+    def check_profile_secret(self, secret: Optional[str]) -> bool:
+        return self._matches(secret, self.profile_secret)
+
+    async def profile(self, seconds: float, requests: Optional[int] = None, path_prefix: Optional[str] = None,
+                      interval: float = DEFAULT_INTERVAL) -> str:
+        """
+        Run a session and return its collapsed stacks
+
+        Raises:
+            SessionBusy: If another session is running
+        """
+        if self.session is not None:
+            raise SessionBusy("A profiling session is already running")
+        self.session = ProfileSession(min(seconds, self.max_seconds), requests, path_prefix, interval)
+        try:
+            return await self.session.run()
+        finally:
+            self.session = None
+
+
+class ProfilerMiddleware:
+    """ASGI middleware feeding request-scoped sessions and serving `?profile=1`"""
+
+    def __init__(self, app, profiler: Profiler):
+        self.app = app
+        self.profiler = profiler
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        query = scope.get("query_string", b"")
+        if self.profiler.profile_secret and b"profile=1" in query and \
+                parse_qs(query.decode("latin-1")).get("profile") == ["1"]:
+            secret = dict(scope["headers"]).get(b"x-profile-secret")
+            if self.profiler.check_profile_secret(secret.decode("latin-1") if secret else None):
+                await self._profile_request(scope, receive, send)
+                return
+
+        session = self.profiler.session
+        if session is None or not session.matches(scope["path"]):
+            await self.app(scope, receive, send)
+            return
+
+        session.request_started()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            session.request_finished()
+
+    async def _profile_request(self, scope, receive, send) -> None:
+        """Run the request under its own sampler and answer with the collapsed stacks"""
+        status = None
+
+        async def capture(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+
+        sampler = StackSampler()
+        sampler.start()
+        try:
+            await self.app(scope, receive, capture)
+        finally:
+            await asyncio.to_thread(sampler.stop)
+        metrics.inc("profiler_samples_total", sampler.sample_count)
+
+        body = sampler.collapsed().encode("utf-8")
+        await send({
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [
+                (b"content-type", b"text/plain; charset=utf-8"),
+                (b"content-length", str(len(body)).encode()),
+                (b"x-profile-samples", str(sampler.sample_count).encode()),
+                (b"x-profiled-status", str(status).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+
+# Singleton instance
+profiler = Profiler(
+    admin_token=os.getenv("ADMIN_TOKEN") or None,
+    profile_secret=os.getenv("PROFILE_SECRET") or None,
+    max_seconds=float(os.getenv("PROFILE_MAX_SECONDS", "60"))
+)
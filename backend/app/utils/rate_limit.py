@@ -0,0 +1,219 @@
+"""
+Per-client rate limiting
+
+Every request is attributed to a client (see app.utils.clients) and upstream
+routes draw from that client's token bucket, at a per-route cost reflecting
+how many upstream calls they make. A client out of tokens gets 429 with
+Retry-After set to when enough tokens will have refilled, so one retry loop
+cannot use up the whole Gemini quota. Clients identified by an unverified
+UID are charged twice: to their IP group's bucket, which bounds what the
+address as a whole may spend, and to their own, which splits that between
+devices. Bucket refill rate and burst scale with the weight.
+
+Buckets live in an insertion-ordered dict refreshed on every access, so the
+least recently seen client is always at the front: idle clients are expired
+from there (a bucket idle for long enough is full again, indistinguishable
+from a new one) and the table is capped at a maximum size.
+"""
+import json
+import math
+import os
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from app.utils import clients
+from app.utils.metrics import metrics
+
+
+class _Bucket:
+    __slots__ = ("tokens", "updated", "allowed", "limited", "cost")
+
+    def __init__(self, tokens: float, now: float):
+        self.tokens = tokens
+        self.updated = now
+        self.allowed = 0     # requests admitted
+        self.limited = 0     # requests rejected with 429
+        self.cost = 0.0      # tokens spent
+
+
+class TokenBucketLimiter:
+    """Token buckets keyed by client id, expiring idle clients"""
+
+    def __init__(self, rate: float, burst: float, idle_seconds: float = 600.0, max_clients: int = 50000):
+        """
+        Initialize limiter
+
+        Args:
+            rate: Tokens refilled per second for a client of weight 1
+            burst: Bucket capacity for a client of weight 1
+            idle_seconds: Drop clients not seen for this long (at least the
+                time an empty bucket takes to refill, so expiry never
+                forgives debt)
+            max_clients: Maximum tracked clients; the least recently seen are
+                dropped beyond it
+        """
+        self.rate = rate
+        self.burst = burst
+        self.idle_seconds = max(idle_seconds, burst / rate)
+        self.max_clients = max_clients
+        self._buckets: "OrderedDict[str, _Bucket]" = OrderedDict()
+
+    def _expire(self, now: float) -> None:
+        buckets = self._buckets
+        while buckets:
+            bucket = next(iter(buckets.values()))
+            if now - bucket.updated < self.idle_seconds and len(buckets) <= self.max_clients:
+                break
+            buckets.popitem(last=False)
+        metrics.set_gauge("rate_limit_clients", len(buckets))
+
+    def _refill(self, client: str, weight: float, now: float) -> _Bucket:
+        rate = self.rate * weight
+        bucket = self._buckets.get(client)
+        if bucket is None:
+            bucket = self._buckets[client] = _Bucket(self.burst * weight, now)
+            self._expire(now)
+        else:
+            bucket.tokens = min(self.burst * weight, bucket.tokens + (now - bucket.updated) * rate)
+            bucket.updated = now
+            self._buckets.move_to_end(client)
+        return bucket
+
+    def take(self, client: str, cost: float = 1.0, weight: float = 1.0,
+             group: Optional[str] = None, group_weight: float = 1.0) -> float:
+        """
+        Charge a request to a client and its group
+
+        The group is checked first, and the client's own bucket is only
+        created once the group admits the request, so a stream of made-up
+        client ids cannot flood the table faster than its group's rate.
+
+        Args:
+            client: Client id
+            cost: Tokens the request costs
+            weight: Client weight, scaling its refill rate and burst
+            group: Group the client belongs to (None or the client id: no group)
+            group_weight: Group weight
+
+        Returns:
+            0 if the request is admitted, else seconds until it would be
+        """
+        now = time.monotonic()
+        charges = [(group, group_weight)] if group and group != client else []
+        charges.append((client, weight))
+        buckets = []
+        for key, key_weight in charges:
+            bucket = self._refill(key, key_weight, now)
+            if bucket.tokens < cost:
+                bucket.limited += 1
+                # A request costlier than the burst can never pass; report a full refill
+                return (min(cost, self.burst * key_weight) - bucket.tokens) / (self.rate * key_weight)
+            buckets.append(bucket)
+
+        for bucket in buckets:
+            bucket.tokens -= cost
+            bucket.allowed += 1
+            bucket.cost += cost
+        return 0.0
+
+    def usage(self, limit: int = 100) -> List[Dict]:
+        """
+        Usage counters of tracked clients, heaviest first
+
+        Args:
+            limit: Maximum clients to return
+        """
+        self._expire(time.monotonic())
+        rows = [
+            {
+                "client": client,
+                "allowed": bucket.allowed,
+                "limited": bucket.limited,
+                "cost": round(bucket.cost, 2),
+                "tokens": round(bucket.tokens, 2),
+                "idle_seconds": round(time.monotonic() - bucket.updated, 1),
+            }
+            for client, bucket in self._buckets.items()
+        ]
+        rows.sort(key=lambda row: (row["cost"], row["limited"]), reverse=True)
+        return rows[:limit]
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+
+class RateLimitMiddleware:
+    """ASGI middleware identifying clients and charging upstream routes to their bucket"""
+
+    def __init__(self, app, limiter: TokenBucketLimiter, costs: Dict[Tuple[str, str], float],
+                 identifier: clients.ClientIdentifier = clients.client_identifier):
+        """
+        Args:
+            app: ASGI application
+            limiter: Shared token-bucket limiter
+            costs: Map of (method, path) to tokens charged; other routes are free
+            identifier: Derives the client of a request
+        """
+        self.app = app
+        self.limiter = limiter
+        self.costs = costs
+        self.identifier = identifier
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        # Bind the client for every request, so fair queuing sees it downstream
+        identity = self.identifier.identify(scope)
+        cost = self.costs.get((scope["method"], scope["path"]))
+        if cost is not None:
+            retry_after = self.limiter.take(identity.id, cost, identity.weight, identity.group, identity.group_weight)
+            metrics.inc("rate_limit_total", result="limited" if retry_after else "allowed", kind=identity.kind)
+            if retry_after:
+                await self._reject(send, retry_after)
+                return
+
+        token = clients.bind(identity)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            clients.unbind(token)
+
+    @staticmethod
+    async def _reject(send, retry_after: float) -> None:
+        body = json.dumps({"detail": "Too many requests, retry later"}).encode("utf-8")
+        await send({
+            "type": "http.response.start",
+            "status": 429,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(max(1, math.ceil(retry_after))).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() in ("1", "true", "yes")
+
+# Tokens per request: roughly the number of upstream calls a route makes
+ROUTE_COSTS: Dict[Tuple[str, str], float] = {
+    ("POST", "/api/translate"): 1,
+    ("GET", "/api/translate"): 1,
+    ("POST", "/api/translate/multi"): 2,
+    ("POST", "/api/synthesize"): 2,
+    ("GET", "/api/synthesize"): 2,
+    ("POST", "/api/translate-and-speak"): 3,
+    ("POST", "/api/translate-audio"): 4,
+    ("POST", "/api/jobs"): 4,
+}
+
+# Singleton instance
+rate_limiter = TokenBucketLimiter(
+    rate=float(os.getenv("RATE_LIMIT_RATE", "1")),
+    burst=float(os.getenv("RATE_LIMIT_BURST", "20")),
+    idle_seconds=float(os.getenv("RATE_LIMIT_IDLE_SECONDS", "600")),
+    max_clients=int(os.getenv("RATE_LIMIT_MAX_CLIENTS", "50000"))
+)
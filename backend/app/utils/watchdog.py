@@ -0,0 +1,164 @@
+"""
+Event-loop stall watchdog
+
+A heartbeat task sleeps for a fixed interval and records how late it wakes
+up: that lateness is the event-loop lag, reported as a histogram. A monitor
+thread watches the heartbeat; when the loop has not come back for longer
+than the threshold, it captures the loop thread's current stack, which
+points at the blocking call while it is still running.
+
+Strict mode (for tests) additionally enables asyncio debug timing of every
+callback and fails on stop() if any callback ran longer than the limit.
+"""
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from typing import Deque, Dict, List, Optional
+
+from app.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Lag buckets in seconds
+LAG_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+class LoopBlockedError(Exception):
+    """Raised in strict mode when a callback blocked the event loop too long"""
+
+
+class _SlowCallbackHandler(logging.Handler):
+    """Collects asyncio's debug-mode "Executing <Handle> took N seconds" warnings"""
+
+    def __init__(self):
+        super().__init__(level=logging.WARNING)
+        self.violations: List[str] = []
+
+    def emit(self, record: logging.LogRecord) -> None:
+        message = record.getMessage()
+        if message.startswith("Executing"):
+            self.violations.append(message)
+
+
+class LoopWatchdog:
+    """Measures event-loop lag and attributes stalls to the blocking stack"""
+
+    def __init__(self, enabled: bool = True, interval: float = 0.1, threshold: float = 0.2,
+                 strict_limit: Optional[float] = None, max_stalls: int = 20):
+        """
+        Initialize watchdog
+
+        Args:
+            enabled: Whether start() launches the heartbeat and monitor
+            interval: Seconds between heartbeats
+            threshold: Stall duration in seconds that triggers stack capture
+            strict_limit: Maximum seconds any callback may run (None disables strict mode)
+            max_stalls: Number of recent stalls kept for inspection
+        """
+        self.enabled = enabled
+        self.interval = interval
+        self.threshold = threshold
+        self.strict_limit = strict_limit
+        self.stalls: Deque[Dict] = deque(maxlen=max_stalls)
+        self._expected_wake = 0.0
+        self._loop_thread: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._monitor: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._strict_handler: Optional[_SlowCallbackHandler] = None
+
+    async def start(self) -> None:
+        if not self.enabled or self._task is not None:
+            return
+        loop = asyncio.get_running_loop()
+        self._loop_thread = threading.get_ident()
+        self._expected_wake = time.monotonic() + self.interval
+        self._stop.clear()
+        self._task = asyncio.create_task(self._heartbeat())
+        self._monitor = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._monitor.start()
+
+        if self.strict_limit is not None:
+            loop.set_debug(True)
+            loop.slow_callback_duration = self.strict_limit
+            self._strict_handler = _SlowCallbackHandler()
+            logging.getLogger("asyncio").addHandler(self._strict_handler)
+
+    async def stop(self) -> None:
+        """
+        Stop the heartbeat and monitor
+
+        Raises:
+            LoopBlockedError: In strict mode, if any callback exceeded the limit
+        """
+        if self._task is None:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+        self._stop.set()
+        await asyncio.to_thread(self._monitor.join)
+        self._monitor = None
+
+        if self._strict_handler is not None:
+            logging.getLogger("asyncio").removeHandler(self._strict_handler)
+            violations, self._strict_handler = self._strict_handler.violations, None
+            if violations:
+                raise LoopBlockedError(
+                    f"{len(violations)} callback(s) blocked the event loop longer than "
+                    f"{self.strict_limit * 1000:.0f} ms:\n" + "\n".join(violations)
+                )
+
+    async def _heartbeat(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            lag = max(0.0, now - self._expected_wake)
+            self._expected_wake = now + self.interval
+            metrics.observe("event_loop_lag_seconds", lag, buckets=LAG_BUCKETS)
+            if self.stalls and self.stalls[-1]["lag_seconds"] is None:
+                # The stall the monitor caught has ended: record how long it lasted
+                self.stalls[-1]["lag_seconds"] = round(lag, 4)
+                logger.warning(f"Event loop blocked for {lag * 1000:.0f} ms")
+
+    def _watch(self) -> None:
+        captured_for = None
+        while not self._stop.wait(self.interval / 2):
+            expected = self._expected_wake
+            stalled_for = time.monotonic() - expected
+            if stalled_for < self.threshold or captured_for == expected:
+                continue
+            # Capture once per stall, while the blocking call is still on the stack
+            captured_for = expected
+            frame = sys._current_frames().get(self._loop_thread)
+            stack = "".join(traceback.format_stack(frame)) if frame is not None else ""
+            self.stalls.append({
+                "detected_at": time.time(),
+                "stalled_for_seconds": round(stalled_for, 4),
+                "lag_seconds": None,
+                "stack": stack,
+            })
+            metrics.inc("event_loop_stalls_total")
+            logger.warning(f"Event loop stalled for {stalled_for * 1000:.0f} ms so far, blocking stack:\n{stack}")
+
+    def recent_stalls(self) -> List[Dict]:
+        return list(self.stalls)
+
+
+def _env_ms(name: str, default: Optional[str]) -> Optional[float]:
+    value = os.getenv(name, default)
+    return float(value) / 1000.0 if value else None
+
+
+# Singleton instance
+watchdog = LoopWatchdog(
+    enabled=os.getenv("WATCHDOG_ENABLED", "true").lower() in ("1", "true", "yes"),
+    interval=_env_ms("WATCHDOG_INTERVAL_MS", "100"),
+    threshold=_env_ms("WATCHDOG_THRESHOLD_MS", "200"),
+    strict_limit=_env_ms("WATCHDOG_STRICT_MS", None)
+)
@@ -0,0 +1,101 @@
+"""
+Import-time regression check
+
+Runs `python -X importtime` against the application entry points and fails
+when the cumulative import time exceeds the budget or when a heavy provider
+SDK is imported eagerly instead of on first use.
+
+Usage:
+    python benchmarks/import_time.py
+    python benchmarks/import_time.py --budget-ms 600 --module app.main
+"""
+import argparse
+import os
+import subprocess
+import sys
+from typing import Dict, List, Tuple
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules that must only be imported lazily, when their provider is first used
+LAZY_MODULES = [
+    "google.generativeai",
+    "grpc",
+    "numpy",
+    "scipy",
+]
+
+
+def measure_import(module: str) -> Tuple[float, Dict[str, int]]:
+    """
+    Import a module in a fresh interpreter with -X importtime
+
+    Args:
+        module: Dotted module name to import
+
+    Returns:
+        Tuple of (cumulative import time in ms, {module name: cumulative us})
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=BACKEND_DIR,
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{result.stderr}")
+
+    imported: Dict[str, int] = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        imported[name.strip()] = int(cumulative)
+
+    return imported.get(module, 0) / 1000, imported
+
+
+def check(modules: List[str], budget_ms: float, runs: int) -> bool:
+    """
+    Check every module against the import budget and the lazy-import list
+
+    Args:
+        modules: Entry point modules to measure
+        budget_ms: Maximum cumulative import time in milliseconds
+        runs: Number of measurements per module (the fastest one is used)
+
+    Returns:
+        True if all modules pass
+    """
+    ok = True
+    for module in modules:
+        timings = [measure_import(module) for _ in range(runs)]
+        best_ms, imported = min(timings, key=lambda t: t[0])
+
+        eager = [name for name in LAZY_MODULES if name in imported]
+        status = "ok" if best_ms <= budget_ms and not eager else "FAIL"
+        print(f"{module:<12} {best_ms:8.1f} ms  (budget {budget_ms:.0f} ms)  {status}")
+
+        if eager:
+            print(f"  eagerly imported: {', '.join(eager)}")
+        if status == "FAIL":
+            slowest = sorted(imported.items(), key=lambda item: item[1], reverse=True)[1:6]
+            for name, cumulative in slowest:
+                print(f"  {cumulative / 1000:8.1f} ms  {name}")
+            ok = False
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import-time regression check")
+    parser.add_argument("--module", action="append", help="Entry point module (repeatable)")
+    parser.add_argument("--budget-ms", type=float, default=float(os.getenv("IMPORT_BUDGET_MS", 800)))
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    modules = args.module or ["main", "app.main"]
+    sys.exit(0 if check(modules, args.budget_ms, args.runs) else 1)
+
+
+if __name__ == "__main__":
+    main()
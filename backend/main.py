@@ -2,30 +2,71 @@
 LínguaMedia FastAPI Backend
 Main application entry point
 """
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from dotenv import load_dotenv
+import asyncio
+import logging
 import os
 
+# Load environment variables before importing app modules: the readiness
+# gate (WARMUP_TIMEOUT), rate limiter, language identifier and watchdog read
+# their settings at import time
+load_dotenv()
+
+from app.api import routes
 from app.api.routes import router, init_services
+from app.services.langid import language_id
+from app.services.warmup import readiness
+from app.utils.rate_limit import RateLimitMiddleware, rate_limiter, RATE_LIMIT_ENABLED, ROUTE_COSTS
+from app.utils.watchdog import watchdog
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+
+async def _load_gemini_sdk():
+    """Import and configure the Gemini SDK off the event loop before reporting ready"""
+    await asyncio.to_thread(routes.gemini_client.load)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Initialize services on app startup"""
+    logger.info("Initializing LínguaMedia backend services...")
+    try:
+        init_services()
+        logger.info("Services initialized successfully")
+    except Exception as e:
+        logger.error(f"Failed to initialize services: {e}")
+        raise
+    
+    await watchdog.start()
+    readiness.register("gemini_sdk", _load_gemini_sdk)
+    readiness.register("language_id", language_id.warm_up)
+    readiness.start()
+    yield
+    await readiness.stop()
+    await watchdog.stop()
 
-# Load environment variables
-load_dotenv()
-print(f"DEBUG: Current working directory: {os.getcwd()}")
-print(f"DEBUG: .env file exists: {os.path.exists('.env')}")
-api_key = os.getenv('GEMINI_API_KEY')
-print(f"DEBUG: GEMINI_API_KEY loaded: {'Yes' if api_key else 'No'}")
-if api_key:
-    print(f"DEBUG: GEMINI_API_KEY length: {len(api_key)}")
-    print(f"DEBUG: GEMINI_API_KEY start: {api_key[:4]}...")
 
 # Create FastAPI app
 app = FastAPI(
     title="LínguaMedia API",
     description="Backend API for voice-to-voice translation with Gemini AI",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
+# Per-client rate limiting (inside CORS so 429s still carry CORS headers)
+if RATE_LIMIT_ENABLED:
+    app.add_middleware(RateLimitMiddleware, limiter=rate_limiter, costs=ROUTE_COSTS)
+
 # Configure CORS
 frontend_url = os.getenv('FRONTEND_URL', 'http://localhost:8081')
 app.add_middleware(
@@ -40,18 +81,6 @@ app.add_middleware(
 app.include_router(router)
 
 
-@app.on_event("startup")
-async def startup_event():
-    """Initialize services on app startup"""
-    print("Initializing LínguaMedia backend services...")
-    try:
-        init_services()
-        print("✓ Services initialized successfully")
-    except Exception as e:
-        print(f"✗ Failed to initialize services: {e}")
-        raise
-
-
 @app.get("/")
 async def root():
     """Root endpoint"""
@@ -62,6 +91,15 @@ async def root():
     }
 
 
+@app.get("/ready")
+async def ready():
+    """Readiness endpoint: 503 until warm-up has finished"""
+    return JSONResponse(
+        status_code=200 if readiness.ready else 503,
+        content=readiness.status()
+    )
+
+
 if __name__ == "__main__":
     import uvicorn
     port = int(os.getenv('PORT', 8000))
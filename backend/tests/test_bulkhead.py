@@ -0,0 +1,155 @@
+import asyncio
+
+import pytest
+
+from app.utils import clients
+from app.utils.bulkhead import BulkheadRegistry, FairQueue
+from app.utils.errors import OverloadedError
+
+
+def _identity(group: str, weight: float = 1.0) -> clients.ClientIdentity:
+    return clients.ClientIdentity(group, "ip", weight, group, weight)
+
+
+def test_fair_queue_interleaves_clients():
+    async def scenario():
+        loop = asyncio.get_running_loop()
+        queue = FairQueue()
+        names = {}
+        for name in ("a1", "a2", "a3", "b1"):
+            future = loop.create_future()
+            names[future] = name
+            queue.push(future, name[0])
+        order = [names[queue.pop()] for _ in range(4)]
+        # b's only request is served right after a's first, not behind a's backlog
+        assert order == ["a1", "b1", "a2", "a3"]
+        assert queue.pop() is None
+
+    asyncio.run(scenario())
+
+
+def test_fair_queue_weights_shares():
+    async def scenario():
+        loop = asyncio.get_running_loop()
+        queue = FairQueue()
+        owners = {}
+        for _ in range(6):
+            for client, weight in (("heavy", 2.0), ("light", 1.0)):
+                future = loop.create_future()
+                owners[future] = client
+                queue.push(future, client, weight)
+        first = [owners[queue.pop()] for _ in range(6)]
+        assert first.count("heavy") == 4 and first.count("light") == 2
+
+    asyncio.run(scenario())
+
+
+def test_fair_queue_pop_last_takes_heaviest_clients_newest():
+    async def scenario():
+        loop = asyncio.get_running_loop()
+        queue = FairQueue()
+        a = [loop.create_future() for _ in range(3)]
+        b = loop.create_future()
+        for future in a:
+            queue.push(future, "a")
+        queue.push(b, "b")
+        assert queue.pop_last() is a[2]
+        # a's tag was given back, so its next request is not pushed further back
+        assert queue.tag("a") == 2.0
+        assert len(queue) == 3 and b in queue
+
+    asyncio.run(scenario())
+
+
+async def _settle():
+    for _ in range(3):
+        await asyncio.sleep(0)
+
+
+async def _hold(registry: BulkheadRegistry, name: str, identity, release: asyncio.Event):
+    token = clients.bind(identity)
+    try:
+        async with registry.acquire(name):
+            await release.wait()
+    finally:
+        clients.unbind(token)
+
+
+def test_pressure_sheds_lower_priority_waiters():
+    async def scenario():
+        registry = BulkheadRegistry(pressure_threshold=2)
+        registry.configure("text", limit=1, max_queue=8, priority=0)
+        registry.configure("background", limit=1, max_queue=8, priority=3)
+        release = asyncio.Event()
+        client = _identity("ip:1")
+
+        holders = [asyncio.create_task(_hold(registry, name, client, release)) for name in ("text", "background")]
+        await asyncio.sleep(0)
+        queued = [asyncio.create_task(_hold(registry, "background", client, release)) for _ in range(2)]
+        await asyncio.sleep(0)
+
+        # At the threshold: a text request evicts the newest background waiter
+        text = asyncio.create_task(_hold(registry, "text", client, release))
+        await _settle()
+        assert queued[1].done() and isinstance(queued[1].exception(), OverloadedError)
+        assert not queued[0].done()
+
+        # Nothing lower to shed: background itself is rejected
+        with pytest.raises(OverloadedError):
+            await _hold(registry, "background", client, release)
+
+        release.set()
+        await asyncio.gather(*holders, queued[0], text)
+
+    asyncio.run(scenario())
+
+
+def test_full_queue_evicts_heavier_client():
+    async def scenario():
+        registry = BulkheadRegistry(pressure_threshold=100)
+        registry.configure("tts", limit=1, max_queue=2, priority=1)
+        release = asyncio.Event()
+        heavy, light = _identity("ip:heavy"), _identity("ip:light")
+
+        holder = asyncio.create_task(_hold(registry, "tts", heavy, release))
+        await asyncio.sleep(0)
+        backlog = [asyncio.create_task(_hold(registry, "tts", heavy, release)) for _ in range(2)]
+        await asyncio.sleep(0)
+
+        newcomer = asyncio.create_task(_hold(registry, "tts", light, release))
+        await _settle()
+        assert isinstance(backlog[1].exception(), OverloadedError)
+
+        # The heavy client gets no such favour against its own backlog
+        with pytest.raises(OverloadedError):
+            await _hold(registry, "tts", heavy, release)
+
+        release.set()
+        await asyncio.gather(holder, backlog[0], newcomer)
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_waiter_is_not_shed():
+    async def scenario():
+        registry = BulkheadRegistry(pressure_threshold=2)
+        registry.configure("text", limit=1, max_queue=1, priority=0)
+        registry.configure("background", limit=1, max_queue=4, priority=3)
+        release = asyncio.Event()
+        client = _identity("ip:1")
+
+        holders = [asyncio.create_task(_hold(registry, name, client, release)) for name in ("text", "background")]
+        await asyncio.sleep(0)
+        waiters = [asyncio.create_task(_hold(registry, name, client, release)) for name in ("background", "text")]
+        await asyncio.sleep(0)
+
+        # Scheduled ahead of the cancelled waiters, so it runs while they are still queued
+        admitted = asyncio.create_task(_hold(registry, "text", client, release))
+        for waiter in waiters:
+            waiter.cancel()
+        await _settle()
+        release.set()
+        await asyncio.gather(*holders, admitted)
+        assert all(waiter.cancelled() for waiter in waiters)
+
+    asyncio.run(scenario())
@@ -0,0 +1,113 @@
+import asyncio
+import io
+import wave
+
+import numpy as np
+
+from app.services.fingerprint import AudioFingerprint, TranscriptCache, bit_error_rate, compute_fingerprint
+
+
+def _recording(seed: int, seconds: float = 8.0, rate: int = 16000):
+    """Speech-like test signal: gliding tones with a syllable-rate envelope"""
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(seconds * rate)) / rate
+    signal = np.zeros_like(t)
+    for _ in range(4):
+        base, depth, speed = rng.uniform(300, 2500), rng.uniform(50, 300), rng.uniform(0.5, 3)
+        signal += np.sin(2 * np.pi * (base * t + depth / speed * np.sin(2 * np.pi * speed * t)))
+    envelope = np.abs(np.sin(2 * np.pi * rng.uniform(2, 5) * t))
+    return signal * envelope / 4
+
+
+def _wav(signal, rate: int = 16000, channels: int = 1, lead_silence: float = 0.0) -> bytes:
+    signal = np.concatenate([np.zeros(int(lead_silence * rate)), signal])
+    data = io.BytesIO()
+    with wave.open(data, "wb") as wav:
+        wav.setnchannels(channels)
+        wav.setsampwidth(2)
+        wav.setframerate(rate)
+        wav.writeframes((np.repeat(signal, channels) * 32767).astype("<i2").tobytes())
+    return data.getvalue()
+
+
+def _resampled(signal, rate: int, new_rate: int):
+    t = np.arange(int(len(signal) * new_rate / rate)) / new_rate
+    return np.interp(t, np.arange(len(signal)) / rate, signal)
+
+
+def test_bit_error_rate():
+    rng = np.random.default_rng(0)
+    a = rng.integers(0, 256, (10, 2), dtype=np.uint8)
+    assert bit_error_rate(a, a) == 0.0
+    assert bit_error_rate(a, ~a) == 1.0
+    # Frames present in only one recording count as fully different
+    assert bit_error_rate(a, a[:5]) == 0.5
+    assert bit_error_rate(a, a[:0]) == 1.0
+
+
+def test_reencoded_copies_match():
+    signal = _recording(1)
+    original = compute_fingerprint(_wav(signal))
+    copies = [
+        _wav(_resampled(signal, 16000, 22050), rate=22050),
+        _wav(_resampled(signal, 16000, 44100), rate=44100, channels=2),
+        _wav(signal * 0.3),
+        _wav(signal, lead_silence=0.7),
+    ]
+    for copy in copies:
+        fingerprint = compute_fingerprint(copy)
+        assert fingerprint.bits is not None
+        assert bit_error_rate(original.bits, fingerprint.bits) < 0.05
+
+    other = compute_fingerprint(_wav(_recording(2)))
+    assert bit_error_rate(original.bits, other.bits) > 0.2
+
+
+def test_undecodable_audio_falls_back_to_byte_hash():
+    fingerprint = compute_fingerprint(b"not audio at all")
+    assert fingerprint.bits is None
+    assert fingerprint.key.startswith("raw:")
+    assert compute_fingerprint(b"not audio at all").key == fingerprint.key
+
+
+def test_long_recordings_are_capped():
+    fingerprint = compute_fingerprint(_wav(_recording(3, seconds=90.0)))
+    capped = compute_fingerprint(_wav(_recording(3, seconds=90.0)[: 16000 * 61]))
+    assert fingerprint.frames == capped.frames
+    assert fingerprint.key == capped.key
+
+
+def test_transcript_cache_matches_near_copies():
+    async def scenario():
+        cache = TranscriptCache()
+        signal = _recording(4)
+        cache.store(compute_fingerprint(_wav(signal)), "bom dia")
+        cache.store(compute_fingerprint(_wav(_recording(5))), "boa noite")
+
+        assert await cache.lookup(compute_fingerprint(_wav(signal))) == "bom dia"
+        copy = compute_fingerprint(_wav(_resampled(signal, 16000, 22050), rate=22050))
+        assert await cache.lookup(copy) == "bom dia"
+        assert await cache.lookup(compute_fingerprint(_wav(_recording(6)))) is None
+
+    asyncio.run(scenario())
+
+
+def test_transcript_cache_scans_only_recent_candidates():
+    async def scenario():
+        rng = np.random.default_rng(7)
+        fingerprints = [
+            AudioFingerprint(f"fp:{i}", rng.integers(0, 256, (100, 2), dtype=np.uint8), 100) for i in range(5)
+        ]
+        cache = TranscriptCache(max_scan=2)
+        for i, fingerprint in enumerate(fingerprints):
+            cache.store(fingerprint, f"text {i}")
+
+        def probe(fingerprint):
+            return AudioFingerprint("fp:probe", fingerprint.bits.copy(), fingerprint.frames)
+
+        assert await cache.lookup(probe(fingerprints[4])) == "text 4"
+        # Outside the two most recent entries: only an exact key still matches
+        assert await cache.lookup(probe(fingerprints[0])) is None
+        assert await cache.lookup(fingerprints[0]) == "text 0"
+
+    asyncio.run(scenario())
@@ -0,0 +1,135 @@
+import asyncio
+import hashlib
+
+import pytest
+
+from app.utils.idempotency import IdempotencyMiddleware, IdempotencyStore, _BodyFingerprint
+
+
+def _form(boundary: bytes, audio: bytes) -> bytes:
+    return (
+        b"--" + boundary + b"\r\n"
+        b'Content-Disposition: form-data; name="target_language"\r\n\r\n'
+        b"Ingl\xc3\xaas\r\n"
+        b"--" + boundary + b"\r\n"
+        b'Content-Disposition: form-data; name="audio"; filename="a.wav"\r\n'
+        b"Content-Type: audio/wav\r\n\r\n" + audio + b"\r\n"
+        b"--" + boundary + b"--\r\n"
+    )
+
+
+def _scope(content_type: bytes = b"application/json", key: bytes = b"k1", path: str = "/api/translate"):
+    headers = [(b"content-type", content_type)]
+    if key is not None:
+        headers.append((b"idempotency-key", key))
+    return {"type": "http", "method": "POST", "path": path, "headers": headers}
+
+
+def _fingerprint(content_type: bytes, body: bytes, chunk: int = 0) -> str:
+    fingerprint = _BodyFingerprint(_scope(content_type))
+    step = chunk or len(body) or 1
+    for start in range(0, len(body), step):
+        fingerprint.update(body[start:start + step])
+    return fingerprint.hexdigest()
+
+
+def test_plain_body_fingerprint_is_sha256():
+    body = b'{"text": "ola"}'
+    assert _fingerprint(b"application/json", body) == hashlib.sha256(body).hexdigest()
+
+
+def test_multipart_fingerprint_ignores_boundary():
+    def fingerprint(boundary, audio, chunk=0):
+        return _fingerprint(b"multipart/form-data; boundary=" + boundary, _form(boundary, audio), chunk)
+
+    audio = bytes(range(256)) * 8
+    first = fingerprint(b"----a1b2", audio)
+    assert fingerprint(b"----zz9999", audio) == first
+    # Chunk splits (including through the boundary) do not change it either
+    assert fingerprint(b"----a1b2", audio, chunk=7) == first
+    assert fingerprint(b"----a1b2", audio[:-1] + b"\x00") != first
+
+
+class _App:
+    """Counts executions and answers with the configured status"""
+
+    def __init__(self, status: int = 200):
+        self.status = status
+        self.calls = 0
+
+    async def __call__(self, scope, receive, send):
+        self.calls += 1
+        while (await receive()).get("more_body"):
+            pass
+        body = f"call {self.calls}".encode()
+        await send({"type": "http.response.start", "status": self.status, "headers": [(b"x-call", body)]})
+        await send({"type": "http.response.body", "body": body})
+
+
+def _post(middleware, body: bytes, key: bytes = b"k1"):
+    pending = [{"type": "http.request", "body": body, "more_body": False}]
+    sent = []
+
+    async def receive():
+        if pending:
+            return pending.pop(0)
+        await asyncio.Event().wait()
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(middleware(_scope(key=key), receive, send))
+    headers = dict(sent[0].get("headers", []))
+    return sent[0]["status"], headers, b"".join(m.get("body", b"") for m in sent[1:])
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = IdempotencyStore(str(tmp_path / "idempotency.sqlite3"))
+    store.open()
+    yield store
+    store.close()
+
+
+def test_retry_replays_stored_response(store):
+    app = _App()
+    middleware = IdempotencyMiddleware(app, store)
+    status, headers, body = _post(middleware, b'{"text": "ola"}')
+    assert (status, body) == (200, b"call 1")
+    assert b"idempotent-replayed" not in headers
+
+    status, headers, body = _post(middleware, b'{"text": "ola"}')
+    assert (status, body) == (200, b"call 1")
+    assert headers[b"idempotent-replayed"] == b"true"
+    assert headers[b"x-call"] == b"call 1"
+    assert app.calls == 1
+
+    # Another key runs again
+    assert _post(middleware, b'{"text": "ola"}', key=b"k2")[2] == b"call 2"
+
+
+def test_retry_with_different_body_is_rejected(store):
+    app = _App()
+    middleware = IdempotencyMiddleware(app, store)
+    _post(middleware, b'{"text": "ola"}')
+    status, _, body = _post(middleware, b'{"text": "adeus"}')
+    assert status == 422 and b"different request body" in body
+    assert app.calls == 1
+
+
+def test_server_errors_are_not_stored(store):
+    app = _App(status=503)
+    middleware = IdempotencyMiddleware(app, store)
+    assert _post(middleware, b"{}")[0] == 503
+    app.status = 200
+    status, headers, body = _post(middleware, b"{}")
+    assert (status, body) == (200, b"call 2")
+    assert b"idempotent-replayed" not in headers
+
+
+def test_invalid_key_is_rejected(store):
+    app = _App()
+    middleware = IdempotencyMiddleware(app, store)
+    assert _post(middleware, b"{}", key=b"  ")[0] == 400
+    assert _post(middleware, b"{}", key=b"k" * 256)[0] == 400
+    assert app.calls == 0
@@ -0,0 +1,128 @@
+import asyncio
+
+import pytest
+
+from app.utils.memory_budget import BudgetExceeded, MemoryBudget, MemoryBudgetMiddleware, fixed_cost
+
+
+def test_reservations_are_admitted_in_fifo_order():
+    async def scenario():
+        budget = MemoryBudget(capacity=100)
+        await budget.acquire(80)
+        admitted = []
+
+        async def reserve(name, nbytes):
+            await budget.acquire(nbytes)
+            admitted.append(name)
+
+        large = asyncio.create_task(reserve("large", 60))
+        await asyncio.sleep(0)
+        # Would fit right now, but queues behind the large reservation
+        small = asyncio.create_task(reserve("small", 10))
+        await asyncio.sleep(0)
+        assert admitted == [] and budget.reserved == 80
+
+        budget.release(80)
+        await asyncio.gather(large, small)
+        assert admitted == ["large", "small"] and budget.reserved == 70
+
+    asyncio.run(scenario())
+
+
+def test_oversized_reservation_is_rejected_with_413():
+    async def scenario():
+        budget = MemoryBudget(capacity=100)
+        with pytest.raises(BudgetExceeded) as info:
+            await budget.acquire(101)
+        assert info.value.status_code == 413
+        assert budget.reserved == 0
+
+    asyncio.run(scenario())
+
+
+def test_full_queue_and_timeout_are_rejected_with_503():
+    async def scenario():
+        budget = MemoryBudget(capacity=100, max_waiters=1, max_wait=0.05)
+        await budget.acquire(100)
+        waiter = asyncio.create_task(budget.acquire(50))
+        await asyncio.sleep(0)
+
+        with pytest.raises(BudgetExceeded) as info:
+            await budget.acquire(10)
+        assert info.value.status_code == 503
+
+        with pytest.raises(BudgetExceeded) as info:
+            await waiter
+        assert info.value.status_code == 503 and info.value.retry_after >= 1
+        assert budget.reserved == 100
+
+    asyncio.run(scenario())
+
+
+class _App:
+    """Reads the whole request body, then answers 200"""
+
+    def __init__(self):
+        self.calls = 0
+        self.body = b""
+
+    async def __call__(self, scope, receive, send):
+        self.calls += 1
+        while True:
+            message = await receive()
+            self.body += message.get("body", b"")
+            if not message.get("more_body"):
+                break
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"ok"})
+
+
+def _request(middleware, chunks, content_length=None):
+    headers = [] if content_length is None else [(b"content-length", str(content_length).encode())]
+    scope = {"type": "http", "method": "POST", "path": "/upload", "headers": headers}
+    pending = [
+        {"type": "http.request", "body": chunk, "more_body": i < len(chunks) - 1}
+        for i, chunk in enumerate(chunks)
+    ]
+    sent = []
+
+    async def receive():
+        return pending.pop(0)
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(middleware(scope, receive, send))
+    return sent[0]["status"], b"".join(m.get("body", b"") for m in sent[1:])
+
+
+def _middleware(app, limit=1000):
+    budget = MemoryBudget(capacity=10_000)
+    middleware = MemoryBudgetMiddleware(
+        app, budget, costs={("POST", "/upload"): fixed_cost(500)}, body_limits={("POST", "/upload"): limit}
+    )
+    return middleware, budget
+
+
+def test_body_within_limit_passes_through():
+    app = _App()
+    middleware, budget = _middleware(app)
+    assert _request(middleware, [b"x" * 600, b"x" * 400]) == (200, b"ok")
+    assert app.body == b"x" * 1000
+    assert budget.reserved == 0
+
+
+def test_content_length_over_limit_is_rejected_before_the_app():
+    app = _App()
+    middleware, budget = _middleware(app)
+    status, body = _request(middleware, [b"x" * 1001], content_length=1001)
+    assert status == 413 and b"too large" in body
+    assert app.calls == 0 and budget.reserved == 0
+
+
+def test_chunked_body_over_limit_is_cut_off():
+    app = _App()
+    middleware, budget = _middleware(app)
+    status, body = _request(middleware, [b"x" * 600, b"x" * 600, b"x" * 600])
+    assert status == 413 and b"too large" in body
+    assert app.calls == 1 and budget.reserved == 0
@@ -0,0 +1,70 @@
+import sqlite3
+
+import pytest
+
+from app.services.phrase_packs import (
+    PhraseEntry, PhrasePacks, _digests, apply_delta, phrase_key, read_manifest, write_delta, write_pack
+)
+
+
+def _manifest(version: int):
+    return {"version": version, "source": "pt", "target": "ts", "voice": "Kore"}
+
+
+def _rows(path: str):
+    conn = sqlite3.connect(path)
+    try:
+        return sorted(conn.execute("SELECT * FROM phrases"))
+    finally:
+        conn.close()
+
+
+def test_delta_round_trip(tmp_path):
+    base, new = str(tmp_path / "v1.sqlite3"), str(tmp_path / "v2.sqlite3")
+    write_pack(base, [
+        PhraseEntry("Bom dia", "Good morning", 9, b"\x01\x00" * 500),
+        PhraseEntry("Obrigado", "Thank you", 7, b"\x02\x00" * 500),
+        PhraseEntry("Adeus", "Goodbye", 3, None),
+    ], _manifest(1))
+    write_pack(new, [
+        PhraseEntry("Bom dia", "Good morning", 12, b"\x01\x00" * 500),
+        PhraseEntry("Obrigado", "Thanks", 8, b"\x03\x00" * 500),
+        PhraseEntry("Boa noite", "Good night", 4, b"\x04\x00" * 500),
+    ], _manifest(2))
+
+    delta = str(tmp_path / "d1-2.sqlite3")
+    manifest = write_delta(base, new, delta)
+    assert manifest["kind"] == "delta" and manifest["base_version"] == 1
+    # Changed and added phrases only; the removed one is listed by key
+    assert manifest["entries"] == 2 and manifest["removed"] == 1
+    assert set(_digests(delta)) == {phrase_key("Obrigado"), phrase_key("Boa noite")}
+
+    out = str(tmp_path / "applied.sqlite3")
+    applied = apply_delta(base, delta, out)
+    assert _digests(out) == _digests(new)
+    assert applied["kind"] == "full" and applied["entries"] == 3 and "base_version" not in applied
+    assert applied["content_digest"] == read_manifest(new)["content_digest"]
+    # Use counts are not part of the row digest, so a bumped count alone is not shipped
+    assert [row[:4] + row[5:] for row in _rows(out)] == [row[:4] + row[5:] for row in _rows(new)]
+
+
+def test_delta_against_another_version_is_rejected(tmp_path):
+    paths = [str(tmp_path / f"v{version}.sqlite3") for version in (1, 2, 3)]
+    for version, path in enumerate(paths, start=1):
+        write_pack(path, [PhraseEntry("Bom dia", f"Good morning {version}", 1, None)], _manifest(version))
+    delta = str(tmp_path / "d2-3.sqlite3")
+    write_delta(paths[1], paths[2], delta)
+    with pytest.raises(ValueError):
+        apply_delta(paths[0], delta, str(tmp_path / "out.sqlite3"))
+
+
+def test_phrase_key_normalizes_text():
+    assert phrase_key("  Bom   DIA ") == phrase_key("bom dia")
+    assert phrase_key("bom dia") != phrase_key("boa noite")
+
+
+def test_pack_name_rejects_path_parts():
+    assert PhrasePacks.pack_name("pt", "ts", "Kore") == "pt-ts-Kore"
+    for part in ("..", "pt/../x", "", "pt-BR"):
+        with pytest.raises(ValueError):
+            PhrasePacks.pack_name(part, "ts", "Kore")
@@ -0,0 +1,60 @@
+import numpy as np
+
+from app.services.speech_chunks import PcmStitcher, split_sentences, stitch_pcm
+
+
+def _pcm(samples) -> bytes:
+    return np.asarray(samples, dtype="<i2").tobytes()
+
+
+def _samples(pcm: bytes):
+    return np.frombuffer(pcm, dtype="<i2").astype(np.int32)
+
+
+def test_crossfade_ramps_between_chunks():
+    stitcher = PcmStitcher(pause_ms=0)
+    first, second = np.full(2400, 1000), np.full(2400, 3000)
+    out = _samples(stitcher.push(_pcm(first)) + stitcher.push(_pcm(second)) + stitcher.finish())
+
+    assert len(out) == len(first) + len(second) - stitcher.fade
+    # A hard cut would jump by 2000 in one sample
+    assert np.abs(np.diff(out)).max() <= 2000 / stitcher.fade + 1
+    assert out[0] == 1000 and out[-1] == 3000
+
+
+def test_pause_between_chunks_is_normalized():
+    stitcher = PcmStitcher()
+    tone = np.full(4800, 8000, dtype=np.int16)
+    silence = np.zeros(12000, dtype=np.int16)
+    chunk = _pcm(np.concatenate([silence, tone, silence]))
+    out = _samples(b"".join([stitcher.push(chunk), stitcher.push(chunk), stitcher.finish()]))
+
+    loud = np.flatnonzero(np.abs(out) >= stitcher.silence_level)
+    longest_gap = np.diff(loud).max() - 1
+    # Half a pause after the first chunk and before the second, overlapped by the crossfade
+    assert longest_gap == 2 * stitcher.half_pause - stitcher.fade
+    # Leading silence of the first chunk is kept as is, trailing silence trimmed to half a pause
+    assert loud[0] == len(silence)
+    assert len(out) - 1 - loud[-1] == stitcher.half_pause
+
+
+def test_incremental_output_matches_stitch_pcm():
+    rng = np.random.default_rng(0)
+    chunks = [_pcm(rng.integers(-20000, 20000, size)) for size in (3000, 50, 7000)]
+    stitcher = PcmStitcher()
+    incremental = b"".join([stitcher.push(chunk) for chunk in chunks] + [stitcher.finish()])
+    assert incremental == stitch_pcm(chunks)
+
+
+def test_silent_chunk_is_dropped():
+    stitcher = PcmStitcher()
+    assert stitcher.push(_pcm(np.zeros(1000))) == b""
+    assert stitcher.finish() == b""
+
+
+def test_split_sentences_packs_whole_sentences():
+    text = "Bom dia. Como está? " * 20 + "Uma frase muito longa, com vírgulas, " * 10
+    chunks = split_sentences(text, 80)
+    assert all(0 < len(chunk) <= 80 for chunk in chunks)
+    assert " ".join(chunks).split() == text.split()
+    assert split_sentences("Curta.", 80) == ["Curta."]
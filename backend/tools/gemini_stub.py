@@ -0,0 +1,177 @@
+"""
+Local stub of the Gemini REST API
+
+Implements the subset of endpoints the backend uses (model metadata,
+generateContent and cachedContents) with canned responses, so the service
+can be exercised end to end without network access or an API key. Cached
+contexts expire like the real ones, and a request that references a missing
+context gets the same 404 the API returns.
+
+Usage:
+    uvicorn tools.gemini_stub:app --port 8090
+    GEMINI_BASE_URL=http://127.0.0.1:8090/v1beta GEMINI_API_KEY=stub uvicorn app.main:app
+
+Environment:
+    STUB_LATENCY_MS: Fixed delay before every generateContent response
+    STUB_PREFILL_US_PER_BYTE: Extra delay per byte of inline system instruction
+    STUB_MIN_CACHE_CHARS: Reject cachedContents smaller than this (like the API's token minimum)
+"""
+import asyncio
+import base64
+import json
+import math
+import os
+import re
+import struct
+import time
+import uuid
+from typing import Dict
+
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse
+
+LATENCY = float(os.getenv("STUB_LATENCY_MS", "0")) / 1000.0
+PREFILL_PER_BYTE = float(os.getenv("STUB_PREFILL_US_PER_BYTE", "0")) / 1e6
+MIN_CACHE_CHARS = int(os.getenv("STUB_MIN_CACHE_CHARS", "0"))
+
+app = FastAPI(title="Gemini API stub")
+
+_cached_contents: Dict[str, dict] = {}
+stats = {"generate_requests": 0, "generate_bytes": 0, "cached_requests": 0, "cache_creates": 0}
+
+
+def _error(status: int, message: str, reason: str) -> JSONResponse:
+    return JSONResponse(status_code=status, content={"error": {"code": status, "message": message, "status": reason}})
+
+
+def _parse_ttl(ttl: str) -> float:
+    match = re.fullmatch(r"(\d+(?:\.\d+)?)s", ttl or "")
+    if not match:
+        raise HTTPException(status_code=400, detail=f"Invalid ttl: {ttl}")
+    return float(match.group(1))
+
+
+def _instruction_text(instruction: dict) -> str:
+    return "".join(part.get("text", "") for part in (instruction or {}).get("parts", []))
+
+
+def _resource(name: str) -> dict:
+    entry = _cached_contents[name]
+    expire = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(entry["expires_at"]))
+    return {"name": name, "model": entry["model"], "expireTime": expire}
+
+
+def _live(name: str):
+    entry = _cached_contents.get(name)
+    if entry is None or entry["expires_at"] < time.time():
+        _cached_contents.pop(name, None)
+        return None
+    return entry
+
+
+def _tone(seconds: float = 0.25, rate: int = 24000) -> bytes:
+    samples = (int(8000 * math.sin(2 * math.pi * 440 * i / rate)) for i in range(int(seconds * rate)))
+    return b"".join(struct.pack("<h", s) for s in samples)
+
+
+def _text_reply(prompt: str) -> str:
+    match = re.search(r'para (.+?): "(.*)"', prompt, re.S)
+    if match:
+        return f"[{match.group(1)}] {match.group(2)}"
+    return f"[stub] {prompt}"
+
+
+@app.get("/v1beta/models/{model}")
+async def get_model(model: str):
+    return {"name": f"models/{model}", "displayName": model}
+
+
+@app.post("/v1beta/models/{model_action}")
+async def generate_content(model_action: str, request: Request):
+    model, _, action = model_action.partition(":")
+    if action != "generateContent":
+        return _error(404, f"Unknown method {action}", "NOT_FOUND")
+
+    raw = await request.body()
+    body = json.loads(raw)
+    stats["generate_requests"] += 1
+    stats["generate_bytes"] += len(raw)
+
+    instruction = body.get("systemInstruction")
+    cached_name = body.get("cachedContent")
+    if cached_name:
+        if instruction:
+            return _error(400, "CachedContent can not be used with system_instruction", "INVALID_ARGUMENT")
+        entry = _live(cached_name)
+        if entry is None:
+            return _error(404, "CachedContent not found (or permission denied)", "NOT_FOUND")
+        if entry["model"] != f"models/{model}":
+            return _error(400, "Model mismatch for CachedContent", "INVALID_ARGUMENT")
+        stats["cached_requests"] += 1
+    else:
+        # Inline instructions are "prefilled" on every request
+        await asyncio.sleep(PREFILL_PER_BYTE * len(_instruction_text(instruction).encode("utf-8")))
+    await asyncio.sleep(LATENCY)
+
+    config = body.get("generationConfig") or {}
+    parts = body["contents"][0]["parts"]
+    prompt = " ".join(part["text"] for part in parts if "text" in part)
+    if "AUDIO" in config.get("response_modalities", []):
+        reply = {"inlineData": {"mimeType": "audio/L16;rate=24000", "data": base64.b64encode(_tone()).decode()}}
+    elif config.get("response_mime_type") == "application/json" and re.search(r'para .+?: "', prompt):
+        # Multi-target structured translation: one key per language
+        match = re.search(r'para (.+?): "(.*)"', prompt, re.S)
+        languages = match.group(1).split(", ")
+        reply = {"text": json.dumps({language: f"[{language}] {match.group(2)}" for language in languages})}
+    elif config.get("response_mime_type") == "application/json":
+        reply = {"text": json.dumps({"original": "stub transcript", "translated": "[stub] transcript"})}
+    else:
+        reply = {"text": _text_reply(prompt)}
+    return {"candidates": [{"content": {"parts": [reply], "role": "model"}, "finishReason": "STOP"}]}
+
+
+@app.post("/v1beta/cachedContents")
+async def create_cached_content(request: Request):
+    body = await request.json()
+    text = _instruction_text(body.get("systemInstruction"))
+    if len(text) < MIN_CACHE_CHARS:
+        return _error(400, "Cached content is too small", "INVALID_ARGUMENT")
+    name = f"cachedContents/{uuid.uuid4().hex[:12]}"
+    _cached_contents[name] = {
+        "model": body["model"],
+        "instruction": text,
+        "expires_at": time.time() + _parse_ttl(body.get("ttl", "3600s")),
+    }
+    stats["cache_creates"] += 1
+    return _resource(name)
+
+
+@app.get("/v1beta/cachedContents/{cache_id}")
+async def get_cached_content(cache_id: str):
+    name = f"cachedContents/{cache_id}"
+    if _live(name) is None:
+        return _error(404, "CachedContent not found (or permission denied)", "NOT_FOUND")
+    return _resource(name)
+
+
+@app.patch("/v1beta/cachedContents/{cache_id}")
+async def update_cached_content(cache_id: str, request: Request):
+    name = f"cachedContents/{cache_id}"
+    entry = _live(name)
+    if entry is None:
+        return _error(404, "CachedContent not found (or permission denied)", "NOT_FOUND")
+    body = await request.json()
+    entry["expires_at"] = time.time() + _parse_ttl(body.get("ttl"))
+    return _resource(name)
+
+
+@app.delete("/v1beta/cachedContents/{cache_id}")
+async def delete_cached_content(cache_id: str):
+    _cached_contents.pop(f"cachedContents/{cache_id}", None)
+    return {}
+
+
+@app.get("/stub/stats")
+async def get_stats():
+    """Counters for assertions in local tests"""
+    return {**stats, "cached_contents": len(_cached_contents)}
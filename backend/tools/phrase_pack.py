@@ -0,0 +1,105 @@
+"""
+Phrase pack command line
+
+Builds offline phrase packs from the history database without a running
+server, computes deltas between two packs and applies them. Audio comes
+from Gemini TTS with --synthesize (the server's speech cache is in memory
+and not reachable from here); without it, packs hold text only.
+
+Usage:
+    python tools/phrase_pack.py export --source pt --target en --out pack-v1.sqlite3
+    python tools/phrase_pack.py export --source pt --target en --base pack-v1.sqlite3 --out delta-v2.sqlite3
+    python tools/phrase_pack.py apply --base pack-v1.sqlite3 --delta delta-v2.sqlite3 --out pack-v2.sqlite3
+    python tools/phrase_pack.py info pack-v2.sqlite3
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.gemini import gemini_service  # noqa: E402
+from app.services.history import HistoryStore  # noqa: E402
+from app.services.phrase_packs import (  # noqa: E402
+    PhraseEntry, apply_delta, read_manifest, select_phrases, write_delta, write_pack
+)
+
+
+async def _collect(args) -> list:
+    store = HistoryStore(args.history)
+    store.open()
+    try:
+        phrases = store.top_phrases(args.scan_limit, args.min_uses)
+    finally:
+        store.close()
+
+    entries = []
+    for original, translated, uses in select_phrases(phrases, args.source, args.target, args.limit):
+        pcm = None
+        if args.synthesize:
+            try:
+                pcm = await gemini_service.synthesize_pcm(translated, args.voice, background=True)
+            except Exception as e:
+                print(f"warning: no audio for {translated!r}: {e}", file=sys.stderr)
+        entries.append(PhraseEntry(original, translated, uses, pcm))
+    await gemini_service.aclose()
+    return entries
+
+
+def export(args) -> dict:
+    entries = asyncio.run(_collect(args))
+    manifest = {"source": args.source, "target": args.target, "voice": args.voice}
+    if not args.base:
+        return write_pack(args.out, entries, {**manifest, "version": args.version or 1})
+
+    base = read_manifest(args.base)
+    with tempfile.TemporaryDirectory() as directory:
+        full_path = os.path.join(directory, "full.sqlite3")
+        write_pack(full_path, entries, {**manifest, "version": args.version or base["version"] + 1})
+        if read_manifest(full_path)["content_digest"] == base["content_digest"]:
+            print("Content unchanged since the base pack, no delta written", file=sys.stderr)
+            return base
+        return write_delta(args.base, full_path, args.out)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Offline phrase packs")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = commands.add_parser("export", help="Build a full pack, or a delta with --base")
+    export_parser.add_argument("--source", required=True, help="Source language code (pt, en, ts)")
+    export_parser.add_argument("--target", required=True, help="Target language code (pt, en, ts)")
+    export_parser.add_argument("--out", required=True, help="Output file")
+    export_parser.add_argument("--base", help="Previous full pack: write a delta against it")
+    export_parser.add_argument("--version", type=int, help="Version number (default: base version + 1, or 1)")
+    export_parser.add_argument("--voice", default="Kore")
+    export_parser.add_argument("--limit", type=int, default=int(os.getenv("PHRASE_PACK_LIMIT", "500")))
+    export_parser.add_argument("--min-uses", type=int, default=int(os.getenv("PHRASE_PACK_MIN_USES", "3")))
+    export_parser.add_argument("--scan-limit", type=int, default=20000)
+    export_parser.add_argument("--history", default=os.getenv("HISTORY_DB_PATH", "data/history.sqlite3"))
+    export_parser.add_argument("--synthesize", action="store_true", help="Synthesize audio with Gemini TTS")
+
+    apply_parser = commands.add_parser("apply", help="Apply a delta to a full pack")
+    apply_parser.add_argument("--base", required=True)
+    apply_parser.add_argument("--delta", required=True)
+    apply_parser.add_argument("--out", required=True)
+
+    info_parser = commands.add_parser("info", help="Print a pack's manifest")
+    info_parser.add_argument("pack")
+
+    args = parser.parse_args()
+    if args.command == "export":
+        manifest = export(args)
+    elif args.command == "apply":
+        manifest = apply_delta(args.base, args.delta, args.out)
+    else:
+        manifest = read_manifest(args.pack)
+    print(json.dumps(manifest, indent=2, ensure_ascii=False))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
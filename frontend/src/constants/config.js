@@ -7,6 +7,9 @@ export const API_CONFIG = {
     // Change this to your backend URL
     BASE_URL: __DEV__ ? 'http://192.168.0.3:8000' : 'https://your-production-api.com',
     TIMEOUT: 30000, // 30 seconds
+    // Retries after a timeout or network error (same Idempotency-Key, so the
+    // backend does not start the upstream work twice)
+    RETRIES: 1,
 };
 
 // Firebase Configuration
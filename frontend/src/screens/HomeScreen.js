@@ -13,7 +13,7 @@ import TextInputModal from '../components/TextInputModal';
 import Snackbar from '../components/Snackbar';
 import HistoryModal from '../components/HistoryModal';
 import useAppState, { AppState } from '../hooks/useAppState';
-import { translateText, synthesizeSpeech, translateAudio } from '../services/api';
+import { synthesizeSpeech, translateAudio, translateAndSpeak } from '../services/api';
 import { playAudioFromBase64 } from '../services/audio';
 import theme from '../styles/theme';
 
@@ -124,8 +124,14 @@ export default function HomeScreen() {
         setStatusText('Traduzindo texto...');
 
         try {
-            const result = await translateText(text, targetLanguage);
-            await processTranslationResult(result);
+            // One round trip: the backend pipes the translation straight into TTS
+            const { translation, audio } = await translateAndSpeak(text, targetLanguage, {
+                onTranslation: (result) => {
+                    setTranslatedText(result.translated_text);
+                    setStatusText('Gerando áudio...');
+                },
+            });
+            await processTranslationResult(translation, audio);
         } catch (error) {
             console.error('Translation error:', error);
             showSnackbar(`Erro: ${error.message}`);
@@ -134,7 +140,7 @@ export default function HomeScreen() {
         }
     };
 
-    const processTranslationResult = async (result) => {
+    const processTranslationResult = async (result, prefetchedAudio) => {
         // 1. Show translated text immediately
         setTranslatedText(result.translated_text);
         setStatusText(`Tradução: ${result.translated_text}`);
@@ -150,7 +156,9 @@ export default function HomeScreen() {
         // 3. Try to generate audio (TTS)
         try {
             setStatusText('Gerando áudio...');
-            const audioResult = await synthesizeSpeech(result.translated_text);
+            const audioResult = prefetchedAudio !== undefined
+                ? prefetchedAudio
+                : await synthesizeSpeech(result.translated_text);
 
             if (audioResult && audioResult.audio_base64) {
                 setAudioBase64(audioResult.audio_base64);
@@ -3,6 +3,7 @@
  */
 import axios from 'axios';
 import { API_CONFIG } from '../constants/config';
+import { getCurrentUser } from './firebase';
 
 // Create axios instance
 const apiClient = axios.create({
@@ -10,12 +11,24 @@ const apiClient = axios.create({
     timeout: API_CONFIG.TIMEOUT,
     headers: {
         'Content-Type': 'application/json',
+        // Lets the backend stop working on requests we have already given up on
+        'X-Request-Timeout-Ms': String(API_CONFIG.TIMEOUT),
     },
 });
 
+/**
+ * Firebase UID of the anonymous session, sent so the backend rate-limits
+ * this device rather than everyone behind the same IP
+ */
+const clientHeaders = () => {
+    const uid = getCurrentUser()?.uid;
+    return uid ? { 'X-Firebase-UID': uid } : {};
+};
+
 // Request interceptor
 apiClient.interceptors.request.use(
     (config) => {
+        Object.assign(config.headers, clientHeaders());
         console.log(`API Request: ${config.method.toUpperCase()} ${config.url}`);
         return config;
     },
@@ -35,6 +48,31 @@ apiClient.interceptors.response.use(
     }
 );
 
+/**
+ * Random key identifying one logical request across its retries
+ */
+const newIdempotencyKey = () =>
+    `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}${Math.random().toString(36).slice(2)}`;
+
+/**
+ * POST that is retried after timeouts and network errors. Every attempt
+ * carries the same Idempotency-Key, so a retry attaches to the work the
+ * backend is still doing for the first attempt instead of repeating it.
+ */
+const postIdempotent = async (url, data, config = {}) => {
+    const headers = { ...config.headers, 'Idempotency-Key': newIdempotencyKey() };
+    for (let attempt = 0; ; attempt++) {
+        try {
+            return await apiClient.post(url, data, { ...config, headers });
+        } catch (error) {
+            if (error.response || attempt >= API_CONFIG.RETRIES) {
+                throw error;
+            }
+            console.log(`Retrying ${url} (attempt ${attempt + 2})`);
+        }
+    }
+};
+
 /**
  * Translate text to target language
  */
@@ -55,7 +93,7 @@ export const translateText = async (text, targetLanguage = 'Inglês') => {
  */
 export const synthesizeSpeech = async (text, voice = 'Kore') => {
     try {
-        const response = await apiClient.post('/api/synthesize', {
+        const response = await postIdempotent('/api/synthesize', {
             text,
             voice,
         });
@@ -65,6 +103,130 @@ export const synthesizeSpeech = async (text, voice = 'Kore') => {
     }
 };
 
+/**
+ * Translate text and synthesize the translation in a single request.
+ * The backend streams NDJSON: a "translation" line first, then an "audio"
+ * (or "error") line once speech synthesis finishes.
+ * @param {string} text - Text to translate
+ * @param {string} targetLanguage - Target language
+ * @param {object} options - { voice, onTranslation } callback fires as soon as the text arrives
+ * @returns {Promise<{translation: object, audio: object|null}>}
+ */
+export const translateAndSpeak = (text, targetLanguage = 'Inglês', { voice = 'Kore', onTranslation } = {}) => {
+    return new Promise((resolve, reject) => {
+        const xhr = new XMLHttpRequest();
+        let consumed = 0;
+        let translation = null;
+        let audio = null;
+
+        const consumeLines = () => {
+            const lines = xhr.responseText.slice(consumed).split('\n');
+            // Keep a trailing partial line for the next progress event
+            lines.pop();
+            for (const line of lines) {
+                consumed += line.length + 1;
+                if (!line.trim()) continue;
+                const message = JSON.parse(line);
+                if (message.type === 'translation') {
+                    translation = message;
+                    if (onTranslation) onTranslation(message);
+                } else if (message.type === 'audio') {
+                    audio = message;
+                } else if (message.type === 'error') {
+                    console.warn('Translate-and-speak:', message.detail);
+                }
+            }
+        };
+
+        xhr.open('POST', `${API_CONFIG.BASE_URL}/api/translate-and-speak`);
+        xhr.setRequestHeader('Content-Type', 'application/json');
+        xhr.setRequestHeader('X-Request-Timeout-Ms', String(API_CONFIG.TIMEOUT));
+        Object.entries(clientHeaders()).forEach(([name, value]) => xhr.setRequestHeader(name, value));
+        xhr.timeout = API_CONFIG.TIMEOUT;
+        xhr.onprogress = consumeLines;
+        xhr.onload = () => {
+            if (xhr.status !== 200) {
+                let detail = 'Translation failed';
+                try {
+                    detail = JSON.parse(xhr.responseText).detail || detail;
+                } catch (e) { }
+                reject(new Error(detail));
+                return;
+            }
+            consumeLines();
+            if (!translation) {
+                reject(new Error('Translation failed'));
+                return;
+            }
+            resolve({ translation, audio });
+        };
+        xhr.onerror = () => reject(new Error('Translation failed'));
+        xhr.ontimeout = () => reject(new Error('Translation timed out'));
+        xhr.send(JSON.stringify({ text, target_language: targetLanguage, voice }));
+    });
+};
+
+/**
+ * Translate text into several languages in a single request.
+ * The backend streams one NDJSON line per target as soon as it is ready.
+ * @param {string} text - Text to translate
+ * @param {string[]} targetLanguages - Target languages (e.g. ['Inglês', 'Changana'])
+ * @param {object} options - { onTranslation } callback fires for each target as it arrives
+ * @returns {Promise<{translations: object[], errors: object[]}>}
+ */
+export const translateMulti = (text, targetLanguages, { onTranslation } = {}) => {
+    return new Promise((resolve, reject) => {
+        const xhr = new XMLHttpRequest();
+        let consumed = 0;
+        const translations = [];
+        const errors = [];
+
+        const consumeLines = () => {
+            const lines = xhr.responseText.slice(consumed).split('\n');
+            // Keep a trailing partial line for the next progress event
+            lines.pop();
+            for (const line of lines) {
+                consumed += line.length + 1;
+                if (!line.trim()) continue;
+                const message = JSON.parse(line);
+                if (message.type === 'translation') {
+                    translations.push(message);
+                    if (onTranslation) onTranslation(message);
+                } else if (message.type === 'error') {
+                    errors.push(message);
+                    console.warn(`Translate (${message.language}):`, message.detail);
+                }
+            }
+        };
+
+        xhr.open('POST', `${API_CONFIG.BASE_URL}/api/translate/multi`);
+        xhr.setRequestHeader('Content-Type', 'application/json');
+        xhr.setRequestHeader('X-Request-Timeout-Ms', String(API_CONFIG.TIMEOUT));
+        Object.entries(clientHeaders()).forEach(([name, value]) => xhr.setRequestHeader(name, value));
+        xhr.timeout = API_CONFIG.TIMEOUT;
+        xhr.onprogress = consumeLines;
+        xhr.onload = () => {
+            if (xhr.status !== 200) {
+                let detail = 'Translation failed';
+                try {
+                    detail = JSON.parse(xhr.responseText).detail || detail;
+                } catch (e) { }
+                reject(new Error(detail));
+                return;
+            }
+            consumeLines();
+            if (!translations.length) {
+                reject(new Error('Translation failed'));
+                return;
+            }
+            resolve({ translations, errors });
+        };
+        xhr.onerror = () => reject(new Error('Translation failed'));
+        xhr.ontimeout = () => reject(new Error('Translation timed out'));
+        xhr.send(JSON.stringify({ text, target_languages: targetLanguages }));
+    });
+};
+
 /**
  * Health check
  */
@@ -96,7 +258,7 @@ export const translateAudio = async (audioUri, targetLanguage = 'Inglês') => {
 
         formData.append('target_language', targetLanguage);
 
-        const response = await apiClient.post('/api/translate-audio', formData, {
+        const response = await postIdempotent('/api/translate-audio', formData, {
             headers: {
                 'Content-Type': 'multipart/form-data',
             },
@@ -112,6 +274,8 @@ export const translateAudio = async (audioUri, targetLanguage = 'Inglês') => {
 export default {
     translateText,
     synthesizeSpeech,
+    translateAndSpeak,
+    translateMulti,
     healthCheck,
     translateAudio,
 };